@@ -1,147 +1,449 @@
-from crewai import Agent, Task, Crew, Process
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
+import json
 import platform
 import os
-from config import DEFAULT_MODEL, TEMPERATURE, OPENAI_API_KEY
-from command_executor import CommandExecutor, MultiCommandExecutor
+import time
+from config import (
+    LLM_BACKEND,
+    PIPELINE_MODE,
+    STREAM_PLAN,
+    EARLY_EXECUTION,
+    TEMPERATURE,
+    PLAN_CACHE_ENABLED,
+    INTENT_MATCHER_ENABLED,
+    CONTEXT_SNAPSHOT,
+    REPAIR_ENABLED,
+    HISTORY_SUGGEST,
+    PLATFORM_COMMANDS,
+)
+from command_executor import MultiCommandExecutor
+from env_context import EnvironmentContext
+from history_index import HistoryIndex, Suggestion
+from intent_matcher import IntentMatcher
+from llm_backends import backend_config, crew_llm, default_llm
+from plan_cache import PlanCache
+from prompts import (
+    INTERPRETATION_TASK,
+    INTERPRETER_BACKSTORY,
+    SINGLE_CALL_SYSTEM_PROMPT,
+    STREAMING_SYSTEM_PROMPT,
+    VALIDATION_TASK,
+    VALIDATOR_BACKSTORY,
+    request_prompt,
+)
+from repair import FixTable, RepairLoop
+from safety_rules import check_annotation
+from streaming import LineAssembler, StreamingPlanRunner
+from tracing import record_span, span
 from rich.console import Console
 
 console = Console()
 
+PIPELINE_MODES = ("fast", "paranoid")
+
+
+def parse_annotated_plan(text: str) -> List[Dict]:
+    """Parse a single-call response into command dicts with risk annotations."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None
+
+    if isinstance(data, dict) and isinstance(data.get("commands"), list):
+        plan = []
+        for item in data["commands"]:
+            if isinstance(item, str):
+                item = {"command": item}
+            if isinstance(item, dict) and str(item.get("command", "")).strip():
+                plan.append(
+                    {
+                        "command": str(item["command"]).strip(),
+                        "risk": item.get("risk", "medium"),
+                        "reason": item.get("reason", ""),
+                    }
+                )
+        return plan
+
+    # Fall back to one command per line with no annotation
+    lines = [line.strip().strip("\"'") for line in text.strip().split("\n")]
+    return [
+        {"command": line, "risk": "medium", "reason": "unannotated"}
+        for line in lines
+        if line
+    ]
+
 
 class CommandAI:
-    def __init__(self):
+    """
+    Turns natural language queries into validated command plans and runs them.
+
+    Args:
+        target_platform: Operating system to plan for, when the plan runs
+            somewhere else (default: this machine). Local matches, repairs and
+            cache entries then follow that platform, and the environment
+            snapshot, which describes this machine, is left out.
+    """
+
+    def __init__(self, target_platform: Optional[str] = None):
         self.command_executor = MultiCommandExecutor()
-        self.platform = platform.system().lower()
+        host_platform = platform.system().lower()
+        self.platform = target_platform or host_platform
         self.current_dir = os.getcwd()
+        self.pipeline_mode = PIPELINE_MODE
+        # Chat client or router over the configured backends, created on first
+        # fast-mode call
+        self.llm = None
+        # Plans are cached per main model
+        self.model = backend_config(LLM_BACKEND).model
+        self.last_usage: Dict[str, int] = {}
+        self.plan_cache = PlanCache() if PLAN_CACHE_ENABLED else None
+        self.intent_matcher = (
+            IntentMatcher(
+                lambda command_type: PLATFORM_COMMANDS.get(self.platform, {}).get(command_type),
+                posix=self.platform != "windows",
+            )
+            if INTENT_MATCHER_ENABLED
+            else None
+        )
+        self.env_context = (
+            EnvironmentContext()
+            if CONTEXT_SNAPSHOT and self.platform == host_platform
+            else None
+        )
+        self.repair_loop = (
+            RepairLoop(self.platform, lambda: self.current_dir, FixTable())
+            if REPAIR_ENABLED
+            else None
+        )
+        self.command_executor.repairer = self.repair_loop
+        self.history_index = (
+            HistoryIndex(self.command_executor.history_store) if HISTORY_SUGGEST else None
+        )
+        # Called with plans that ran before for similar queries, before the LLM
+        # is asked; returns the one to run, or None. Unset, nothing is offered.
+        self.choose_suggestion: Optional[
+            Callable[[List[Suggestion]], Optional[Suggestion]]
+        ] = None
+
+        # Agents are built on first use so paths that never reach the crew
+        # (fast mode, local matches, cache hits) do not import crewai
+        self.command_interpreter = None
+        self.command_validator = None
+
+    def ensure_agents(self):
+        """Build the interpreter and validator agents on first use."""
+        if self.command_interpreter is not None:
+            return
+        with span("crew.build"):
+            self._build_agents()
+
+    def _build_agents(self):
+        from crewai import Agent
+
+        # The crew always uses the main backend; small-model routing needs the
+        # per-call confidence check that only the fast and streaming paths make
+        llm = crew_llm(LLM_BACKEND)
+        backend_options = {"llm": llm} if llm is not None else {}
 
-        # Initialize agents
         self.command_interpreter = Agent(
             role="Command Interpreter",
             goal="Interpret natural language commands into executable terminal commands",
-            backstory="""You are an expert at understanding natural language and converting it into 
-            precise terminal commands. You understand the nuances of different operating systems 
-            and can adapt commands accordingly. You can break down complex tasks into multiple sequential commands.
-            
-            For process management:
-            - To find a process on a port: lsof -i :PORT
-            - To kill a process: kill -9 PID
-            - To find and kill in one command: lsof -ti :PORT | xargs kill -9
-            
-            For file operations:
-            - To find files: find . -name "filename"
-            - To check file contents: cat filename
-            - To append to files: echo "content" >> filename
-            
-            Always use the most efficient and safe command combination.
-            Always consider the current working directory context.""",
+            backstory=INTERPRETER_BACKSTORY,
             verbose=False,
             allow_delegation=False,
-            llm_model=DEFAULT_MODEL,
+            llm_model=self.model,
             temperature=TEMPERATURE,
+            **backend_options,
         )
 
         self.command_validator = Agent(
             role="Command Validator",
             goal="Validate and ensure the safety of terminal commands",
-            backstory="""You are a security expert who validates terminal commands for safety 
-            and potential risks. You ensure that commands are safe to execute and won't cause 
-            harm to the system. You can validate multiple sequential commands.
-            
-            For process management:
-            - Always verify the process exists before killing
-            - Use appropriate signal numbers (9 for force kill)
-            - Combine find and kill operations when safe to do so
-            
-            For file operations:
-            - Verify file existence before operations
-            - Use safe file manipulation commands
-            - Handle file permissions appropriately
-            
-            Always ensure commands respect the current working directory context.""",
+            backstory=VALIDATOR_BACKSTORY,
             verbose=False,
             allow_delegation=False,
-            llm_model=DEFAULT_MODEL,
+            llm_model=self.model,
             temperature=TEMPERATURE,
+            **backend_options,
         )
 
-    def process_command(self, natural_language_command: str) -> Dict:
-        """Process a natural language command and execute it safely."""
-        try:
-            # Create tasks
-            interpretation_task = Task(
-                description=f"""Convert the following natural language command into one or more terminal commands for {self.platform} system.
-                Command: {natural_language_command}
-                Current Working Directory: {self.current_dir}
-                
-                IMPORTANT: 
-                - Return a list of terminal commands separated by newlines, with no explanations or additional text.
-                - Each command should be on a new line.
-                - Commands should be executed in the current working directory: {self.current_dir}
-                - Do not use absolute paths unless specifically requested
-                
-                For process management:
-                - To find and kill a process on port X: lsof -ti :X | xargs kill -9
-                - To find a process: lsof -i :X
-                - To kill a process: kill -9 PID
-                
-                For file operations:
-                - To find files: find . -name "filename"
-                - To check file contents: cat filename
-                - To append to files: echo "content" >> filename
-                
-                Consider:
-                1. The current operating system ({self.platform})
-                2. The most efficient way to achieve the goal
-                3. Safety and best practices
-                4. Current working directory context
-                5. Command dependencies and sequence""",
-                agent=self.command_interpreter,
-                expected_output="A list of terminal commands, one per line, without any explanation or additional text.",
+    def _environment_context(self) -> str:
+        """Prompt text describing the working directory, ports and tools, if enabled."""
+        if self.env_context is None:
+            return ""
+        with span("context"):
+            return self.env_context.snapshot(self.current_dir).to_prompt()
+
+    def _user_prompt(self, natural_language_command: str) -> str:
+        """Variable suffix of every interpretation prompt, ending with the query."""
+        return request_prompt(
+            self.platform,
+            self.current_dir,
+            self._environment_context(),
+            natural_language_command,
+        )
+
+    def _interpret_with_crew(self, natural_language_command: str) -> List[str]:
+        """Run the interpreter and validator agents and return the command plan."""
+        from crewai import Task, Crew, Process
+
+        self.ensure_agents()
+        task_done: List[int] = []  # Completion time of each task, for tracing
+
+        # Create tasks
+        interpretation_task = Task(
+            description=f"{INTERPRETATION_TASK}\n\n{self._user_prompt(natural_language_command)}",
+            agent=self.command_interpreter,
+            expected_output="A list of terminal commands, one per line, without any explanation or additional text.",
+            callback=lambda output: task_done.append(time.time_ns()),
+        )
+
+        validation_task = Task(
+            description=f"{VALIDATION_TASK}\n\n{request_prompt(self.platform, self.current_dir)}",
+            agent=self.command_validator,
+            expected_output="A list of validated terminal commands, one per line, without any explanation or additional text.",
+            context=[interpretation_task],
+            callback=lambda output: task_done.append(time.time_ns()),
+        )
+
+        # Create and run the crew
+        crew = Crew(
+            agents=[self.command_interpreter, self.command_validator],
+            tasks=[interpretation_task, validation_task],
+            verbose=False,
+            process=Process.sequential,
+        )
+
+        with span("llm.crew", model=self.model) as crew_span:
+            started = time.time_ns()
+            result = crew.kickoff()
+
+            usage = getattr(result, "token_usage", None)
+            self.last_usage = {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                "cached_tokens": getattr(usage, "cached_prompt_tokens", 0) or 0,
+            }
+            if crew_span:
+                crew_span.attributes.update(self.last_usage)
+                # Split the kickoff into the interpreter and validator calls
+                for name, end in zip(("llm.interpreter", "llm.validator"), task_done):
+                    record_span(name, started, end)
+                    started = end
+
+        # Extract the commands from the CrewOutput and clean them
+        with span("parse"):
+            commands = str(result).strip().split("\n")
+            return [cmd.strip().strip("\"'") for cmd in commands if cmd.strip()]
+
+    def _interpret_single_call(self, natural_language_command: str) -> List[str]:
+        """Interpret a command and annotate its risk in one structured LLM call."""
+        if self.llm is None:
+            self.llm = default_llm()
+
+        with span("llm.single_call", model=self.llm.model) as llm_span:
+            result = self.llm.complete(
+                [
+                    {"role": "system", "content": SINGLE_CALL_SYSTEM_PROMPT},
+                    {"role": "user", "content": self._user_prompt(natural_language_command)},
+                ],
+                json_mode=True,
             )
+            self.last_usage = {
+                "prompt_tokens": result.prompt_tokens,
+                "completion_tokens": result.completion_tokens,
+                "cached_tokens": result.cached_tokens,
+            }
+            if llm_span:
+                llm_span.attributes.update(self.last_usage)
+
+        with span("parse"):
+            plan = parse_annotated_plan(result.text)
+            for item in plan:
+                is_safe, message = check_annotation(item["risk"], item["reason"])
+                if not is_safe:
+                    raise ValueError(f"Plan rejected at '{item['command']}': {message}")
+        return [item["command"] for item in plan]
 
-            validation_task = Task(
-                description=f"""Validate the interpreted commands for safety and correctness.
-                Current Working Directory: {self.current_dir}
-                
-                IMPORTANT: Return the validated commands, one per line, with no explanations or additional text.
-                
-                For process management:
-                - Ensure the commands include proper error handling
-                - Verify the process exists before killing
-                - Use appropriate signal numbers
-                
-                For file operations:
-                - Verify file existence before operations
-                - Use safe file manipulation commands
-                - Handle file permissions appropriately
-                
-                Check for:
-                1. Potentially dangerous operations
-                2. Proper syntax
-                3. Platform compatibility
-                4. Working directory context
-                5. Command sequence validity
-                
-                If the commands are safe, return them as is. If not, return safer alternative commands.""",
-                agent=self.command_validator,
-                expected_output="A list of validated terminal commands, one per line, without any explanation or additional text.",
-                context=[interpretation_task],
+    def _stream_plan(
+        self, natural_language_command: str, early_execution: bool
+    ) -> Tuple[List[str], List[Dict]]:
+        """Stream the plan line by line, validating and optionally running each command."""
+        if self.llm is None:
+            self.llm = default_llm()
+
+        runner = StreamingPlanRunner(self.command_executor, early_execution)
+        assembler = LineAssembler()
+        chunks = self.llm.stream(
+            [
+                {"role": "system", "content": STREAMING_SYSTEM_PROMPT},
+                {"role": "user", "content": self._user_prompt(natural_language_command)},
+            ]
+        )
+        with span("llm.stream", model=self.llm.model, early_execution=early_execution) as llm_span:
+            try:
+                accepted = True
+                for chunk in chunks:
+                    accepted = all(runner.submit_line(line) for line in assembler.feed(chunk))
+                    if not accepted:
+                        break  # Stop generating once the plan cannot continue
+                if accepted:
+                    for line in assembler.flush():
+                        runner.submit_line(line)
+            finally:
+                chunks.close()
+                results = runner.finish()
+
+            self.last_usage = {
+                "prompt_tokens": self.llm.last_stream.prompt_tokens,
+                "completion_tokens": self.llm.last_stream.completion_tokens,
+                "cached_tokens": self.llm.last_stream.cached_tokens,
+            }
+            if llm_span:
+                llm_span.attributes.update(self.last_usage)
+
+        if early_execution:
+            return runner.commands, results
+
+        # Without early execution nothing has run yet, so reject the whole plan
+        if runner.rejection:
+            raise ValueError(
+                f"Plan rejected at '{runner.rejection['command']}': {runner.rejection['message']}"
             )
+        return runner.commands, self.command_executor.execute_sequential_commands(
+            runner.commands
+        )
+
+    def interpret(self, natural_language_command: str, mode: Optional[str] = None) -> List[str]:
+        """Turn a natural language command into a command plan using the LLM."""
+        mode = mode or self.pipeline_mode
+        if mode == "fast":
+            return self._interpret_single_call(natural_language_command)
+        if mode == "paranoid":
+            return self._interpret_with_crew(natural_language_command)
+        raise ValueError(
+            f"Unknown pipeline mode '{mode}', expected one of: {', '.join(PIPELINE_MODES)}"
+        )
+
+    def _plan_locally(
+        self, natural_language_command: str, use_cache: bool
+    ) -> Tuple[Optional[List[str]], str]:
+        """Resolve a plan from the intent matcher or the plan cache, without the LLM."""
+        # Resolve common intents locally before touching the cache or the LLM
+        if self.intent_matcher is not None:
+            with span("plan.intent_match") as match_span:
+                match = self.intent_matcher.match(natural_language_command)
+                if match_span:
+                    match_span.attributes["cache_hit"] = match is not None
+            if match:
+                console.print(f"[dim]Matched local intent: {match.intent}[/dim]")
+                return match.commands, "local"
 
-            # Create and run the crew
-            crew = Crew(
-                agents=[self.command_interpreter, self.command_validator],
-                tasks=[interpretation_task, validation_task],
-                verbose=False,
-                process=Process.sequential,
+        if use_cache:
+            with span("plan.cache_lookup") as cache_span:
+                commands = self.plan_cache.get(
+                    natural_language_command,
+                    self.platform,
+                    self.current_dir,
+                    self.model,
+                )
+                if cache_span:
+                    cache_span.attributes["cache_hit"] = bool(commands)
+            if commands:
+                console.print("[dim]Using cached command plan[/dim]")
+                return commands, "cache"
+
+        if self.history_index is not None and self.choose_suggestion is not None:
+            with span("plan.history_lookup") as lookup_span:
+                suggestions = self.history_index.suggest(
+                    natural_language_command, working_directory=self.current_dir
+                )
+                if lookup_span:
+                    lookup_span.attributes["cache_hit"] = bool(suggestions)
+            chosen = self.choose_suggestion(suggestions) if suggestions else None
+            if chosen:
+                return chosen.commands, "history"
+
+        return None, "llm"
+
+    def plan_commands(
+        self,
+        natural_language_command: str,
+        use_cache: bool = True,
+        mode: Optional[str] = None,
+    ) -> Tuple[List[str], str]:
+        """
+        Build a command plan without executing it.
+
+        Returns:
+            The commands and where they came from: "local", "cache", "history"
+            or "llm"
+        """
+        use_cache = use_cache and self.plan_cache is not None
+        commands, plan_source = self._plan_locally(natural_language_command, use_cache)
+        if not commands:
+            commands = self.interpret(natural_language_command, mode)
+        return commands, plan_source
+
+    def remember_plan(
+        self,
+        natural_language_command: str,
+        plan_source: str,
+        commands: List[str],
+        results: List[Dict],
+    ):
+        """Cache an LLM plan once every command in it validated and ran cleanly."""
+        if any(r.get("repaired") for r in results):
+            # Cache the corrected plan rather than the one that failed
+            results = [r for r in results if not r.get("repaired")]
+            commands = [r["command"] for r in results]
+        if (
+            self.plan_cache is not None
+            and plan_source == "llm"
+            and len(results) == len(commands)
+            and all(r["success"] for r in results)
+        ):
+            self.plan_cache.put(
+                natural_language_command,
+                self.platform,
+                self.current_dir,
+                self.model,
+                commands,
             )
 
-            result = crew.kickoff()
+    def execute_plan(self, commands: List[str], query: Optional[str] = None) -> List[Dict]:
+        """Execute a plan, correcting failed steps when the repair loop is enabled."""
+        self.command_executor.begin_run(query)
+        if self.repair_loop is not None:
+            self.repair_loop.begin()
+        results = self.command_executor.execute_plan(commands)
+        if self.repair_loop is not None:
+            self.repair_loop.learn(results)
+        return results
 
-            # Extract the commands from the CrewOutput and clean them
-            commands = str(result).strip().split("\n")
-            commands = [cmd.strip().strip("\"'") for cmd in commands if cmd.strip()]
+    def process_command(
+        self,
+        natural_language_command: str,
+        use_cache: bool = True,
+        mode: Optional[str] = None,
+        stream: bool = STREAM_PLAN,
+        early_execution: bool = EARLY_EXECUTION,
+    ) -> Dict:
+        """Process a natural language command and execute it safely."""
+        try:
+            use_cache = use_cache and self.plan_cache is not None
+            commands, plan_source = self._plan_locally(natural_language_command, use_cache)
+            self.command_executor.begin_run(natural_language_command)
+            if self.repair_loop is not None:
+                self.repair_loop.begin()
+
+            results = None
+            if not commands and stream:
+                commands, results = self._stream_plan(
+                    natural_language_command, early_execution
+                )
+            elif not commands:
+                commands = self.interpret(natural_language_command, mode)
 
             if not commands:
                 error_msg = "No valid commands were generated"
@@ -152,18 +454,25 @@ class CommandAI:
                     "working_directory": self.current_dir,
                 }
 
-            # Execute the commands sequentially
-            results = self.command_executor.execute_sequential_commands(commands)
+            # Execute the commands sequentially; every command is validated,
+            # including those that come from the cache
+            if results is None:
+                results = self.command_executor.execute_plan(commands)
+            if self.repair_loop is not None:
+                self.repair_loop.learn(results)
 
-            # Display results for each command
-            for result in results:
-                self.command_executor.display_result(
-                    result["success"], result["output"]
-                )
+            if use_cache:
+                self.remember_plan(natural_language_command, plan_source, commands, results)
+
+            # Display results for each command; this is the only place they are rendered
+            with span("render"):
+                for result in results:
+                    self.command_executor.render_result(result)
 
             return {
                 "original_command": natural_language_command,
                 "interpreted_commands": commands,
+                "plan_source": plan_source,
                 "results": results,
                 "working_directory": self.current_dir,
             }
@@ -177,6 +486,11 @@ class CommandAI:
                 "working_directory": self.current_dir,
             }
 
+    def set_working_directory(self, path: str):
+        """Point subsequent commands at a different working directory."""
+        self.current_dir = path
+        self.command_executor.original_cwd = path
+
     def get_command_history(self) -> List[Dict]:
         """Get the history of executed commands."""
         return self.command_executor.get_command_history()
@@ -0,0 +1,207 @@
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ai_agent import CommandAI
+from config import BATCH_CONCURRENCY
+from plan_cache import normalize_query
+
+
+@dataclass
+class BatchItem:
+    """One query read from a batch input."""
+
+    index: int
+    query: str
+    cwd: str
+    id: Optional[str] = None
+    error: Optional[str] = None  # Set for a line that could not be read as a query
+
+
+def read_batch(lines: Iterable[str], default_cwd: str) -> Iterator[BatchItem]:
+    """
+    Parse batch input lazily.
+
+    Each line is either plain text (one query) or a JSON object with a
+    "query" and optional "cwd" and "id". A line that starts with "{" but is
+    not valid JSON is plain text, unless it starts with '{"' or ends with
+    "}" and so was meant as JSON. Blank lines and lines starting with "#"
+    are skipped. A line that cannot be used yields an item with its error
+    set, so the rest of the batch still runs.
+    """
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            item = _json_item(index, line, default_cwd)
+        else:
+            item = BatchItem(index=index, query=line, cwd=default_cwd)
+        index += 1
+        yield item
+
+
+def _json_item(index: int, line: str, default_cwd: str) -> BatchItem:
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        if not (line.startswith('{"') or line.endswith("}")):
+            return BatchItem(index=index, query=line, cwd=default_cwd)  # e.g. "{a,b}.txt files"
+        return BatchItem(index=index, query=line, cwd=default_cwd, error=f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        return BatchItem(index=index, query=line, cwd=default_cwd, error="Not a JSON object")
+    query, cwd, item_id = data.get("query"), data.get("cwd"), data.get("id")
+    if not isinstance(query, str) or not query.strip():
+        error = 'Missing "query"'
+    elif cwd is not None and not isinstance(cwd, str):
+        error = '"cwd" must be a string'
+    else:
+        return BatchItem(
+            index=index,
+            query=query,
+            cwd=os.path.abspath(cwd or default_cwd),
+            id=item_id,
+        )
+    return BatchItem(index=index, query=line, cwd=default_cwd, id=item_id, error=error)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class BatchRunner:
+    """
+    Interpret and execute many queries with bounded concurrency.
+
+    Interpretation runs on a pool of at most ``concurrency`` concurrent LLM
+    calls, and identical queries in the same directory share one plan.
+    Execution keeps input order within each working directory, and different
+    directories run in parallel. One JSON line is written per query as soon as
+    it finishes.
+    """
+
+    def __init__(
+        self,
+        out: IO[str],
+        concurrency: int = BATCH_CONCURRENCY,
+        use_cache: bool = True,
+        mode: Optional[str] = None,
+    ):
+        self.out = out
+        self.use_cache = use_cache
+        self.mode = mode
+        self._interpret_pool = ThreadPoolExecutor(concurrency, thread_name_prefix="swat-plan")
+        self._execute_pool = ThreadPoolExecutor(concurrency, thread_name_prefix="swat-exec")
+        # Bound queued work so a large stdin stream is not read into memory at once
+        self._in_flight = threading.BoundedSemaphore(concurrency * 4)
+        self._local = threading.local()
+        self._plans: Dict[Tuple[str, str], Future] = {}
+        self._lanes: Dict[str, Future] = {}
+        self._write_lock = threading.Lock()
+        self.latencies: List[float] = []
+
+    def _ai(self, cwd: str) -> CommandAI:
+        """CommandAI for the current worker thread, pointed at cwd."""
+        ai = getattr(self._local, "ai", None)
+        if ai is None:
+            ai = CommandAI()
+            ai.command_executor.live_output = False
+            self._local.ai = ai
+        ai.set_working_directory(cwd)
+        return ai
+
+    def _plan(self, item: BatchItem) -> Tuple[List[str], str]:
+        return self._ai(item.cwd).plan_commands(item.query, self.use_cache, self.mode)
+
+    def _execute(self, item: BatchItem, plan: Future, previous: Optional[Future], started: float):
+        try:
+            if previous is not None:
+                previous.result()  # Keep input order within a working directory
+            record = {
+                "index": item.index,
+                "id": item.id,
+                "query": item.query,
+                "cwd": item.cwd,
+            }
+            try:
+                commands, plan_source = plan.result()
+                ai = self._ai(item.cwd)
+                results = ai.execute_plan(commands, item.query) if commands else []
+                if self.use_cache:
+                    ai.remember_plan(item.query, plan_source, commands, results)
+                record.update(
+                    plan_source=plan_source,
+                    commands=commands,
+                    results=results,
+                    success=bool(results) and all(r["success"] for r in results),
+                )
+                if not commands:
+                    record["error"] = "No valid commands were generated"
+            except Exception as e:
+                record.update(success=False, error=str(e))
+
+            self._write(record, started)
+        finally:
+            self._in_flight.release()
+
+    def _write(self, record: Dict, started: float):
+        latency = time.perf_counter() - started
+        record["latency_ms"] = round(latency * 1000, 1)
+        with self._write_lock:
+            self.latencies.append(latency)
+            self.out.write(json.dumps(record) + "\n")
+            self.out.flush()
+
+    def run(self, items: Iterable[BatchItem]) -> Dict:
+        """Process every item and return throughput and latency statistics."""
+        start = time.perf_counter()
+        submitted = 0
+        try:
+            for item in items:
+                started = time.perf_counter()
+                if item.error:
+                    record = {
+                        "index": item.index,
+                        "id": item.id,
+                        "query": item.query,
+                        "cwd": item.cwd,
+                        "success": False,
+                        "error": item.error,
+                    }
+                    self._write(record, started)
+                    submitted += 1
+                    continue
+                self._in_flight.acquire()
+                key = (normalize_query(item.query), item.cwd)
+                plan = self._plans.get(key)
+                if plan is None:
+                    plan = self._interpret_pool.submit(self._plan, item)
+                    self._plans[key] = plan
+                previous = self._lanes.get(item.cwd)
+                self._lanes[item.cwd] = self._execute_pool.submit(
+                    self._execute, item, plan, previous, started
+                )
+                submitted += 1
+        finally:
+            self._execute_pool.shutdown(wait=True)
+            self._interpret_pool.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "queries": submitted,
+            "unique_plans": len(self._plans),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_qps": round(submitted / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(_percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(_percentile(self.latencies, 95) * 1000, 1),
+        }
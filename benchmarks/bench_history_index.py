@@ -0,0 +1,175 @@
+"""
+Latency and recall check for the history suggestion index.
+
+Usage:
+    python benchmarks/bench_history_index.py [--entries N] [--json]
+
+Writes a synthetic history of N entries to a scratch JSONL store, builds the
+index from it, then appends a few runs and checks that the refresh reads
+only those. Lookups are timed over a set of paraphrased queries, each
+refreshing the index first as swat does. Lookups that follow a re-run of an
+indexed query, so the refresh replaces that plan, are timed separately.
+
+Exits with status 1 if either p95 lookup exceeds the latency budget, if a
+refresh rereads old entries, or if a paraphrase does not find its plan or
+a query for another port or file, or with its operands swapped, finds one.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_index import HistoryIndex  # noqa: E402
+from history_store import JsonlHistoryStore  # noqa: E402
+
+LATENCY_BUDGET_MS = 10.0
+
+# Runs recorded in history: (query, plan)
+RUNS = [
+    ("kill whatever is running on port 8080", ["lsof -ti :8080 | xargs kill -9"]),
+    ("show disk usage of this folder sorted by size", ["du -sh * | sort -h"]),
+    ("count lines in all python files", ["find . -name '*.py' | xargs wc -l"]),
+    ("show the last 50 lines of app.log", ["tail -n 50 app.log"]),
+    ("list docker containers that are running", ["docker ps"]),
+    ("copy notes.txt to backup.txt", ["cp notes.txt backup.txt"]),
+    ("move the reports directory into backups", ["mv reports backups"]),
+]
+
+# (query, query of the run it must find, or None when nothing may match)
+CORPUS = [
+    ("kill the thing running on port 8080", "kill whatever is running on port 8080"),
+    ("what's using port 8080, kill it", "kill whatever is running on port 8080"),
+    ("kill whatever is running on port 3000", None),
+    ("disk usage sorted by size", "show disk usage of this folder sorted by size"),
+    ("count lines of python files", "count lines in all python files"),
+    ("last 50 lines of app.log", "show the last 50 lines of app.log"),
+    ("show the last 50 lines of db.log", None),
+    ("running docker containers", "list docker containers that are running"),
+    ("wc -l python files", "count lines in all python files"),
+    ("compress the build folder into a tarball", None),
+    ("copy the notes.txt file to backup.txt", "copy notes.txt to backup.txt"),
+    ("copy backup.txt to notes.txt", None),
+    ("move backups into reports", None),
+    ("move reports into the backups directory", "move the reports directory into backups"),
+]
+
+_WORDS = (
+    "show list find count kill stop start remove copy move archive compress files folder "
+    "logs service process port user disk memory network config build cache temp old large "
+    "hidden recent git branch commit docker container image package python node java"
+).split()
+_COMMANDS = ["ls -la", "git status", "df -h", "ps aux", "du -sh", "cat notes.txt", "pwd"]
+
+
+def _entries(query, commands, run_id, timestamp, cwd="/home/user/project"):
+    for command in commands:
+        yield {
+            "command": command,
+            "output": "",
+            "timestamp": timestamp,
+            "status": "success",
+            "working_directory": cwd,
+            "query": query,
+            "run_id": run_id,
+        }
+
+
+def write_history(store: JsonlHistoryStore, entries: int, rng: random.Random):
+    """Synthetic runs of random queries around the fixed RUNS."""
+    lines = []
+    for i in range(entries):
+        query = " ".join(rng.sample(_WORDS, rng.randint(3, 7))) + f" {rng.randint(1, 500)}"
+        run_id = uuid.uuid4().hex[:12]
+        lines.extend(_entries(query, [rng.choice(_COMMANDS)], run_id, f"2026-01-01T{i:08d}"))
+    for query, commands in RUNS:
+        lines.extend(_entries(query, commands, uuid.uuid4().hex[:12], "2026-02-01T00:00:00"))
+    with open(store.path, "a") as f:
+        f.write("".join(json.dumps(line) + "\n" for line in lines))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JsonlHistoryStore(Path(tmp) / "history.jsonl", legacy_file=Path(tmp) / "none.json")
+        write_history(store, args.entries, rng)
+        index = HistoryIndex(store, Path(tmp) / "index.db")
+
+        started = time.perf_counter()
+        indexed = index.refresh()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        for query, commands in RUNS[:2]:
+            for entry in _entries(query, commands, uuid.uuid4().hex[:12], "2026-03-01T00:00:00"):
+                store.append(entry)
+        started = time.perf_counter()
+        appended = index.refresh()
+        refresh_ms = (time.perf_counter() - started) * 1000
+        if appended != 2:
+            failures.append(f"refresh read {appended} entries, expected 2")
+
+        timings = []
+        mismatches = {}
+        for _ in range(args.rounds):
+            for query, expected in CORPUS:
+                started = time.perf_counter()
+                suggestions = index.suggest(query, working_directory="/home/user/project")
+                timings.append((time.perf_counter() - started) * 1000)
+                found = suggestions[0].query if suggestions else None
+                if found != expected:
+                    mismatches[query] = found
+
+        # A known query runs again, then the next lookup must re-index its plan
+        rerun_timings = []
+        for round_ in range(args.rounds):
+            query, commands = RUNS[round_ % len(RUNS)]
+            for entry in _entries(query, commands, uuid.uuid4().hex[:12], "2026-04-01T00:00:00"):
+                store.append(entry)
+            started = time.perf_counter()
+            index.suggest(query, working_directory="/home/user/project")
+            rerun_timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        rerun_timings.sort()
+        result = {
+            "entries": args.entries,
+            "indexed_entries": indexed,
+            "plans": index.stats()["plans"],
+            "build_ms": round(build_ms, 1),
+            "incremental_refresh_ms": round(refresh_ms, 2),
+            "lookup_p50_ms": round(statistics.median(timings), 3),
+            "lookup_p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+            "rerun_lookup_p95_ms": round(rerun_timings[int(len(rerun_timings) * 0.95) - 1], 3),
+        }
+
+    failures.extend(f"'{query}' matched {found!r}" for query, found in mismatches.items())
+    for key in ("lookup_p95_ms", "rerun_lookup_p95_ms"):
+        if result[key] > LATENCY_BUDGET_MS:
+            failures.append(f"{key} {result[key]} ms exceeds {LATENCY_BUDGET_MS} ms")
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>24}: {value}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
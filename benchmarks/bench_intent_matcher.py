@@ -0,0 +1,102 @@
+"""
+Corpus check for the local intent matcher: match accuracy and latency.
+
+Usage:
+    python benchmarks/bench_intent_matcher.py
+
+Exits with status 1 if any corpus query resolves to the wrong commands, if a
+query that should go to the LLM is matched locally, or if the mean match time
+exceeds the latency budget.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PLATFORM_COMMANDS  # noqa: E402
+from intent_matcher import IntentMatcher  # noqa: E402
+
+LATENCY_BUDGET_US = 50.0
+
+# (query, expected commands on linux); None means the query must go to the LLM
+CORPUS = [
+    ("find the port 8080 and kill it", ["lsof -ti :8080 | xargs kill -9"]),
+    ("Find the port 3000 and kill it.", ["lsof -ti :3000 | xargs kill -9"]),
+    ("kill the process on port 5432", ["lsof -ti :5432 | xargs kill -9"]),
+    ("kill whatever is running on port 8080", None),
+    ("stop the process running on port 9000", ["lsof -ti :9000 | xargs kill -9"]),
+    ("kill port 8000", ["lsof -ti :8000 | xargs kill -9"]),
+    ("what is running on port 8080", ["lsof -i :8080"]),
+    ("find the process on port 5000", ["lsof -i :5000"]),
+    ("show me what's listening on port 443", None),
+    ("kill process 1234", ["kill -9 1234"]),
+    ("kill pid 42", ["kill -9 42"]),
+    ("list all files", ["ls -la"]),
+    ("list all files in the current directory", ["ls -la"]),
+    ("show files", ["ls -la"]),
+    ("create a new directory called projects", ["mkdir projects"]),
+    ("make a folder named build-output", ["mkdir build-output"]),
+    ("create a directory love", ["mkdir love"]),
+    ("find all .py files in the current directory", ['find . -name "*.py"']),
+    ("find all *.log files", ['find . -name "*.log"']),
+    ("find files named config.yaml", ['find . -name "config.yaml"']),
+    ("show the contents of README.md", ["cat README.md"]),
+    ("cat .gitignore", ["cat .gitignore"]),
+    ("read the file love/.env", ["cat love/.env"]),
+    ('append "i love coding" to love/.env', ["echo 'i love coding' >> love/.env"]),
+    ("add 'ignored_file.txt' to .gitignore", ["echo ignored_file.txt >> .gitignore"]),
+    ("show me the current directory", ["pwd"]),
+    ("where am i", ["pwd"]),
+    ("show running processes", ["ps aux"]),
+    ("who am i", ["whoami"]),
+    (
+        "show me the current directory and list all files",
+        ["pwd", "ls -la"],
+    ),
+    (
+        "create a new directory called projects and list all files",
+        ["mkdir projects", "ls -la"],
+    ),
+    # Queries the rules must leave to the LLM
+    ("check disk space usage", None),
+    ("create a new directory called projects and list all files in it", None),
+    ("find the port 8080", None),
+    ("move projects to projects_backup", None),
+    ("delete all files older than 7 days", None),
+    ("kill the port 8080 process and restart nginx", None),
+    ("find the biggest file in this directory", None),
+    ("compress the logs folder", None),
+    ("", None),
+]
+
+
+def main() -> int:
+    matcher = IntentMatcher(lambda key: PLATFORM_COMMANDS["linux"].get(key), posix=True)
+
+    failures = []
+    for query, expected in CORPUS:
+        match = matcher.match(query)
+        actual = match.commands if match else None
+        if actual != expected:
+            failures.append((query, expected, actual))
+
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query, _expected in CORPUS:
+            matcher.match(query)
+    mean_us = (time.perf_counter() - start) / (rounds * len(CORPUS)) * 1e6
+
+    accuracy = 1 - len(failures) / len(CORPUS)
+    print(f"corpus size:  {len(CORPUS)}")
+    print(f"accuracy:     {accuracy:.1%}")
+    print(f"mean latency: {mean_us:.1f} us/query (budget {LATENCY_BUDGET_US:.0f} us)")
+    for query, expected, actual in failures:
+        print(f"MISMATCH {query!r}: expected {expected}, got {actual}")
+
+    return 1 if failures or mean_us > LATENCY_BUDGET_US else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+End-to-end offline benchmark of process_command with a fake LLM.
+
+Usage:
+    python benchmarks/bench_offline.py [--workload NAME] [--rounds N]
+        [--latency-ms MS] [--stream] [--cache] [--fast-path] [--json]
+        [--max-overhead-ms MS]
+
+A deterministic FakeChatClient replaces the model, so the numbers measure
+swat's own overhead: planning, validation, execution, history and rendering.
+Workloads:
+    history       queries implied by command_history.json
+    long_plan     one query that expands to a 40-step plan
+    large_output  commands that print tens of megabytes
+
+Commands run in a scratch directory with HOME pointing at it, using
+scratch history and cache databases. Commands that kill processes or use
+the network are left out. For each workload the script reports throughput,
+latency percentiles, overhead (latency minus simulated model time) and
+peak RSS. It exits with status 1 if --max-overhead-ms is given and a
+workload's p95 overhead is above it.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rich.console import Console  # noqa: E402
+
+import ai_agent  # noqa: E402
+import command_executor  # noqa: E402
+from ai_agent import CommandAI  # noqa: E402
+from batch import _percentile  # noqa: E402
+from command_policy import parse_command  # noqa: E402
+from fake_llm import FakeChatClient  # noqa: E402
+from history_store import SqliteHistoryStore  # noqa: E402
+from output_store import BlobStore  # noqa: E402
+from plan_cache import PlanCache  # noqa: E402
+from repair import FixTable  # noqa: E402
+
+# Left out of workloads: they would touch other processes or the network
+_EXCLUDED = {"kill", "pkill", "killall", "taskkill", "ping", "traceroute", "dig", "nslookup",
+             "whois", "curl", "wget", "top"}
+LARGE_FILE_BYTES = 32 * 1024 * 1024
+
+
+def implied_query(command: str) -> str:
+    """A natural-language request that would plausibly produce this command."""
+    words = command.split()
+    name, args = words[0], words[1:]
+    target = args[-1] if args else ""
+    if name == "mkdir":
+        return f"create a directory called {target}"
+    if name == "rm":
+        return f"delete {target}"
+    if name == "touch":
+        return f"create an empty file {target}"
+    if name == "mv":
+        return f"rename {args[0]} to {target}"
+    if name == "cd":
+        return f"go into {target}"
+    if name == "pwd":
+        return "where am i"
+    if name == "echo" and ">" in command:
+        return f"write some text into {target}"
+    return f"run {command}"
+
+
+def history_workload(path: str) -> List[Tuple[str, List[str]]]:
+    with open(path) as f:
+        commands = [entry["command"] for entry in json.load(f) if entry.get("command")]
+    workload = []
+    for command in commands:
+        names = {simple.name for simple in parse_command(command).commands}
+        if names & _EXCLUDED:
+            continue
+        workload.append((implied_query(command), [command]))
+    return workload
+
+
+def long_plan_workload() -> List[Tuple[str, List[str]]]:
+    plan = []
+    for i in range(10):
+        plan += [f"mkdir -p step{i}", f"touch step{i}/notes.txt",
+                 f"echo 'step {i}' >> step{i}/notes.txt", f"cat step{i}/notes.txt"]
+    return [("set up ten step directories with notes", plan)]
+
+
+def large_output_workload(scratch: Path) -> List[Tuple[str, List[str]]]:
+    line = b"2024-01-01T00:00:00 INFO request served in 12ms from cache\n"
+    with open(scratch / "big.log", "wb") as f:
+        for _ in range(LARGE_FILE_BYTES // len(line)):
+            f.write(line)
+    return [
+        ("show me the whole big log", ["cat big.log"]),
+        ("count the info lines in the big log", ["grep -c INFO big.log"]),
+    ]
+
+
+def peak_rss_mb() -> Tuple[float, float]:
+    """Peak resident set size of this process and of its largest child, in MB."""
+    per_mb = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / per_mb
+    return own, children
+
+
+def run_workload(ai: CommandAI, fake: FakeChatClient, workload, rounds: int, stream: bool) -> Dict:
+    latencies, overheads, failures = [], [], 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query, _plan in workload:
+            waited = fake.waited
+            began = time.perf_counter()
+            result = ai.process_command(query, stream=stream, early_execution=stream)
+            latency = time.perf_counter() - began
+            latencies.append(latency)
+            overheads.append(latency - (fake.waited - waited))
+            if "error" in result:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    own_rss, child_rss = peak_rss_mb()
+    return {
+        "queries": len(latencies),
+        "errors": failures,
+        "throughput_qps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "overhead_p50_ms": round(_percentile(overheads, 50) * 1000, 2),
+        "overhead_p95_ms": round(_percentile(overheads, 95) * 1000, 2),
+        "peak_rss_mb": round(own_rss, 1),
+        "peak_child_rss_mb": round(child_rss, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workload", choices=["history", "long_plan", "large_output", "all"],
+                        default="all")
+    parser.add_argument("--rounds", type=int, default=3, help="Times to run each workload")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated model latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Simulated streaming speed (0 = instant)")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming pipeline")
+    parser.add_argument("--cache", action="store_true", help="Enable the plan cache")
+    parser.add_argument("--fast-path", action="store_true", help="Enable the local intent matcher")
+    parser.add_argument("--history", default=os.path.join(ROOT, "command_history.json"))
+    parser.add_argument("--json", action="store_true", help="Print one JSON line per workload")
+    parser.add_argument("--max-overhead-ms", type=float, default=None,
+                        help="Fail if a workload's p95 overhead exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = Path(tmp)
+        os.environ["HOME"] = tmp  # Keep ~ in recorded commands inside the scratch directory
+        os.chdir(tmp)
+
+        workloads = {}
+        if args.workload in ("history", "all"):
+            workloads["history"] = history_workload(args.history)
+        if args.workload in ("long_plan", "all"):
+            workloads["long_plan"] = long_plan_workload()
+        if args.workload in ("large_output", "all"):
+            workloads["large_output"] = large_output_workload(scratch)
+
+        fake = FakeChatClient(
+            {query: plan for workload in workloads.values() for query, plan in workload},
+            latency=args.latency_ms / 1000,
+            tokens_per_second=args.tokens_per_second,
+        )
+        ai = CommandAI()
+        ai.pipeline_mode = "fast"
+        ai.llm = fake
+        ai.set_working_directory(tmp)
+        ai.command_executor.live_output = False
+        ai.command_executor.history_store = SqliteHistoryStore(
+            scratch / "history.db", legacy_file=scratch / "no-legacy-history.json"
+        )
+        ai.plan_cache = PlanCache(scratch / "plan_cache.db") if args.cache else None
+        ai.command_executor.blob_store = BlobStore(scratch / "outputs")
+        if not args.fast_path:
+            ai.intent_matcher = None
+        if ai.repair_loop is not None:
+            ai.repair_loop.llm = fake
+            ai.repair_loop.fix_table = FixTable(scratch / "repair_fixes.db")
+
+        # Render to /dev/null: rendering cost is measured, terminal speed is not
+        with open(os.devnull, "w") as devnull:
+            quiet = Console(file=devnull, width=120)
+            ai_agent.console = command_executor.console = quiet
+            failed = False
+            for name, workload in workloads.items():
+                stats = run_workload(ai, fake, workload, args.rounds, args.stream)
+                if args.max_overhead_ms is not None and stats["overhead_p95_ms"] > args.max_overhead_ms:
+                    failed = True
+                if args.json:
+                    print(json.dumps({"workload": name, **stats}))
+                else:
+                    print(
+                        f"{name:<13} {stats['queries']:4d} queries  {stats['throughput_qps']:8.1f} q/s  "
+                        f"p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  "
+                        f"p99 {stats['p99_ms']:7.2f} ms  overhead p95 {stats['overhead_p95_ms']:7.2f} ms  "
+                        f"rss {stats['peak_rss_mb']:.0f} MB (child {stats['peak_child_rss_mb']:.0f} MB)"
+                        f"{'  errors: ' + str(stats['errors']) if stats['errors'] else ''}"
+                    )
+        os.chdir(ROOT)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Compare wall-clock time and tokens per query for the fast and paranoid pipelines.
+
+Usage:
+    python benchmarks/bench_pipeline_modes.py [--rounds N]
+
+Only interpretation is measured; no command is executed. Requires a
+configured LLM API key, since both modes call the real model.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_agent import CommandAI, PIPELINE_MODES  # noqa: E402
+
+QUERIES = [
+    "check disk space usage",
+    "create a new directory called projects and list all files in it",
+    "rename projects to projects_backup",
+    "kill whatever is running on port 8080",
+    "count the lines in every python file here",
+    "show the 5 largest files in this directory",
+]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1, help="Times to run each query")
+    args = parser.parse_args()
+
+    ai = CommandAI()
+    print(f"{'mode':<10}{'p50 s':>10}{'mean s':>10}{'prompt tok':>12}{'compl tok':>12}")
+    for mode in PIPELINE_MODES:
+        times, prompt_tokens, completion_tokens = [], [], []
+        for _ in range(args.rounds):
+            for query in QUERIES:
+                start = time.perf_counter()
+                try:
+                    ai.interpret(query, mode=mode)
+                except ValueError:
+                    pass  # A rejected plan still costs a full round-trip
+                times.append(time.perf_counter() - start)
+                prompt_tokens.append(ai.last_usage.get("prompt_tokens", 0))
+                completion_tokens.append(ai.last_usage.get("completion_tokens", 0))
+        print(
+            f"{mode:<10}{statistics.median(times):>10.2f}{statistics.mean(times):>10.2f}"
+            f"{statistics.mean(prompt_tokens):>12.0f}{statistics.mean(completion_tokens):>12.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+Per-request token accounting for the interpretation prompts.
+
+Usage:
+    python benchmarks/bench_prompt_tokens.py [--json] [--prefill-tps N]
+        [--min-cache-tokens N] [--live] [--rounds N]
+
+Builds the prompts every pipeline sends for a set of queries, once with
+the prompts used before the prefix/suffix split ("legacy") and once with
+the current ones from prompts.py. For each LLM call it reports the input
+tokens, the prefix shared with the previous request (what a provider's
+prompt cache can reuse) and the uncached remainder. Latency is estimated
+from the uncached tokens at --prefill-tps prompt tokens per second.
+OpenAI only caches prefixes of at least 1024 tokens; pass
+--min-cache-tokens 1024 to model that. Local servers such as llama.cpp
+and Ollama reuse any matching prefix.
+
+Tokens are counted with tiktoken when it is installed, otherwise
+estimated at 4 characters per token. Crew prompts follow crewai's layout
+(role, backstory and goal, then the task and expected output) without
+its fixed scaffolding, which is the same in both variants.
+
+With --live, the fast pipeline's prompts are also sent to the configured
+backend and the measured latency, prompt tokens and cached tokens are
+reported. This requires an API key.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompts  # noqa: E402
+
+QUERIES = [
+    "check disk space usage",
+    "create a new directory called projects and list all files in it",
+    "rename projects to projects_backup",
+    "kill whatever is running on port 8080",
+    "count the lines in every python file here",
+    "show the 5 largest files in this directory",
+]
+PLATFORM = "linux"
+CWD = "/home/user/project"
+SAMPLE_PLAN = "ls -la"  # Interpreter output the validator sees as context
+
+INTERPRETER = ("Command Interpreter", "Interpret natural language commands into executable terminal commands")
+VALIDATOR = ("Command Validator", "Validate and ensure the safety of terminal commands")
+INTERPRETER_OUTPUT = "A list of terminal commands, one per line, without any explanation or additional text."
+VALIDATOR_OUTPUT = "A list of validated terminal commands, one per line, without any explanation or additional text."
+
+# Prompts as they were before the prefix/suffix split, minus trailing whitespace
+_LEGACY_RULES = """Rules:
+- Commands run in sequence in the given working directory. Do not use absolute paths unless requested.
+- Use the most efficient and safe command combination for the given operating system.
+- Rate a command "high" risk if it can destroy data, affect the whole system or cannot be undone.
+- Process management: find and kill a process on port X with lsof -ti :X | xargs kill -9, find a process with lsof -i :X, kill a process with kill -9 PID.
+- File operations: find files with find . -name "filename", check contents with cat filename, append with echo "content" >> filename."""
+
+LEGACY_SINGLE_CALL_SYSTEM_PROMPT = f"""You convert natural language requests into terminal commands and rate the safety of each command.
+
+Return only a JSON object of the form:
+{{"commands": [{{"command": "<terminal command>", "risk": "low|medium|high", "reason": "<short reason>"}}], "confidence": <0.0 to 1.0>}}
+
+"confidence" is how sure you are that the commands do exactly what was asked.
+
+{_LEGACY_RULES}"""
+
+LEGACY_STREAMING_SYSTEM_PROMPT = f"""You convert natural language requests into terminal commands and rate the safety of each command.
+
+Return one JSON object per line, one line per command, in execution order, with no other text:
+{{"command": "<terminal command>", "risk": "low|medium|high", "reason": "<short reason>"}}
+
+{_LEGACY_RULES}"""
+
+LEGACY_INTERPRETER_BACKSTORY = """You are an expert at understanding natural language and converting it into
+            precise terminal commands. You understand the nuances of different operating systems
+            and can adapt commands accordingly. You can break down complex tasks into multiple sequential commands.
+
+            For process management:
+            - To find a process on a port: lsof -i :PORT
+            - To kill a process: kill -9 PID
+            - To find and kill in one command: lsof -ti :PORT | xargs kill -9
+
+            For file operations:
+            - To find files: find . -name "filename"
+            - To check file contents: cat filename
+            - To append to files: echo "content" >> filename
+
+            Always use the most efficient and safe command combination.
+            Always consider the current working directory context."""
+
+LEGACY_VALIDATOR_BACKSTORY = """You are a security expert who validates terminal commands for safety
+            and potential risks. You ensure that commands are safe to execute and won't cause
+            harm to the system. You can validate multiple sequential commands.
+
+            For process management:
+            - Always verify the process exists before killing
+            - Use appropriate signal numbers (9 for force kill)
+            - Combine find and kill operations when safe to do so
+
+            For file operations:
+            - Verify file existence before operations
+            - Use safe file manipulation commands
+            - Handle file permissions appropriately
+
+            Always ensure commands respect the current working directory context."""
+
+
+def legacy_interpretation_task(platform: str, cwd: str, query: str) -> str:
+    return f"""Convert the following natural language command into one or more terminal commands for {platform} system.
+            Command: {query}
+            Current Working Directory: {cwd}
+
+
+            IMPORTANT:
+            - Return a list of terminal commands separated by newlines, with no explanations or additional text.
+            - Each command should be on a new line.
+            - Commands should be executed in the current working directory: {cwd}
+            - Do not use absolute paths unless specifically requested
+
+            For process management:
+            - To find and kill a process on port X: lsof -ti :X | xargs kill -9
+            - To find a process: lsof -i :X
+            - To kill a process: kill -9 PID
+
+            For file operations:
+            - To find files: find . -name "filename"
+            - To check file contents: cat filename
+            - To append to files: echo "content" >> filename
+
+            Consider:
+            1. The current operating system ({platform})
+            2. The most efficient way to achieve the goal
+            3. Safety and best practices
+            4. Current working directory context
+            5. Command dependencies and sequence"""
+
+
+def legacy_validation_task(platform: str, cwd: str) -> str:
+    return f"""Validate the interpreted commands for safety and correctness.
+            Current Working Directory: {cwd}
+
+            IMPORTANT: Return the validated commands, one per line, with no explanations or additional text.
+
+            For process management:
+            - Ensure the commands include proper error handling
+            - Verify the process exists before killing
+            - Use appropriate signal numbers
+
+            For file operations:
+            - Verify file existence before operations
+            - Use safe file manipulation commands
+            - Handle file permissions appropriately
+
+            Check for:
+            1. Potentially dangerous operations
+            2. Proper syntax
+            3. Platform compatibility
+            4. Working directory context
+            5. Command sequence validity
+
+            If the commands are safe, return them as is. If not, return safer alternative commands."""
+
+
+def _legacy_user(query: str) -> str:
+    return f"Operating system: {PLATFORM}\nCurrent Working Directory: {CWD}\nCommand: {query}"
+
+
+def _crew_messages(agent, backstory: str, task: str, expected: str, context: str = "") -> List[Dict]:
+    role, goal = agent
+    user = f"Current Task: {task}\n\nThis is the expected criteria for your final answer: {expected}"
+    if context:
+        user += f"\n\nThis is the context you're working with:\n{context}"
+    return [
+        {"role": "system", "content": f"You are {role}. {backstory}\nYour personal goal is: {goal}"},
+        {"role": "user", "content": user},
+    ]
+
+
+def legacy_calls(query: str) -> Dict[str, List[Dict]]:
+    """Messages of every LLM call for one query, with the legacy prompts."""
+    return {
+        "fast": [
+            {"role": "system", "content": LEGACY_SINGLE_CALL_SYSTEM_PROMPT},
+            {"role": "user", "content": _legacy_user(query)},
+        ],
+        "stream": [
+            {"role": "system", "content": LEGACY_STREAMING_SYSTEM_PROMPT},
+            {"role": "user", "content": _legacy_user(query)},
+        ],
+        "crew.interpreter": _crew_messages(
+            INTERPRETER,
+            LEGACY_INTERPRETER_BACKSTORY,
+            legacy_interpretation_task(PLATFORM, CWD, query),
+            INTERPRETER_OUTPUT,
+        ),
+        "crew.validator": _crew_messages(
+            VALIDATOR,
+            LEGACY_VALIDATOR_BACKSTORY,
+            legacy_validation_task(PLATFORM, CWD),
+            VALIDATOR_OUTPUT,
+            SAMPLE_PLAN,
+        ),
+    }
+
+
+def current_calls(query: str) -> Dict[str, List[Dict]]:
+    """Messages of every LLM call for one query, with the current prompts."""
+    suffix = prompts.request_prompt(PLATFORM, CWD, query=query)
+    return {
+        "fast": [
+            {"role": "system", "content": prompts.SINGLE_CALL_SYSTEM_PROMPT},
+            {"role": "user", "content": suffix},
+        ],
+        "stream": [
+            {"role": "system", "content": prompts.STREAMING_SYSTEM_PROMPT},
+            {"role": "user", "content": suffix},
+        ],
+        "crew.interpreter": _crew_messages(
+            INTERPRETER,
+            prompts.INTERPRETER_BACKSTORY,
+            f"{prompts.INTERPRETATION_TASK}\n\n{suffix}",
+            INTERPRETER_OUTPUT,
+        ),
+        "crew.validator": _crew_messages(
+            VALIDATOR,
+            prompts.VALIDATOR_BACKSTORY,
+            f"{prompts.VALIDATION_TASK}\n\n{prompts.request_prompt(PLATFORM, CWD)}",
+            VALIDATOR_OUTPUT,
+            SAMPLE_PLAN,
+        ),
+    }
+
+
+def token_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: (len(text) + 3) // 4
+    encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+def _flatten(messages: List[Dict]) -> str:
+    # Providers cache on the serialized conversation, so compare it as one string
+    return "".join(f"<{m['role']}>{m['content']}" for m in messages)
+
+
+def _common_prefix(a: str, b: str) -> str:
+    return os.path.commonprefix([a, b])
+
+
+def account(variant: str, build, count, min_cache_tokens: int, prefill_tps: float) -> List[Dict]:
+    """Token accounting for every call of every query, in order."""
+    rows, previous = [], {}
+    for index, query in enumerate(QUERIES):
+        for call, messages in build(query).items():
+            text = _flatten(messages)
+            tokens = count(text)
+            cached = count(_common_prefix(text, previous[call])) if call in previous else 0
+            if cached < min_cache_tokens:
+                cached = 0
+            previous[call] = text
+            rows.append(
+                {
+                    "variant": variant,
+                    "call": call,
+                    "request": index,
+                    "input_tokens": tokens,
+                    "cacheable_tokens": cached,
+                    "uncached_tokens": tokens - cached,
+                    "est_prefill_ms": round((tokens - cached) / prefill_tps * 1000, 2),
+                }
+            )
+    return rows
+
+
+def summarize(rows: List[Dict]) -> Dict[str, Dict[str, float]]:
+    calls: Dict[str, Dict[str, float]] = {}
+    for call in dict.fromkeys(row["call"] for row in rows):
+        selected = [row for row in rows if row["call"] == call]
+        calls[call] = {
+            key: statistics.mean(row[key] for row in selected)
+            for key in ("input_tokens", "cacheable_tokens", "uncached_tokens", "est_prefill_ms")
+        }
+    return calls
+
+
+def live(rounds: int) -> int:
+    """Send both variants of the fast prompt to the configured backend."""
+    from config import LLM_BACKEND
+    from llm_backends import get_client
+
+    client = get_client(LLM_BACKEND)
+    stats = {"legacy": [], "current": []}
+    for _ in range(rounds):
+        for query in QUERIES:
+            for variant, build in (("legacy", legacy_calls), ("current", current_calls)):
+                start = time.perf_counter()
+                result = client.complete(build(query)["fast"], json_mode=True)
+                stats[variant].append(
+                    (time.perf_counter() - start, result.prompt_tokens, result.cached_tokens)
+                )
+    print(f"\nlive ({client.model}, fast pipeline, {rounds} rounds)")
+    print(f"{'variant':<10}{'p50 s':>8}{'mean s':>8}{'prompt tok':>12}{'cached tok':>12}")
+    for variant, samples in stats.items():
+        latencies = [s[0] for s in samples]
+        print(
+            f"{variant:<10}{statistics.median(latencies):>8.2f}{statistics.mean(latencies):>8.2f}"
+            f"{statistics.mean(s[1] for s in samples):>12.0f}"
+            f"{statistics.mean(s[2] for s in samples):>12.0f}"
+        )
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="Print one JSON line per call")
+    parser.add_argument("--prefill-tps", type=float, default=2000.0,
+                        help="Prompt tokens processed per second, for the latency estimate")
+    parser.add_argument("--min-cache-tokens", type=int, default=0,
+                        help="Shortest prefix the provider caches (OpenAI: 1024)")
+    parser.add_argument("--live", action="store_true", help="Also measure the configured backend")
+    parser.add_argument("--rounds", type=int, default=1, help="Rounds of queries with --live")
+    args = parser.parse_args()
+
+    count = token_counter()
+    legacy = account("legacy", legacy_calls, count, args.min_cache_tokens, args.prefill_tps)
+    current = account("current", current_calls, count, args.min_cache_tokens, args.prefill_tps)
+
+    if args.json:
+        for row in legacy + current:
+            print(json.dumps(row))
+    else:
+        print(f"{len(QUERIES)} requests, means per call (prefill estimated at {args.prefill_tps:g} tok/s)")
+        print(
+            f"{'call':<18}{'legacy in':>10}{'current in':>11}{'saved':>7}"
+            f"{'cacheable':>11}{'uncached':>10}{'legacy ms':>11}{'current ms':>11}"
+        )
+        before, after = summarize(legacy), summarize(current)
+        for call in before:
+            old, new = before[call], after[call]
+            print(
+                f"{call:<18}{old['input_tokens']:>10.0f}{new['input_tokens']:>11.0f}"
+                f"{1 - new['input_tokens'] / old['input_tokens']:>7.0%}"
+                f"{new['cacheable_tokens']:>11.0f}{new['uncached_tokens']:>10.0f}"
+                f"{old['est_prefill_ms']:>11.2f}{new['est_prefill_ms']:>11.2f}"
+            )
+
+    return live(args.rounds) if args.live else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
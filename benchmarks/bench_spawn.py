@@ -0,0 +1,92 @@
+"""
+Per-command spawn overhead: direct exec versus /bin/sh.
+
+Usage:
+    python benchmarks/bench_spawn.py [--runs N]
+
+Each sample command runs through run_process both ways in a scratch
+directory. The script checks that both paths produce the same return code,
+stdout and stderr, then reports the median wall time of each path. It exits
+with status 1 if any outputs differ.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from command_executor import direct_argv  # noqa: E402
+from process_runner import run_process  # noqa: E402
+
+COMMANDS = [
+    "true",
+    "ls -la",
+    "mkdir -p love",
+    "touch love/free.txt",
+    "cat love/free.txt",
+    "grep -r 'no such text' .",
+    "date +%Y",
+    "whoami",
+    "ls missing-directory",
+]
+
+
+def run(command, cwd):
+    start = time.perf_counter()
+    result = run_process(
+        command, cwd=cwd, timeout=30, max_output_bytes=0, head_bytes=65536, tail_bytes=65536
+    )
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50, help="Runs per command and path")
+    args = parser.parse_args()
+
+    failed = False
+    totals = {"shell": [], "direct": []}
+    with tempfile.TemporaryDirectory() as cwd:
+        print(f"{'command':<30} {'shell ms':>9} {'direct ms':>10} {'saved':>7}")
+        for command in COMMANDS:
+            argv = direct_argv(command)
+            if argv is None:
+                print(f"{command:<30} needs a shell, skipped")
+                continue
+            shell_ms, direct_ms = [], []
+            for _ in range(args.runs):
+                elapsed, shell_result = run(command, cwd)
+                shell_ms.append(elapsed)
+                elapsed, direct_result = run(argv, cwd)
+                direct_ms.append(elapsed)
+            same = (
+                shell_result.returncode == direct_result.returncode
+                and shell_result.stdout == direct_result.stdout
+                and shell_result.stderr == direct_result.stderr
+            )
+            shell_med, direct_med = statistics.median(shell_ms), statistics.median(direct_ms)
+            totals["shell"].append(shell_med)
+            totals["direct"].append(direct_med)
+            print(
+                f"{command:<30} {shell_med:9.2f} {direct_med:10.2f} "
+                f"{shell_med - direct_med:7.2f}{'' if same else '  OUTPUT DIFFERS'}"
+            )
+            if not same:
+                failed = True
+
+    if totals["shell"]:
+        shell_mean = statistics.mean(totals["shell"])
+        direct_mean = statistics.mean(totals["direct"])
+        print(
+            f"\nmean of medians: shell {shell_mean:.2f} ms, direct {direct_mean:.2f} ms "
+            f"({(1 - direct_mean / shell_mean) * 100:.0f}% less)"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
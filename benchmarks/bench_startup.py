@@ -0,0 +1,109 @@
+"""
+Cold-start import budget per CLI subcommand, measured with python -X importtime.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N]
+
+Each subcommand runs in a fresh interpreter from a scratch directory. The
+script reports total import time and wall time, plus the slowest imports. It
+exits with status 1 if a subcommand goes over its import budget or imports
+a module it should never need.
+"""
+import argparse
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+sys.path.insert(0, ROOT)
+
+from plan_file import compile_plan, write_plan  # noqa: E402
+
+# name: (argv, import budget in ms, modules that must not be imported)
+SUBCOMMANDS = {
+    "history": (["history", "--limit", "1"], 400, {"crewai", "openai"}),
+    "cache": (["cache"], 400, {"crewai", "openai"}),
+    # A query the local intent matcher resolves, so no LLM is involved
+    "execute (local match)": (
+        ["execute", "show me the current directory"],
+        600,
+        {"crewai", "openai"},
+    ),
+    # A plan file written into the scratch directory; nothing is interpreted
+    "run (plan file)": (["run", "plan.json"], 400, {"crewai", "openai", "ai_agent"}),
+}
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(argv, cwd):
+    """Run one subcommand and return (import ms, wall ms, modules, top imports)."""
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN, *argv],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} exited {proc.returncode}:\n{proc.stderr[-2000:]}")
+
+    self_us, modules, top_level = 0, set(), []
+    for line in proc.stderr.splitlines():
+        m = _IMPORT_LINE.match(line)
+        if not m:
+            continue
+        own, cumulative, indent, name = int(m[1]), int(m[2]), m[3], m[4]
+        self_us += own
+        modules.add(name.split(".")[0])
+        if len(indent) <= 1:
+            top_level.append((cumulative, name))
+    top_level.sort(reverse=True)
+    return self_us / 1000, wall_ms, modules, top_level[:5]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Runs per subcommand (median is reported)")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cwd:
+        write_plan(
+            compile_plan("show me the current directory", ["pwd"], platform.system().lower(), cwd),
+            os.path.join(cwd, "plan.json"),
+        )
+        for name, (argv, budget_ms, forbidden) in SUBCOMMANDS.items():
+            runs = [measure(argv, cwd) for _ in range(args.runs)]
+            import_ms = statistics.median(r[0] for r in runs)
+            wall_ms = statistics.median(r[1] for r in runs)
+            modules, top = runs[-1][2], runs[-1][3]
+            leaked = sorted(forbidden & modules)
+
+            status = "ok"
+            if import_ms > budget_ms or leaked:
+                status = "FAIL"
+                failed = True
+            print(
+                f"{name:<24} imports {import_ms:7.1f} ms (budget {budget_ms} ms)  "
+                f"wall {wall_ms:7.1f} ms  [{status}]"
+            )
+            if leaked:
+                print(f"    unexpected heavy imports: {', '.join(leaked)}")
+            for cumulative_us, module in top:
+                print(f"    {cumulative_us / 1000:7.1f} ms  {module}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
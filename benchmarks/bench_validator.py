@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for command validation over the recorded command history.
+
+Usage:
+    python benchmarks/bench_validator.py [--history PATH] [--rounds N]
+
+Validates every command in command_history.json twice: cold, with the
+parse and verdict caches cleared before each call, and warm. It exits with
+status 1 if the cold p99 is over one millisecond, if a known bypass in
+MUST_REJECT validates or if a command in MUST_ACCEPT is refused.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from command_policy import parse_command, validate  # noqa: E402
+
+BUDGET_US = 1000.0
+
+# Commands that reach a disallowed program or change what an allowed one runs
+MUST_REJECT = [
+    "LD_PRELOAD=/tmp/evil.so ls",
+    "PATH=/tmp/evil ls",
+    "IFS=x ls",
+    "x=1; ls",
+    "PATH=/tmp/evil; ls",
+    "ENV=/tmp/rc ls",
+    "BASH_ENV=/tmp/rc ls",
+    "SHELLOPTS=xtrace ls",
+    "echo ${x:-$(sh -c id)}",
+    "echo $(( $(python3 -c 1) ))",
+    "time python3 -c 1",
+    "xargs --process-slot-var echo sh -c id",
+    "xargs --arg-file list.txt sh -c id",
+    "xargs --no-such-option echo",
+    "ls | xargs sudo rm",
+]
+# Read-only commands that merely mention risky words, and ordinary wrappers
+MUST_ACCEPT = [
+    "grep sudo /var/log/auth.log",
+    "grep -r halt .",
+    "find . -name shutdown.py",
+    "time ls -la",
+    "ls | xargs --null --max-args 1 echo",
+    "ls | xargs --replace=X echo X",
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def time_calls(commands, rounds, cold):
+    """Return per-call latencies in microseconds."""
+    samples = []
+    for _ in range(rounds):
+        for command in commands:
+            if cold:
+                validate.cache_clear()
+                parse_command.cache_clear()
+            start = time.perf_counter()
+            validate(command)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", default=os.path.join(ROOT, "command_history.json"))
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.history) as f:
+        commands = [entry["command"] for entry in json.load(f) if entry.get("command")]
+    if not commands:
+        print("No commands found in history")
+        return 1
+
+    rejected = [c for c in commands if not validate(c)[0]]
+    print(f"{len(commands)} commands, {len(set(commands))} distinct, {len(rejected)} rejected")
+    for command in rejected:
+        print(f"    rejected: {command}  ({validate(command)[1]})")
+
+    failed = False
+    for command in MUST_REJECT:
+        if validate(command)[0]:
+            print(f"FAIL: accepted {command}")
+            failed = True
+    for command in MUST_ACCEPT:
+        is_valid, message = validate(command)
+        if not is_valid:
+            print(f"FAIL: rejected {command}  ({message})")
+            failed = True
+
+    for label, cold in (("cold", True), ("warm", False)):
+        samples = time_calls(commands, args.rounds, cold)
+        p50, p99 = _percentile(samples, 50), _percentile(samples, 99)
+        status = "ok"
+        if cold and p99 > BUDGET_US:
+            status = "FAIL"
+            failed = True
+        print(
+            f"{label:<5} mean {statistics.mean(samples):8.1f} us  p50 {p50:8.1f} us  "
+            f"p99 {p99:8.1f} us  [{status}]"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Deterministic stand-in for OpenAIChatClient, for offline benchmarks.
+
+Plug it into a CommandAI with ``ai.llm = FakeChatClient(...)`` and fast or
+streaming mode. Responses come from a table of canned plans keyed by
+normalized query, after a configurable delay.
+"""
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import ChatResult  # noqa: E402
+from plan_cache import normalize_query  # noqa: E402
+
+_QUERY_LINE = re.compile(r"^Command: (.*)$", re.MULTILINE)
+
+
+class FakeChatClient:
+    """
+    Chat client that answers from canned plans.
+
+    Args:
+        plans: Query -> commands to return for it
+        latency: Seconds to wait before answering, like a model's first token
+        tokens_per_second: Streaming speed; 0 streams every line at once
+        default_plan: Commands returned for queries with no canned plan
+    """
+
+    def __init__(
+        self,
+        plans: Dict[str, List[str]],
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        default_plan: Optional[List[str]] = None,
+        model: str = "fake-llm",
+    ):
+        self.plans = {normalize_query(query): commands for query, commands in plans.items()}
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.default_plan = default_plan or ["pwd"]
+        self.model = model
+        self.calls = 0
+        self.waited = 0.0  # Seconds spent simulating the model, summed over calls
+        self.last_stream = ChatResult(text="")
+
+    def _plan_for(self, messages: List[Dict]) -> List[str]:
+        match = _QUERY_LINE.search(messages[-1]["content"])
+        query = normalize_query(match.group(1)) if match else ""
+        return self.plans.get(query, self.default_plan)
+
+    def _wait(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+            self.waited += seconds
+
+    @staticmethod
+    def _tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    def complete(self, messages: List[Dict], json_mode: bool = False) -> ChatResult:
+        self.calls += 1
+        self._wait(self.latency)
+        commands = self._plan_for(messages)
+        text = json.dumps(
+            {"commands": [{"command": c, "risk": "low", "reason": "canned"} for c in commands]}
+        )
+        return ChatResult(
+            text=text,
+            prompt_tokens=sum(self._tokens(m["content"]) for m in messages),
+            completion_tokens=self._tokens(text),
+        )
+
+    def stream(self, messages: List[Dict]) -> Iterator[str]:
+        self.calls += 1
+        self.last_stream = ChatResult(
+            text="", prompt_tokens=sum(self._tokens(m["content"]) for m in messages)
+        )
+        self._wait(self.latency)
+        for command in self._plan_for(messages):
+            line = json.dumps({"command": command, "risk": "low", "reason": "canned"}) + "\n"
+            if self.tokens_per_second:
+                self._wait(self._tokens(line) / self.tokens_per_second)
+            self.last_stream.text += line
+            self.last_stream.completion_tokens += self._tokens(line)
+            yield line
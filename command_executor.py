@@ -1,95 +1,325 @@
-import subprocess
 import platform
-import json
 import os
+import threading
+import uuid
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from rich.console import Console
+from rich.live import Live
 from rich.panel import Panel
-from config import PLATFORM_COMMANDS, ALLOWED_COMMANDS, HISTORY_FILE, MAX_COMMAND_LENGTH
+from rich.text import Text
+from config import (
+    PLATFORM_COMMANDS,
+    READ_ONLY_COMMANDS,
+    PARALLEL_EXECUTION,
+    MAX_PARALLEL_COMMANDS,
+    COMMAND_TIMEOUT,
+    MAX_OUTPUT_BYTES,
+    OUTPUT_HEAD_BYTES,
+    OUTPUT_TAIL_BYTES,
+    LIVE_OUTPUT,
+    OUTPUT_INLINE_BYTES,
+    DIRECT_EXEC,
+    SHELL_SESSION,
+    COMMAND_CPU_LIMIT,
+    COMMAND_MEMORY_LIMIT_MB,
+    MAX_CONCURRENT_COMMANDS,
+)
+from command_policy import parse_command, validate
+from history_store import get_history_store
+from output_store import clip, get_blob_store
+from process_runner import HeadTailBuffer, ProcessResult, run_process
+from shell_session import ShellSession
+from shell_syntax import ShellSyntaxError
+from tracing import current_tracer, span
 
 console = Console()
 
+# Shared by every executor in the process, so batch workers, parallel groups
+# and several CommandAI instances together stay within the limit
+_command_slots = (
+    threading.BoundedSemaphore(MAX_CONCURRENT_COMMANDS) if MAX_CONCURRENT_COMMANDS > 0 else None
+)
+
+LIVE_PREVIEW_BYTES = 16 * 1024
+LIVE_PREVIEW_LINES = 20
+
+# find actions that write files or run other commands
+_FIND_ACTIONS = {"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprint0", "-fprintf", "-fls"}
+# Redirect targets that do not change any state
+_HARMLESS_TARGETS = {"/dev/null", "/dev/stdout", "/dev/stderr"}
+# Shell builtins that have no binary, or a binary that behaves differently
+# (dash's echo interprets backslash escapes, kill accepts job specs...)
+_SHELL_BUILTINS = {
+    ".", ":", "[", "alias", "bg", "cd", "command", "echo", "eval", "exec", "exit",
+    "export", "fg", "getopts", "hash", "jobs", "kill", "local", "printf", "pwd",
+    "read", "readonly", "return", "set", "shift", "source", "test", "time",
+    "times", "trap", "type", "ulimit", "umask", "unalias", "unset", "wait",
+}
+
+
+def is_read_only(command: str) -> bool:
+    """Check whether a command only inspects state and can run alongside others."""
+    try:
+        parsed = parse_command(command)
+    except ShellSyntaxError:
+        return False
+    for simple in parsed.commands:
+        if simple.assignments or not simple.argv:
+            return False
+        for redirect in simple.redirects:
+            target = redirect.target.text
+            if redirect.op in ("<", "<<<") or target in _HARMLESS_TARGETS:
+                continue
+            if redirect.op in (">&", "<&") and (target.isdigit() or target == "-"):
+                continue  # Descriptor duplication such as 2>&1
+            return False
+        if simple.name.lower() not in READ_ONLY_COMMANDS:
+            return False
+        if any(word.text in _FIND_ACTIONS for word in simple.argv[1:]):
+            return False
+    return True
+
+
+def direct_argv(command: str) -> Optional[List[str]]:
+    """
+    Return the argv to exec a command without a shell.
+
+    Returns None when the command uses pipes, lists, redirections, globs,
+    expansions or assignments, or names a shell builtin, since only /bin/sh
+    runs those with the same results.
+    """
+    if os.name != "posix":
+        return None
+    try:
+        parsed = parse_command(command)
+    except ShellSyntaxError:
+        return None
+    if parsed.needs_shell:
+        return None
+    argv = [word.text for word in parsed.commands[0].argv]
+    if argv[0] in _SHELL_BUILTINS:
+        return None
+    return argv
+
+
+def plan_execution_groups(commands: List[str]) -> List[List[int]]:
+    """
+    Split a plan into groups that may each run concurrently.
+
+    Consecutive read-only commands share a group. Any other command may depend
+    on, or be depended on by, its neighbours, so it gets a group of its own and
+    acts as a barrier.
+
+    Returns:
+        Lists of command indexes, in execution order
+    """
+    groups: List[List[int]] = []
+    for index, command in enumerate(commands):
+        if is_read_only(command) and groups and is_read_only(commands[groups[-1][0]]):
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+    return groups
+
 
 class CommandExecutor:
     def __init__(self):
         self.platform = platform.system().lower()
-        self.command_history: List[Dict] = []
-        self._load_history()
+        self.history_store = get_history_store()
         self.original_cwd = os.getcwd()  # Store the original working directory
+        self.live_output = LIVE_OUTPUT
+        self.direct_exec = DIRECT_EXEC
+        self.session: Optional[ShellSession] = None  # Set while a plan runs in one shell
+        self.cpu_limit = COMMAND_CPU_LIMIT
+        self.memory_limit_mb = COMMAND_MEMORY_LIMIT_MB
+        self.blob_store = get_blob_store()  # Full copies of large outputs
+        # Natural-language query of the plan being run, saved with its history entries
+        self.query: Optional[str] = None
+        self.run_id: Optional[str] = None
 
-    def _load_history(self):
-        """Load command history from file."""
-        if HISTORY_FILE.exists():
-            try:
-                with open(HISTORY_FILE, "r") as f:
-                    self.command_history = json.load(f)
-            except json.JSONDecodeError:
-                self.command_history = []
+    def begin_run(self, query: Optional[str]):
+        """Tag the history entries of the next plan with the query that produced it."""
+        self.query = query
+        self.run_id = uuid.uuid4().hex[:12] if query else None
 
-    def _save_history(self):
-        """Save command history to file."""
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(self.command_history, f, indent=2)
+    def _record_history(self, entry: Dict):
+        """Append a single entry to the command history store."""
+        if self.query:
+            entry["query"] = self.query
+            entry["run_id"] = self.run_id
+        tracer = current_tracer()
+        if tracer is not None:
+            # Stage timings of the query up to and including this command
+            entry["profile"] = {"trace_id": tracer.trace_id, "stages": tracer.profile()}
+        with span("history.save"):
+            self.history_store.append(entry)
 
     def validate_command(self, command: str) -> Tuple[bool, str]:
         """Validate if the command is safe to execute."""
-        if len(command) > MAX_COMMAND_LENGTH:
-            return False, "Command exceeds maximum length"
-
-        # Basic command validation
-        first_word = command.split()[0].lower()
-        if first_word not in ALLOWED_COMMANDS:
-            return False, f"Command '{first_word}' is not in the allowed commands list"
+        return validate(command)
 
-        # Add more validation rules here
-        return True, "Command is valid"
+    def execute_command(self, command: str, live: bool = False) -> Tuple[bool, str]:
+        """
+        Validate and execute a command and return the result.
 
-    def execute_command(self, command: str) -> Tuple[bool, str]:
-        """Execute a command and return the result."""
-        # Validate command
+        Args:
+            command: The command to execute
+            live: Render output in a live panel while the command runs
+        """
         is_valid, message = self.validate_command(command)
         if not is_valid:
             return False, message
+        success, output, _ = self._execute_validated(command, live)
+        return success, output
 
-        try:
-            # Execute command in the current working directory
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=True,
-                cwd=self.original_cwd,  # Use the original working directory
-            )
+    def _execute_validated(
+        self, command: str, live: bool = False
+    ) -> Tuple[bool, str, Optional[str]]:
+        """
+        Execute a command that has already passed validate_command.
 
+        Output is read incrementally and only its head and tail are kept. The
+        command is stopped when it exceeds the timeout or output byte limit.
+        Large successful output is also saved in full as a compressed blob.
+
+        Returns:
+            Success flag, output or error message, and the output's blob id
+            if it was too large to keep inline
+        """
+        # Execute command in the original working directory, or wherever the
+        # plan's shell session has moved to
+        working_directory = self.session.cwd if self.session else self.original_cwd
+        blob = self.blob_store.writer() if self.blob_store is not None else None
+        on_output = blob.on_output if blob is not None else None
+        with span("execute", command=command) as execute_span:
+            if live and self.live_output and console.is_terminal:
+                result = self._run_with_live_output(command, on_output)
+            else:
+                result = self._run(command, on_output)
+            if execute_span:
+                execute_span.attributes["returncode"] = result.returncode
+
+        if result.timed_out:
+            error_msg = f"Command timed out after {COMMAND_TIMEOUT:g}s"
+        elif result.output_limit_exceeded:
+            error_msg = f"Command output exceeded {MAX_OUTPUT_BYTES} bytes"
+        elif self._hit_cpu_limit(result):
+            error_msg = f"Command exceeded the CPU time limit of {self.cpu_limit}s"
+        elif result.returncode != 0:
+            error_msg = f"Command failed with error: {result.stderr}"
+        else:
+            error_msg = None
+
+        if error_msg is None:
+            entry = {
+                "command": command,
+                "output": result.stdout,
+                "timestamp": datetime.now().isoformat(),
+                "status": "success",
+                "working_directory": working_directory,
+                "usage": result.usage(),
+            }
+            blob_id = blob.commit() if blob is not None else None
+            if blob_id:
+                # History keeps a preview; the full output is in the blob
+                entry["output"] = result.stdout[:OUTPUT_INLINE_BYTES]
+                entry["output_blob"] = blob_id
+                entry["output_bytes"] = blob.total
             # Log command execution
-            self.command_history.append(
-                {
-                    "command": command,
-                    "output": result.stdout,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success",
-                    "working_directory": self.original_cwd,
-                }
-            )
-            self._save_history()
+            self._record_history(entry)
+            return True, result.stdout, blob_id
 
-            return True, result.stdout
+        if blob is not None:
+            blob.discard()
+        self._record_history(
+            {
+                "command": command,
+                "error": error_msg,
+                "timestamp": datetime.now().isoformat(),
+                "status": "error",
+                "working_directory": working_directory,
+                "usage": result.usage(),
+            }
+        )
+        return False, error_msg, None
 
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Command failed with error: {e.stderr}"
-            self.command_history.append(
-                {
-                    "command": command,
-                    "error": error_msg,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "error",
-                    "working_directory": self.original_cwd,
-                }
+    def _hit_cpu_limit(self, result: ProcessResult) -> bool:
+        """Whether a failed command was stopped for using up its CPU time."""
+        # The kernel checks the limit on scheduler ticks, so allow some slack
+        return bool(
+            self.cpu_limit
+            and result.returncode
+            and result.cpu_ms is not None
+            and result.cpu_ms >= self.cpu_limit * 900
+        )
+
+    def _run(
+        self, command: str, on_output: Optional[Callable[[str, bytes], None]] = None
+    ) -> ProcessResult:
+        """
+        Run a command with the configured timeout and output limits.
+
+        Inside a shell session the command runs in that shell. Otherwise,
+        commands that need no shell features are exec'd directly, which saves
+        starting /bin/sh for every step. Either way the command first waits
+        for one of the MAX_CONCURRENT_COMMANDS slots.
+        """
+        limits = dict(
+            timeout=COMMAND_TIMEOUT or None,
+            max_output_bytes=MAX_OUTPUT_BYTES,
+            head_bytes=OUTPUT_HEAD_BYTES,
+            tail_bytes=OUTPUT_TAIL_BYTES,
+            on_output=on_output,
+        )
+        if _command_slots is None:
+            return self._spawn(command, limits)
+        with span("execute.queue"):
+            _command_slots.acquire()
+        try:
+            return self._spawn(command, limits)
+        finally:
+            _command_slots.release()
+
+    def _spawn(self, command: str, limits: Dict) -> ProcessResult:
+        if self.session is not None:
+            return self.session.run(command, **limits)
+        limits.update(cpu_limit=self.cpu_limit, memory_limit_mb=self.memory_limit_mb)
+        argv = direct_argv(command) if self.direct_exec else None
+        if argv is None:
+            return run_process(command, cwd=self.original_cwd, **limits)
+        try:
+            return run_process(argv, cwd=self.original_cwd, **limits)
+        except OSError:
+            # Let the shell report a missing or non-executable program as usual
+            return run_process(command, cwd=self.original_cwd, **limits)
+
+    def _run_with_live_output(
+        self, command: str, on_output: Optional[Callable[[str, bytes], None]] = None
+    ) -> ProcessResult:
+        """Run a command while showing the tail of its output in a live panel."""
+        preview = HeadTailBuffer(0, LIVE_PREVIEW_BYTES)
+        lock = threading.Lock()
+        forward = on_output
+
+        def on_output(stream: str, chunk: bytes):
+            with lock:
+                preview.write(chunk)
+            if forward:
+                forward(stream, chunk)
+
+        def render() -> Panel:
+            with lock:
+                text = preview.getvalue()
+            lines = text.splitlines()[-LIVE_PREVIEW_LINES:]
+            return Panel(
+                Text("\n".join(lines)),
+                title=f"Running: {command}",
+                style="blue",
             )
-            self._save_history()
-            return False, error_msg
+
+        with Live(get_renderable=render, console=console, refresh_per_second=8, transient=True):
+            return self._run(command, on_output)
 
     def get_platform_command(self, command_type: str) -> Optional[str]:
         """Get platform-specific command."""
@@ -117,20 +347,102 @@ class CommandExecutor:
             if message:
                 console.print(f"Output: {message}")
 
+    def render_result(self, result: Dict):
+        """
+        Print one step's result.
+
+        Long output shows only its first and last lines. When the full output
+        was saved, the panel says how to page through it.
+        """
+        text, hidden = clip(str(result.get("output") or ""))
+        status = (
+            Text("Command executed successfully!", style="green")
+            if result["success"]
+            else Text("Command execution failed!", style="red")
+        )
+        body = Text.assemble(f"\nCommand: {result['command']}\n\n", status, "\n", text)
+        if result.get("output_blob"):
+            body.append(f"\n\nFull output: swat output {result['output_blob']}", style="dim")
+        elif hidden:
+            body.append(f"\n\n{hidden} lines hidden", style="dim")
+        console.print(
+            Panel(body, title="SWAT CMD AI", border_style="green" if result["success"] else "red")
+        )
+
     def get_command_history(self) -> List[Dict]:
         """Get command execution history."""
-        return self.command_history
+        return list(self.history_store.iter_entries())
 
 
 class MultiCommandExecutor(CommandExecutor):
     def __init__(self):
         super().__init__()
         self.command_results = []
+        self.parallel = PARALLEL_EXECUTION
+        self.use_session = SHELL_SESSION and os.name == "posix"
+        # Called with a failed step's result and the commands after it; returns
+        # replacement commands to continue with, or None to stop
+        self.repairer: Optional[Callable[[Dict, List[str]], Optional[List[str]]]] = None
+
+    def execute_step(self, command: str, live: bool = True) -> Dict:
+        """
+        Validate and execute a single step of a plan.
+
+        Args:
+            command: The command to execute
+            live: Render output live while the command runs
+
+        Returns:
+            Dictionary with the command, its success flag, output and timestamp
+        """
+        try:
+            # Validate command first
+            with span("validate"):
+                is_valid, message = self.validate_command(command)
+            if not is_valid:
+                console.print(f"[red]Invalid command: {command}[/red]")
+                console.print(f"[red]Error: {message}[/red]")
+                return {
+                    "command": command,
+                    "success": False,
+                    "output": f"Invalid command: {message}",
+                    "timestamp": datetime.now().isoformat(),
+                }
+
+            # Execute the command without validating it a second time
+            success, output, blob_id = self._execute_validated(command, live=live)
+            if not success:
+                console.print(f"[red]Command failed: {command}[/red]")
+                console.print(f"[red]Error: {output}[/red]")
+            result = {
+                "command": command,
+                "success": success,
+                "output": output,
+                "timestamp": datetime.now().isoformat(),
+            }
+            if blob_id:
+                result["output_blob"] = blob_id
+            return result
+
+        except Exception as e:
+            console.print(f"[red]Error executing command: {command}[/red]")
+            console.print(f"[red]Error details: {str(e)}[/red]")
+            return {
+                "command": command,
+                "success": False,
+                "output": str(e),
+                "timestamp": datetime.now().isoformat(),
+            }
 
     def execute_sequential_commands(self, commands: List[str]) -> List[Dict]:
         """
         Execute a list of commands sequentially, where each command can depend on the result of previous commands.
 
+        With shell sessions enabled, the whole plan runs in one shell, so the
+        working directory set by a cd is kept for the commands after it.
+        When a repairer is set, a failed step is replaced by its correction
+        and the plan continues in the same shell.
+
         Args:
             commands: List of commands to execute in sequence
 
@@ -138,54 +450,104 @@ class MultiCommandExecutor(CommandExecutor):
             List of dictionaries containing the results of each command execution
         """
         results = []
+        owns_session = self.use_session and self.session is None
+        if owns_session:
+            self.session = ShellSession(
+                self.original_cwd, self.cpu_limit, self.memory_limit_mb
+            )
 
-        for command in commands:
-            try:
-                # Validate command first
-                is_valid, message = self.validate_command(command)
-                if not is_valid:
-                    result = {
-                        "command": command,
-                        "success": False,
-                        "output": f"Invalid command: {message}",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                    results.append(result)
-                    console.print(f"[red]Invalid command: {command}[/red]")
-                    console.print(f"[red]Error: {message}[/red]")
-                    break
-
-                # Execute the command
-                success, output = self.execute_command(command)
-                result = {
-                    "command": command,
-                    "success": success,
-                    "output": output,
-                    "timestamp": datetime.now().isoformat(),
-                }
+        try:
+            pending = list(commands)
+            while pending:
+                result = self.execute_step(pending.pop(0))
                 results.append(result)
 
                 # If a command fails, we might want to stop the sequence
-                if not success:
-                    console.print(f"[red]Command failed: {command}[/red]")
-                    console.print(f"[red]Error: {output}[/red]")
-                    break
+                if not result["success"]:
+                    replacement = self._repair(result, pending)
+                    if replacement is None:
+                        break
+                    pending = replacement
+        finally:
+            if owns_session:
+                self.session.close()
+                self.session = None
 
-            except Exception as e:
-                error_result = {
-                    "command": command,
-                    "success": False,
-                    "output": str(e),
-                    "timestamp": datetime.now().isoformat(),
-                }
-                results.append(error_result)
-                console.print(f"[red]Error executing command: {command}[/red]")
-                console.print(f"[red]Error details: {str(e)}[/red]")
+        self.command_results = results
+        return results
+
+    async def execute_commands_async(
+        self, commands: List[str], max_concurrency: int = MAX_PARALLEL_COMMANDS
+    ) -> List[Dict]:
+        """
+        Execute a plan, running independent read-only commands concurrently.
+
+        Groups from plan_execution_groups run in order. Within a group, up to
+        max_concurrency commands run at once. After a group that had a failure,
+        no further groups run, the same as in sequential execution.
+
+        Args:
+            commands: List of commands to execute
+            max_concurrency: Maximum number of commands running at the same time
+
+        Returns:
+            List of result dictionaries in the original command order
+        """
+        import asyncio
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(command: str) -> Dict:
+            async with semaphore:
+                # Concurrent commands cannot share one live panel
+                return await asyncio.to_thread(self.execute_step, command, False)
+
+        results = []
+        for group in plan_execution_groups(commands):
+            group_results = await asyncio.gather(*(run(commands[i]) for i in group))
+            results.extend(group_results)
+            failed = [result for result in group_results if not result["success"]]
+            if failed:
+                # Other failed probes in the group are retried after the fix
+                remaining = [result["command"] for result in failed[1:]]
+                replacement = await asyncio.to_thread(
+                    self._repair, failed[0], remaining + commands[group[-1] + 1:]
+                )
+                if replacement is not None:
+                    results.extend(
+                        await asyncio.to_thread(self.execute_sequential_commands, replacement)
+                    )
                 break
 
         self.command_results = results
         return results
 
+    def execute_parallel_commands(
+        self, commands: List[str], max_concurrency: int = MAX_PARALLEL_COMMANDS
+    ) -> List[Dict]:
+        """Synchronous wrapper around execute_commands_async."""
+        import asyncio
+
+        return asyncio.run(self.execute_commands_async(commands, max_concurrency))
+
+    def _repair(self, failed: Dict, remaining: List[str]) -> Optional[List[str]]:
+        """Ask the repairer for commands to continue with after a failed step."""
+        if self.repairer is None:
+            return None
+        with span("repair", command=failed["command"]) as repair_span:
+            replacement = self.repairer(failed, remaining)
+            if repair_span:
+                repair_span.attributes["repaired"] = replacement is not None
+        if replacement is not None:
+            failed["repaired"] = True
+        return replacement
+
+    def execute_plan(self, commands: List[str]) -> List[Dict]:
+        """Execute a plan, in parallel where safe if parallel execution is enabled."""
+        if self.parallel and not self.use_session and len(commands) > 1:
+            return self.execute_parallel_commands(commands)
+        return self.execute_sequential_commands(commands)
+
     def get_last_result(self) -> Optional[Dict]:
         """Get the result of the last executed command."""
         return self.command_results[-1] if self.command_results else None
@@ -0,0 +1,242 @@
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import ALLOWED_COMMANDS, MAX_COMMAND_LENGTH, VALIDATION_CACHE_SIZE
+from safety_rules import check_command, check_command_name
+from shell_syntax import ParsedCommand, ShellSyntaxError, SimpleCommand, Word, parse
+
+# Targets that must never be deleted, recursively or not
+_PROTECTED_TARGET = re.compile(r"^(?:/+|/\*|~/?\*?|\$HOME/?\*?|\$\{HOME\}/?\*?|\*|\.{1,2}/?\*?)$")
+# Redirections that write to these paths are refused
+_PROTECTED_WRITE = re.compile(
+    r"^/(?:etc|bin|sbin|boot|usr|lib\w*|sys|proc)(?:/|$)|^/dev/(?!null$|stdout$|stderr$|tty$)"
+)
+_WRITE_REDIRECTS = {">", ">>", ">|", "&>", "<>", ">&"}
+_FIND_EXEC = {"-exec", "-execdir", "-ok", "-okdir"}
+# xargs options that take a separate value
+_XARGS_VALUE_OPTIONS = {
+    "-I", "-n", "-P", "-L", "-s", "-d", "-E", "-a",
+    "--arg-file", "--delimiter", "--max-args", "--max-procs", "--max-chars",
+    "--process-slot-var",
+}
+# GNU xargs long options that take no value, or an optional one only after "="
+_XARGS_LONG_FLAGS = {
+    "--null", "--no-run-if-empty", "--verbose", "--interactive", "--exit",
+    "--open-tty", "--show-limits", "--eof", "--replace", "--max-lines",
+}
+# GNU time options that take a separate value
+_TIME_VALUE_OPTIONS = {"-f", "--format", "-o", "--output"}
+
+ArgumentRule = Callable[[List[str]], Optional[str]]
+
+
+def _options(args: List[str]) -> str:
+    """All single-letter flags in args, e.g. "-rf -v" -> "rfv"."""
+    return "".join(a[1:] for a in args if a.startswith("-") and not a.startswith("--"))
+
+
+def _check_rm(args: List[str]) -> Optional[str]:
+    if "--no-preserve-root" in args:
+        return "rm with --no-preserve-root"
+    for arg in args:
+        if not arg.startswith("-") and _PROTECTED_TARGET.match(arg):
+            return f"Refusing to delete '{arg}' (root, home, parent or wildcard-only target)"
+    return None
+
+
+def _check_permissions(args: List[str]) -> Optional[str]:
+    targets = [a for a in args if not a.startswith("-")]
+    if "/" not in targets:
+        return None
+    if "R" in _options(args) or "--recursive" in args:
+        return "Recursive permission change on /"
+    if targets and targets[0] in ("777", "0777", "a+rwx"):
+        return "World-writable root directory"
+    return None
+
+
+def _check_kill(args: List[str]) -> Optional[str]:
+    pids, index = [], 0
+    while index < len(args):
+        arg = args[index]
+        if arg in ("-s", "-n"):
+            index += 2
+            continue
+        if arg == "--":
+            pids.extend(args[index + 1:])
+            break
+        # A leading option is the signal when a pid follows it
+        if index == 0 and arg.startswith("-") and len(args) > 1:
+            index += 1
+            continue
+        pids.append(arg)
+        index += 1
+    if any(pid in ("1", "-1") for pid in pids):
+        return "Killing init or every process"
+    return None
+
+
+def _check_find(args: List[str]) -> Optional[str]:
+    roots = []
+    for arg in args:
+        if arg.startswith("-") or arg in ("(", "!"):
+            break
+        roots.append(arg)
+    destructive = "-delete" in args or any(a in _FIND_EXEC for a in args)
+    if destructive and any(re.fullmatch(r"/+", root) for root in roots):
+        return "Deleting or executing across the whole filesystem"
+    return None
+
+
+ARGUMENT_RULES: Dict[str, ArgumentRule] = {
+    "rm": _check_rm,
+    "rmdir": _check_rm,
+    "rd": _check_rm,
+    "del": _check_rm,
+    "chmod": _check_permissions,
+    "chown": _check_permissions,
+    "kill": _check_kill,
+    "find": _check_find,
+}
+
+
+def _xargs_command(args: List[str]) -> Optional[List[str]]:
+    """The command line xargs will run, or None if an option is not recognised."""
+    index = 0
+    while index < len(args) and args[index].startswith("-"):
+        arg = args[index]
+        if arg == "--":
+            return args[index + 1:]
+        name = arg.split("=", 1)[0]
+        if arg.startswith("--") and name not in _XARGS_VALUE_OPTIONS | _XARGS_LONG_FLAGS:
+            return None  # Its arity is unknown, so is the command it runs
+        index += 2 if arg in _XARGS_VALUE_OPTIONS else 1
+    return args[index:]
+
+
+def _time_command(args: List[str]) -> List[str]:
+    """The command line time will run, without time's own options."""
+    index = 0
+    while index < len(args) and args[index].startswith("-"):
+        if args[index] == "--":
+            return args[index + 1:]
+        index += 2 if args[index] in _TIME_VALUE_OPTIONS else 1
+    return args[index:]
+
+
+def _find_exec_commands(args: List[str]) -> Iterable[List[str]]:
+    """Command lines passed to find's -exec style actions."""
+    index = 0
+    while index < len(args):
+        if args[index] in _FIND_EXEC:
+            end = index + 1
+            while end < len(args) and args[end] not in (";", "+"):
+                end += 1
+            yield args[index + 1:end]
+            index = end
+        index += 1
+
+
+class CommandPolicy:
+    """
+    Allowlist plus per-command argument rules, checked on the parsed command line.
+
+    Every simple command is checked, including commands after pipes and
+    chains, inside subshells and command substitutions, and commands run
+    indirectly through xargs, time or find -exec.
+    """
+
+    def __init__(
+        self,
+        allowed_commands: Iterable[str],
+        argument_rules: Dict[str, ArgumentRule],
+        max_length: int,
+    ):
+        self.allowed_commands = frozenset(c.lower() for c in allowed_commands)
+        self.argument_rules = dict(argument_rules)
+        self.max_length = max_length
+
+    def check(self, command: str) -> Tuple[bool, str]:
+        """Validate a full command line."""
+        if len(command) > self.max_length:
+            return False, "Command exceeds maximum length"
+        try:
+            parsed = parse_command(command)
+        except ShellSyntaxError as e:
+            return False, f"Could not parse command: {e}"
+        if not any(simple.argv for simple in parsed.commands):
+            return False, "Empty command"
+
+        for simple in parsed.commands:
+            reason = self._check_simple(simple)
+            if reason:
+                return False, reason
+
+        # Pattern rules stay as a second line of defence
+        is_safe, message = check_command(command)
+        if not is_safe:
+            return False, message
+        return True, "Command is valid"
+
+    def _check_simple(self, simple: SimpleCommand) -> Optional[str]:
+        for redirect in simple.redirects:
+            if redirect.op in _WRITE_REDIRECTS and _PROTECTED_WRITE.match(redirect.target.text):
+                return f"Refusing to write to '{redirect.target.text}'"
+        if simple.assignments:
+            # PATH, LD_PRELOAD or IFS would change what an allowed command runs
+            return f"Variable assignment '{simple.assignments[0].text}' is not allowed"
+        if not simple.argv:
+            return "Redirection without a command" if simple.redirects else None
+        name: Word = simple.argv[0]
+        if name.has_expansion or name.has_glob:
+            return f"Command name '{name.text}' must be written literally"
+        return self._check_argv([word.text for word in simple.argv])
+
+    def _check_argv(self, argv: List[str]) -> Optional[str]:
+        name = argv[0].lower()
+        is_safe, message = check_command_name(name)
+        if not is_safe:
+            return message
+        if name not in self.allowed_commands:
+            return f"Command '{name}' is not in the allowed commands list"
+        args = argv[1:]
+        rule = self.argument_rules.get(name)
+        if rule:
+            reason = rule(args)
+            if reason:
+                return f"Blocked by argument rule: {reason}"
+        # Commands run on our behalf get the same checks
+        if name == "xargs":
+            inner = _xargs_command(args)
+            if inner is None:
+                return "xargs with an unrecognised long option"
+            if inner:
+                return self._check_argv(inner)
+        elif name == "time":
+            inner = _time_command(args)
+            if inner:
+                return self._check_argv(inner)
+        elif name == "find":
+            for inner in _find_exec_commands(args):
+                if not inner:
+                    return "find -exec without a command"
+                reason = self._check_argv(inner)
+                if reason:
+                    return reason
+        return None
+
+
+_POLICY = CommandPolicy(ALLOWED_COMMANDS, ARGUMENT_RULES, MAX_COMMAND_LENGTH)
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def parse_command(command: str) -> ParsedCommand:
+    """Parse a command line once; the result is shared and must not be modified."""
+    return parse(command)
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def validate(command: str) -> Tuple[bool, str]:
+    """Validate a command line against the default policy, memoizing the verdict."""
+    return _POLICY.check(command)
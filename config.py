@@ -1,9 +1,20 @@
 import os
-from dotenv import load_dotenv
 from pathlib import Path
 
+
+def _load_env_file():
+    """Load the nearest .env at or above this directory, importing dotenv only if one exists."""
+    for directory in (Path(__file__).resolve().parent, *Path(__file__).resolve().parents):
+        env_file = directory / ".env"
+        if env_file.is_file():
+            from dotenv import load_dotenv
+
+            load_dotenv(env_file)
+            return
+
+
 # Load environment variables
-load_dotenv()
+_load_env_file()
 
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -12,15 +23,100 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Project paths
 BASE_DIR = Path(__file__).parent
 LOGS_DIR = BASE_DIR / "logs"
-HISTORY_FILE = BASE_DIR / "command_history.json"
+HISTORY_FILE = BASE_DIR / "command_history.json"  # legacy whole-file history
+HISTORY_DB_FILE = BASE_DIR / "command_history.db"
+HISTORY_JSONL_FILE = BASE_DIR / "command_history.jsonl"
 
-# Create necessary directories
-LOGS_DIR.mkdir(exist_ok=True)
+# Daemon socket; swat_client.py uses the same default without importing config
+DAEMON_SOCKET = Path(os.getenv("SWAT_SOCKET", str(BASE_DIR / "swat.sock")))
 
 # LLM Configuration
 DEFAULT_MODEL = "gpt-4-turbo-preview"  # or "gemini-pro"
 TEMPERATURE = 0.7
 
+# LLM backends. All of them speak the OpenAI chat-completions protocol: Gemini
+# through its OpenAI-compatible endpoint, local models through llama.cpp's
+# server, Ollama, vLLM or similar. api_key_env is None when no key is needed.
+LLM_BACKENDS = {
+    "openai": {
+        "model": DEFAULT_MODEL,
+        "base_url": None,
+        "api_key_env": "OPENAI_API_KEY",
+        "timeout": 60.0,
+    },
+    "gemini": {
+        "model": os.getenv("SWAT_GEMINI_MODEL", "gemini-1.5-flash"),
+        "base_url": "https://generativelanguage.googleapis.com/v1beta/openai/",
+        "api_key_env": "GEMINI_API_KEY",
+        "timeout": 60.0,
+    },
+    "local": {
+        "model": os.getenv("SWAT_LOCAL_MODEL", "qwen2.5-coder:7b"),
+        "base_url": os.getenv("SWAT_LOCAL_URL", "http://localhost:11434/v1"),
+        "api_key_env": None,
+        "timeout": float(os.getenv("SWAT_LOCAL_TIMEOUT", "20")),
+    },
+}
+LLM_BACKEND = os.getenv("SWAT_LLM_BACKEND", "openai")
+# Optional small, fast backend tried first for short queries in fast and
+# streaming mode; the paranoid crew always uses LLM_BACKEND. The main backend
+# is used when it reports low confidence, returns no usable plan or fails.
+LLM_SMALL_BACKEND = os.getenv("SWAT_LLM_SMALL_BACKEND") or None
+ROUTER_MAX_QUERY_WORDS = 12
+ROUTER_MIN_CONFIDENCE = 0.7
+# Keep-alive HTTP connections shared by every client of a backend
+LLM_POOL_CONNECTIONS = 8
+LLM_KEEPALIVE_SECONDS = 60.0
+
+# "fast": one structured LLM call plus local validation
+# "paranoid": interpreter and validator agents run as a sequential crew
+PIPELINE_MODE = os.getenv("SWAT_PIPELINE_MODE", "paranoid")
+
+# Stream the plan from the model and validate each line as it arrives.
+# Early execution starts the first safe command before the plan is complete.
+STREAM_PLAN = os.getenv("SWAT_STREAM", "0") == "1"
+EARLY_EXECUTION = os.getenv("SWAT_EARLY_EXEC", "0") == "1"
+
+# History settings
+HISTORY_BACKEND = os.getenv("SWAT_HISTORY_BACKEND", "sqlite")  # or "jsonl"
+
+# Plan cache settings
+PLAN_CACHE_ENABLED = os.getenv("SWAT_PLAN_CACHE", "1") != "0"
+PLAN_CACHE_FILE = BASE_DIR / "plan_cache.db"
+PLAN_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+PLAN_CACHE_MAX_ENTRIES = 500
+PLAN_CACHE_SIMILARITY = 0.8  # minimum token similarity for near-duplicate hits
+
+# Suggestions from history: an inverted index over the queries and commands
+# of successful runs, updated incrementally from new history entries. Close
+# matches are offered before a query goes to the LLM.
+HISTORY_SUGGEST = os.getenv("SWAT_SUGGEST", "1") != "0"
+HISTORY_INDEX_FILE = BASE_DIR / "history_index.db"
+HISTORY_SUGGEST_LIMIT = 3  # top-k suggestions shown
+HISTORY_SUGGEST_MIN_SCORE = 0.6  # share of the query's token weight a match must cover
+HISTORY_SUGGEST_MAX_POSTINGS = 2000  # candidates read per token, bounds lookup time
+
+# Local fast path that resolves common queries without the LLM
+INTENT_MATCHER_ENABLED = os.getenv("SWAT_FAST_PATH", "1") != "0"
+
+# Repair loop: a failed step is sent back to the LLM with its error and the
+# rest of the plan, at most REPAIR_MAX_ATTEMPTS times per query. Corrections
+# that work are stored in REPAIR_FILE and reused without an LLM call.
+REPAIR_ENABLED = os.getenv("SWAT_REPAIR", "1") != "0"
+REPAIR_MAX_ATTEMPTS = 2
+REPAIR_BACKEND = os.getenv("SWAT_REPAIR_BACKEND") or LLM_SMALL_BACKEND or LLM_BACKEND
+REPAIR_FILE = BASE_DIR / "repair_fixes.db"
+REPAIR_MAX_FIXES = 500
+REPAIR_MAX_ERROR_CHARS = 2000
+
+# Environment snapshot added to LLM prompts: a shallow listing of the working
+# directory, listening TCP ports and allowed commands that are not installed.
+# Off by default since file names are sent to the LLM provider.
+CONTEXT_SNAPSHOT = os.getenv("SWAT_CONTEXT", "0") == "1"
+CONTEXT_MAX_ENTRIES = 40
+CONTEXT_MAX_PORTS = 20
+CONTEXT_PORTS_TTL = 5.0  # seconds
+
 # Command execution settings
 MAX_COMMAND_LENGTH = 1000
 ALLOWED_COMMANDS = {
@@ -86,6 +182,77 @@ ALLOWED_COMMANDS = {
     "wget",
 }
 
+# Validation verdicts and parsed command lines kept in memory
+VALIDATION_CACHE_SIZE = 4096
+
+# Per-command limits. Output beyond the head and tail is dropped from memory;
+# past MAX_OUTPUT_BYTES or COMMAND_TIMEOUT the command's process group is stopped.
+COMMAND_TIMEOUT = float(os.getenv("SWAT_COMMAND_TIMEOUT", "120"))  # seconds, 0 = none
+MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+OUTPUT_HEAD_BYTES = 64 * 1024
+OUTPUT_TAIL_BYTES = 64 * 1024
+LIVE_OUTPUT = os.getenv("SWAT_LIVE_OUTPUT", "1") != "0"
+# Output over OUTPUT_INLINE_BYTES or OUTPUT_DISPLAY_LINES lines is saved in
+# full as a gzip blob in OUTPUT_BLOB_DIR. History keeps a preview and the blob
+# id, and the terminal shows the first and last lines.
+OUTPUT_BLOB_DIR = BASE_DIR / "outputs"
+OUTPUT_INLINE_BYTES = 16 * 1024
+OUTPUT_DISPLAY_LINES = int(os.getenv("SWAT_DISPLAY_LINES", "200"))
+OUTPUT_BLOB_MAX_BYTES = 256 * 1024 * 1024  # oldest blobs are removed past this
+OUTPUT_BLOB_COMPRESSLEVEL = 1  # fastest; command output still shrinks 10-20x
+# Optional resource limits applied to every command and its children (POSIX
+# only, 0 = none). A command over its CPU seconds is killed with SIGXCPU; one
+# over its address space gets allocation failures.
+COMMAND_CPU_LIMIT = int(os.getenv("SWAT_CPU_LIMIT", "0"))  # CPU seconds
+COMMAND_MEMORY_LIMIT_MB = int(os.getenv("SWAT_MEMORY_LIMIT_MB", "0"))  # address space
+# Commands running at once in this process, across all executors, batch
+# workers and parallel groups (0 = no limit). Fleet SSH sessions are not counted.
+MAX_CONCURRENT_COMMANDS = int(
+    os.getenv("SWAT_MAX_CONCURRENT_COMMANDS", str(max(4, os.cpu_count() or 1)))
+)
+# Exec commands that use no shell syntax directly instead of through /bin/sh
+DIRECT_EXEC = os.getenv("SWAT_DIRECT_EXEC", "1") != "0"
+# Run a plan's commands in one long-lived shell so a cd carries over between
+# steps (implies sequential execution)
+SHELL_SESSION = os.getenv("SWAT_SHELL_SESSION", "0") == "1"
+
+# Commands that only inspect state; consecutive runs of these are independent
+# and may execute concurrently
+READ_ONLY_COMMANDS = {
+    "ls",
+    "dir",
+    "pwd",
+    "whoami",
+    "date",
+    "cat",
+    "type",
+    "grep",
+    "find",
+    "ps",
+    "lsof",
+    "netstat",
+    "tasklist",
+    "ping",
+    "traceroute",
+    "dig",
+    "nslookup",
+    "whois",
+}
+PARALLEL_EXECUTION = os.getenv("SWAT_PARALLEL", "1") != "0"
+MAX_PARALLEL_COMMANDS = 4
+
+# Batch mode: concurrent LLM interpretations and concurrent working directories
+BATCH_CONCURRENCY = 4
+
+# Fleet mode: one plan run on many hosts over multiplexed SSH connections.
+# SWAT_SSH_OPTIONS adds ssh flags, e.g. "-p 2222 -o StrictHostKeyChecking=no".
+FLEET_CONCURRENCY = 16  # hosts running at the same time
+FLEET_HOST_TIMEOUT = 60.0  # seconds for a host's whole plan
+FLEET_PLATFORM = os.getenv("SWAT_FLEET_PLATFORM", "linux")
+SSH_OPTIONS = os.getenv("SWAT_SSH_OPTIONS", "")
+SSH_CONNECT_TIMEOUT = 10  # seconds
+SSH_CONTROL_PERSIST = 60  # seconds an idle master connection stays open
+
 # Platform-specific settings
 PLATFORM_COMMANDS = {
     "darwin": {  # macOS
@@ -110,3 +277,6 @@ PLATFORM_COMMANDS = {
         "kill_process": "kill -9",
     },
 }
+
+# platform.system() reports Windows as "windows"
+PLATFORM_COMMANDS["windows"] = PLATFORM_COMMANDS["win32"]
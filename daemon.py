@@ -0,0 +1,116 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+
+from rich.console import Console
+
+import ai_agent
+import command_executor
+import main
+import repair
+from ai_agent import CommandAI
+
+
+class _FrameWriter:
+    """File-like object that forwards console output to the client as JSON frames."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data: str) -> int:
+        if data:
+            self.wfile.write(json.dumps({"type": "output", "data": data}).encode() + b"\n")
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handle one query: a JSON request line in, output frames and a result frame out."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            query = request["query"]
+            cwd = request["cwd"]
+        except (ValueError, KeyError, TypeError):
+            self._send({"type": "result", "exit_code": 2})
+            return
+
+        # CommandAI and the module consoles are shared, so queries run one at a time
+        with self.server.lock:
+            request_console = Console(
+                file=_FrameWriter(self.wfile),
+                width=request.get("width") or 80,
+                force_terminal=bool(request.get("color")),
+                no_color=not request.get("color"),
+            )
+            for module in (main, ai_agent, command_executor, repair):
+                module.console = request_console
+            try:
+                self.server.ai.set_working_directory(cwd)
+                exit_code = main.run_query(self.server.ai, query)
+            finally:
+                for module in (main, ai_agent, command_executor, repair):
+                    module.console = self.server.default_console
+        self._send({"type": "result", "exit_code": exit_code})
+
+    def _send(self, frame: dict):
+        try:
+            self.wfile.write(json.dumps(frame).encode() + b"\n")
+            self.wfile.flush()
+        except BrokenPipeError:
+            pass  # Client went away; the query has already run
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        super().__init__(socket_path, _RequestHandler)
+        self.lock = threading.Lock()
+        self.default_console = main.console
+        # Built once: agents, plan cache, history store and HTTP client stay warm
+        self.ai = CommandAI()
+        if self.ai.pipeline_mode == "paranoid":
+            self.ai.ensure_agents()
+
+
+def _remove_stale_socket(socket_path: str):
+    """Remove a socket file left behind by a daemon that is no longer running."""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"A daemon is already listening on {socket_path}")
+
+
+def serve(socket_path: str):
+    """Serve queries on a Unix domain socket until interrupted."""
+    _remove_stale_socket(socket_path)
+    # The daemon executes commands, so only the owner may connect
+    old_umask = os.umask(0o177)
+    try:
+        server = _DaemonServer(socket_path)
+    finally:
+        os.umask(old_umask)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Path(socket_path).unlink(missing_ok=True)
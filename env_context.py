@@ -0,0 +1,171 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    ALLOWED_COMMANDS,
+    CONTEXT_MAX_ENTRIES,
+    CONTEXT_MAX_PORTS,
+    CONTEXT_PORTS_TTL,
+)
+
+# Builtins are always available even when no binary exists on PATH
+_BUILTINS = {"cd", "echo", "pwd", "type", "time", "kill"}
+# Only ever installed on Windows, so not worth reporting as missing elsewhere
+_WINDOWS_ONLY = {"cls", "copy", "del", "move", "rd", "taskkill", "tasklist", "xcopy"}
+_PROC_TCP = ("/proc/net/tcp", "/proc/net/tcp6")
+_TCP_LISTEN = "0A"
+
+
+@dataclass
+class EnvironmentSnapshot:
+    """What the model should know about the machine before planning."""
+
+    cwd: str
+    entries: List[str] = field(default_factory=list)
+    total_entries: int = 0
+    listening_ports: List[int] = field(default_factory=list)
+    missing_commands: List[str] = field(default_factory=list)
+
+    def to_prompt(self) -> str:
+        """A compact, prompt-ready description of the snapshot."""
+        shown = ", ".join(self.entries) if self.entries else "(empty)"
+        if self.total_entries > len(self.entries):
+            shown += f", ... ({self.total_entries - len(self.entries)} more)"
+        ports = ", ".join(str(p) for p in self.listening_ports) or "none"
+        lines = [
+            f"Directory contents: {shown}",
+            f"Listening TCP ports: {ports}",
+        ]
+        if self.missing_commands:
+            lines.append(f"Not installed: {', '.join(self.missing_commands)}")
+        return "\n".join(lines)
+
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _list_directory(cwd: str, max_entries: int) -> Tuple[List[str], int]:
+    """Names in cwd, directories marked with a trailing slash, hidden files last."""
+    try:
+        with os.scandir(cwd) as it:
+            names = [e.name + ("/" if e.is_dir(follow_symlinks=False) else "") for e in it]
+    except OSError:
+        return [], 0
+    names.sort(key=lambda name: (name.startswith("."), name.lower()))
+    return names[:max_entries], len(names)
+
+
+def _proc_listening_ports() -> Optional[List[int]]:
+    """Listening TCP ports from /proc, or None where /proc is not available."""
+    ports = set()
+    found = False
+    for path in _PROC_TCP:
+        try:
+            with open(path) as f:
+                next(f)  # Header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == _TCP_LISTEN:
+                        ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+            found = True
+        except (OSError, StopIteration, ValueError):
+            continue
+    return sorted(ports) if found else None
+
+
+def _lsof_listening_ports() -> List[int]:
+    """Listening TCP ports from lsof, for systems without /proc."""
+    try:
+        output = subprocess.run(
+            ["lsof", "-nP", "-iTCP", "-sTCP:LISTEN", "-Fn"],
+            capture_output=True,
+            text=True,
+            timeout=2,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    ports = set()
+    for line in output.splitlines():
+        if line.startswith("n") and ":" in line:
+            port = line.rsplit(":", 1)[1]
+            if port.isdigit():
+                ports.add(int(port))
+    return sorted(ports)
+
+
+class EnvironmentContext:
+    """
+    Collects EnvironmentSnapshots, caching each part until it may have changed.
+
+    - The directory listing is reused until the directory's mtime changes.
+    - Installed commands are reused until PATH or a PATH directory's mtime
+      changes.
+    - Listening ports have no mtime, so they are reused for ports_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        commands: Iterable[str] = ALLOWED_COMMANDS,
+        max_entries: int = CONTEXT_MAX_ENTRIES,
+        max_ports: int = CONTEXT_MAX_PORTS,
+        ports_ttl: float = CONTEXT_PORTS_TTL,
+    ):
+        skip = _BUILTINS if sys.platform == "win32" else _BUILTINS | _WINDOWS_ONLY
+        self.commands = sorted(set(commands) - skip)
+        self.max_entries = max_entries
+        self.max_ports = max_ports
+        self.ports_ttl = ports_ttl
+        self._lock = threading.Lock()
+        self._listings: Dict[str, Tuple[int, List[str], int]] = {}
+        self._missing: Optional[Tuple[tuple, List[str]]] = None
+        self._ports: Optional[Tuple[float, List[int]]] = None
+
+    def snapshot(self, cwd: str) -> EnvironmentSnapshot:
+        with self._lock:
+            entries, total = self._listing(cwd)
+            return EnvironmentSnapshot(
+                cwd=cwd,
+                entries=entries,
+                total_entries=total,
+                listening_ports=self._listening_ports(),
+                missing_commands=self._missing_commands(),
+            )
+
+    def _listing(self, cwd: str) -> Tuple[List[str], int]:
+        mtime = _mtime(cwd)
+        cached = self._listings.get(cwd)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        entries, total = _list_directory(cwd, self.max_entries)
+        self._listings[cwd] = (mtime, entries, total)
+        return entries, total
+
+    def _missing_commands(self) -> List[str]:
+        path_dirs = os.environ.get("PATH", "").split(os.pathsep)
+        key = tuple((d, _mtime(d)) for d in path_dirs)
+        if self._missing and self._missing[0] == key:
+            return self._missing[1]
+        missing = [c for c in self.commands if shutil.which(c) is None]
+        self._missing = (key, missing)
+        return missing
+
+    def _listening_ports(self) -> List[int]:
+        now = time.monotonic()
+        if self._ports and now - self._ports[0] < self.ports_ttl:
+            return self._ports[1]
+        ports = _proc_listening_ports()
+        if ports is None:
+            ports = _lsof_listening_ports() if sys.platform != "win32" else []
+        ports = ports[: self.max_ports]
+        self._ports = (now, ports)
+        return ports
@@ -0,0 +1,389 @@
+import json
+import math
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import (
+    HISTORY_INDEX_FILE,
+    HISTORY_SUGGEST_LIMIT,
+    HISTORY_SUGGEST_MAX_POSTINGS,
+    HISTORY_SUGGEST_MIN_SCORE,
+)
+from history_store import HistoryStore, get_history_store
+from plan_cache import DIRECTION_WORDS, FILLER_WORDS, normalize_query, query_tokens, query_words
+
+
+@dataclass
+class Suggestion:
+    """A plan that ran successfully before for a similar query."""
+
+    query: str
+    commands: List[str]
+    working_directory: Optional[str]
+    score: float
+    runs: int
+    last_used: str
+
+
+def _stem(token: str) -> str:
+    """Fold plain plurals, so "files" matches "file"."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and token.isalpha():
+        return token[:-1]
+    return token
+
+
+def index_tokens(text: str) -> Set[str]:
+    """Content tokens of a query or command, with flag dashes, colons and plurals removed."""
+    tokens = {token.strip(":-") for token in query_tokens(text)} - FILLER_WORDS - {""}
+    return {_stem(token) for token in tokens}
+
+
+def _literal(token: str) -> bool:
+    """Numbers, paths and patterns: a plan for one is wrong for another."""
+    return any(c.isdigit() or c in "./~*" for c in token)
+
+
+def _operands(text: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    The words a query gives a direction, and its literals in order.
+
+    "copy notes.txt to backup.txt" gives {"backup.txt": "to"} and
+    ["notes.txt", "backup.txt"].
+    """
+    roles: Dict[str, str] = {}
+    literals: List[str] = []
+    direction = None
+    for word in query_words(text):
+        if word in DIRECTION_WORDS:
+            direction = word
+            continue
+        token = _stem(word.strip(":-"))
+        if direction:
+            roles[token], direction = direction, None
+        if _literal(token):
+            literals.append(token)
+    return roles, literals
+
+
+def _same_operands(query: Tuple, past: Tuple, shared: Set[str]) -> bool:
+    """Whether the words both queries share play the same part in each."""
+    (roles, literals), (past_roles, past_literals) = query, past
+    if any(roles.get(token) != past_roles.get(token) for token in shared):
+        return False
+    return [t for t in literals if t in shared] == [t for t in past_literals if t in shared]
+
+
+class HistoryIndex:
+    """
+    Inverted index from query and command tokens to plans that succeeded.
+
+    Each distinct query has one document: the commands of its latest run,
+    which is offered only if that run ended in success. The index follows
+    the history store from a saved position, so each refresh reads only the
+    entries appended since the last one.
+
+    Args:
+        store: History to index; only entries with a query are used
+        path: SQLite file holding the index
+        min_score: Weighted overlap a past query must have with the new one
+        max_postings: Candidates read per token, which bounds lookup time
+    """
+
+    def __init__(
+        self,
+        store: Optional[HistoryStore] = None,
+        path: Path = HISTORY_INDEX_FILE,
+        min_score: float = HISTORY_SUGGEST_MIN_SCORE,
+        max_postings: int = HISTORY_SUGGEST_MAX_POSTINGS,
+    ):
+        self.store = store or get_history_store()
+        self.path = Path(path)
+        self.min_score = min_score
+        self.max_postings = max_postings
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Documents are never deleted one by one, so MAX(id) is the document count
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                query TEXT NOT NULL,
+                commands TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                command_tokens TEXT NOT NULL,
+                working_directory TEXT,
+                run_id TEXT,
+                ok INTEGER NOT NULL,
+                runs INTEGER NOT NULL,
+                last_used TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                token TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (token, doc_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS terms (token TEXT PRIMARY KEY, df INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+
+    def refresh(self) -> int:
+        """
+        Index the history entries appended since the last refresh.
+
+        Returns:
+            Number of history entries read
+        """
+        source = self.store.source
+        with self._lock:
+            # An immediate transaction serializes refreshes from several processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM meta WHERE key = ?", (source,)
+                ).fetchone()
+                position = int(row[0]) if row else 0
+                read = 0
+                for next_position, entry in self.store.iter_after(position):
+                    if read == 0 and next_position <= position:
+                        self._clear()  # The store started over, so does the index
+                    position = next_position
+                    read += 1
+                    self._add(entry)
+                if read:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        (source, str(position)),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return read
+
+    def _clear(self):
+        for table in ("docs", "postings", "terms"):
+            self._conn.execute(f"DELETE FROM {table}")
+
+    def _add(self, entry: Dict):
+        query, command = entry.get("query"), entry.get("command")
+        if not query or not command:
+            return  # Entries from before queries were recorded, or from fleet runs
+        key = normalize_query(query)
+        run_id = entry.get("run_id")
+        ok = entry.get("status") == "success"
+        timestamp = entry.get("timestamp", "")
+        row = self._conn.execute(
+            "SELECT id, commands, tokens, command_tokens, run_id FROM docs WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row and row[4] == run_id:
+            # Another step of the same run; the run's last step decides if it is offered
+            doc_id, commands = row[0], json.loads(row[1])
+            command_tokens = set(json.loads(row[3]))
+            if ok:
+                commands.append(command)
+                new = index_tokens(command) - command_tokens - set(json.loads(row[2]))
+                self._post(doc_id, new)
+                command_tokens |= new
+            self._conn.execute(
+                "UPDATE docs SET commands = ?, command_tokens = ?, ok = ?, last_used = ? "
+                "WHERE id = ?",
+                (json.dumps(commands), json.dumps(sorted(command_tokens)), int(ok), timestamp, doc_id),
+            )
+            return
+        if not ok:
+            return  # A new run that failed at once leaves the last good plan in place
+
+        tokens = index_tokens(query)
+        command_tokens = index_tokens(command) - tokens
+        values = (
+            query,
+            json.dumps([command]),
+            json.dumps(sorted(tokens)),
+            json.dumps(sorted(command_tokens)),
+            entry.get("working_directory"),
+            run_id,
+            timestamp,
+        )
+        if row:
+            doc_id = row[0]
+            self._unpost(doc_id, set(json.loads(row[2])) | set(json.loads(row[3])))
+            self._conn.execute(
+                "UPDATE docs SET query = ?, commands = ?, tokens = ?, command_tokens = ?, "
+                "working_directory = ?, run_id = ?, ok = 1, runs = runs + 1, last_used = ? "
+                "WHERE id = ?",
+                (*values, doc_id),
+            )
+        else:
+            doc_id = self._conn.execute(
+                "INSERT INTO docs (key, query, commands, tokens, command_tokens, "
+                "working_directory, run_id, ok, runs, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1, 1, ?)",
+                (key, *values),
+            ).lastrowid
+        self._post(doc_id, tokens | command_tokens)
+
+    def _post(self, doc_id: int, tokens: Set[str]):
+        self._conn.executemany(
+            "INSERT INTO postings (token, doc_id) VALUES (?, ?)",
+            [(token, doc_id) for token in tokens],
+        )
+        self._conn.executemany(
+            "INSERT INTO terms (token, df) VALUES (?, 1) "
+            "ON CONFLICT(token) DO UPDATE SET df = df + 1",
+            [(token,) for token in tokens],
+        )
+
+    def _unpost(self, doc_id: int, tokens: Set[str]):
+        # Delete by primary key; postings has no index on doc_id alone
+        self._conn.executemany(
+            "DELETE FROM postings WHERE token = ? AND doc_id = ?",
+            [(token, doc_id) for token in tokens],
+        )
+        self._conn.executemany(
+            "UPDATE terms SET df = df - 1 WHERE token = ?", [(token,) for token in tokens]
+        )
+
+    def _weights(self, tokens: Set[str], total: int) -> Dict[str, float]:
+        """Inverse document frequency of each token; unseen tokens weigh the most."""
+        placeholders = ",".join("?" * len(tokens))
+        df = dict(
+            self._conn.execute(
+                f"SELECT token, df FROM terms WHERE token IN ({placeholders})", list(tokens)
+            )
+        )
+        return {token: math.log(1 + total / (df.get(token, 0) + 1)) for token in tokens}
+
+    def search(
+        self,
+        query: str,
+        limit: int = HISTORY_SUGGEST_LIMIT,
+        working_directory: Optional[str] = None,
+    ) -> List[Suggestion]:
+        """
+        Return the best matching past plans, best first.
+
+        A plan's score is the weighted overlap of the new query with its
+        query, where a token may also match one of the plan's commands, and
+        tokens weigh more the rarer they are in the index. Words of the past
+        query that the new one lacks count half. Plans must reach
+        min_score and contain every number, path and pattern of the query,
+        and words both queries share must play the same part in each: the
+        same literals in the same order, after the same "to", "from" or "into".
+        Ties go to plans from working_directory, then to plans run more often
+        and more recently.
+        """
+        tokens = index_tokens(query)
+        if not tokens:
+            return []
+        literals = {token for token in tokens if _literal(token)}
+        operands = _operands(query)
+
+        with self._lock:
+            total = self._conn.execute("SELECT MAX(id) FROM docs").fetchone()[0]
+            if not total:
+                return []
+            weights = self._weights(tokens, total)
+            query_weight = sum(weights.values())
+
+            # A plan that has none of the heaviest tokens cannot reach min_score,
+            # so only their postings are read; every plan must have the literals
+            if literals:
+                probe = [max(literals, key=weights.get)]
+            else:
+                probe, rest = [], query_weight
+                for token in sorted(tokens, key=weights.get, reverse=True):
+                    if rest < self.min_score * query_weight:
+                        break
+                    probe.append(token)
+                    rest -= weights[token]
+            candidates = set()
+            for token in probe:
+                candidates.update(
+                    doc_id
+                    for (doc_id,) in self._conn.execute(
+                        "SELECT doc_id FROM postings WHERE token = ? "
+                        "ORDER BY doc_id DESC LIMIT ?",
+                        (token, self.max_postings),
+                    )
+                )
+            if not candidates:
+                return []
+
+            placeholders = ",".join("?" * len(candidates))
+            matches = []
+            for row in self._conn.execute(
+                "SELECT query, commands, working_directory, runs, last_used, tokens, "
+                f"command_tokens FROM docs WHERE ok = 1 AND id IN ({placeholders})",
+                list(candidates),
+            ):
+                doc_tokens = set(json.loads(row[5]))
+                matched = tokens & (doc_tokens | set(json.loads(row[6])))
+                if not literals <= matched:
+                    continue
+                covered = sum(weights[token] for token in matched)
+                if covered < self.min_score * query_weight:
+                    continue
+                # "copy a to b" must not offer the plan for "copy b to a"
+                if _same_operands(operands, _operands(row[0]), tokens & doc_tokens):
+                    matches.append((row, covered, doc_tokens - tokens))
+            if not matches:
+                return []
+
+            extra = set().union(*(unmatched for _, _, unmatched in matches))
+            extra_weights = self._weights(extra, total) if extra else {}
+
+        suggestions = []
+        for row, covered, unmatched in matches:
+            # Words only the past query has count half: the new query may be terser
+            extra_weight = sum(extra_weights[t] for t in unmatched) / 2
+            score = covered / (query_weight + extra_weight)
+            if score >= self.min_score:
+                query_text, commands, cwd, runs, last_used = row[:5]
+                suggestions.append(
+                    Suggestion(
+                        query=query_text,
+                        commands=json.loads(commands),
+                        working_directory=cwd,
+                        score=round(score, 3),
+                        runs=runs,
+                        last_used=last_used,
+                    )
+                )
+        suggestions.sort(
+            key=lambda s: (
+                s.score,
+                working_directory is not None and s.working_directory == working_directory,
+                s.runs,
+                s.last_used,
+            ),
+            reverse=True,
+        )
+        return suggestions[:limit]
+
+    def suggest(
+        self,
+        query: str,
+        limit: int = HISTORY_SUGGEST_LIMIT,
+        working_directory: Optional[str] = None,
+    ) -> List[Suggestion]:
+        """Bring the index up to date with the history, then search it."""
+        self.refresh()
+        return self.search(query, limit, working_directory)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of indexed plans and postings."""
+        with self._lock:
+            return {
+                "plans": self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0],
+                "postings": self._conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+            }
@@ -0,0 +1,348 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import HISTORY_BACKEND, HISTORY_DB_FILE, HISTORY_FILE, HISTORY_JSONL_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; appends still use O_APPEND
+    fcntl = None
+
+
+def _load_legacy_history(path: Path) -> list:
+    """Read the old whole-file JSON history, if there is one."""
+    if not path.exists():
+        return []
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return []
+    return entries if isinstance(entries, list) else []
+
+
+def _entry_contains(entry: Dict, pattern: str) -> bool:
+    """Case-insensitive substring match over command, output and error."""
+    pattern = pattern.lower()
+    return any(
+        pattern in str(entry.get(key) or "").lower()
+        for key in ("command", "output", "error")
+    )
+
+
+def _entry_matches(
+    entry: Dict,
+    since: Optional[str],
+    status: Optional[str],
+    working_directory: Optional[str],
+    grep: Optional[str] = None,
+) -> bool:
+    """Check a history entry against the optional filters."""
+    if grep and not _entry_contains(entry, grep):
+        return False
+    if since and entry.get("timestamp", "") < since:
+        return False
+    if status and entry.get("status") != status:
+        return False
+    if working_directory and entry.get("working_directory") != working_directory:
+        return False
+    return True
+
+
+class HistoryStore(ABC):
+    """Append-only store for executed command history."""
+
+    @abstractmethod
+    def append(self, entry: Dict):
+        """Append a single history entry."""
+
+    @abstractmethod
+    def iter_entries(
+        self,
+        since: Optional[str] = None,
+        status: Optional[str] = None,
+        working_directory: Optional[str] = None,
+        grep: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """
+        Lazily yield history entries in chronological order.
+
+        Args:
+            since: Only entries with an ISO timestamp at or after this value
+            status: Only entries with this status ("success" or "error")
+            working_directory: Only entries executed in this directory
+            grep: Only entries whose command, output or error contain this text
+            limit: Only the most recent ``limit`` matching entries
+        """
+
+    @property
+    @abstractmethod
+    def source(self) -> str:
+        """Identifies the store, so readers can keep a position per store."""
+
+    @abstractmethod
+    def iter_after(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """
+        Yield the entries appended after a position, oldest first.
+
+        Each entry comes with the position to resume from after it, so a
+        reader can pick up new entries without reading the whole history.
+
+        Args:
+            position: 0, or a position previously yielded by this store
+        """
+
+
+class SqliteHistoryStore(HistoryStore):
+    """History stored in SQLite with indexes on timestamp, status and cwd."""
+
+    def __init__(self, path: Path = HISTORY_DB_FILE, legacy_file: Path = HISTORY_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._init_schema()
+        self._migrate_legacy(legacy_file)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    status TEXT,
+                    working_directory TEXT,
+                    command TEXT,
+                    entry TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp);
+                CREATE INDEX IF NOT EXISTS idx_history_status ON history(status);
+                CREATE INDEX IF NOT EXISTS idx_history_cwd ON history(working_directory);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                """
+            )
+
+    def _migrate_legacy(self, legacy_file: Path):
+        """Import the legacy JSON history once, guarded by a write lock."""
+        with self._lock:
+            if self._conn.execute(
+                "SELECT 1 FROM meta WHERE key = 'legacy_migrated'"
+            ).fetchone():
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if not self._conn.execute(
+                    "SELECT 1 FROM meta WHERE key = 'legacy_migrated'"
+                ).fetchone():
+                    for entry in _load_legacy_history(Path(legacy_file)):
+                        self._insert(entry)
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('legacy_migrated', ?)",
+                        (str(legacy_file),),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _insert(self, entry: Dict):
+        self._conn.execute(
+            "INSERT INTO history (timestamp, status, working_directory, command, entry) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                entry.get("timestamp", ""),
+                entry.get("status"),
+                entry.get("working_directory"),
+                entry.get("command"),
+                json.dumps(entry),
+            ),
+        )
+
+    def append(self, entry: Dict):
+        """Append a single history entry."""
+        with self._lock:
+            self._insert(entry)
+
+    def iter_entries(
+        self,
+        since: Optional[str] = None,
+        status: Optional[str] = None,
+        working_directory: Optional[str] = None,
+        grep: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """Lazily yield history entries in chronological order."""
+        clauses, params = [], []
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if working_directory:
+            clauses.append("working_directory = ?")
+            params.append(working_directory)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # Text search runs in Python, so the limit is applied after filtering
+        if limit is not None and not grep:
+            query = (
+                f"SELECT entry FROM (SELECT id, entry FROM history {where} "
+                "ORDER BY id DESC LIMIT ?) ORDER BY id"
+            )
+            params.append(limit)
+        else:
+            query = f"SELECT entry FROM history {where} ORDER BY id"
+
+        def rows():
+            # A dedicated connection lets readers stream without blocking writers
+            conn = self._connect()
+            try:
+                for (raw,) in conn.execute(query, params):
+                    entry = json.loads(raw)
+                    if not grep or _entry_contains(entry, grep):
+                        yield entry
+            finally:
+                conn.close()
+
+        if limit is not None and grep:
+            yield from deque(rows(), maxlen=limit)
+        else:
+            yield from rows()
+
+    @property
+    def source(self) -> str:
+        return f"sqlite:{self.path.resolve()}"
+
+    def iter_after(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """Yield entries with a row id above position; the position is the row id."""
+        conn = self._connect()
+        try:
+            last_id = conn.execute("SELECT MAX(id) FROM history").fetchone()[0] or 0
+            if position > last_id:
+                position = 0  # The database was replaced; start over
+            for row_id, raw in conn.execute(
+                "SELECT id, entry FROM history WHERE id > ? ORDER BY id", (position,)
+            ):
+                yield row_id, json.loads(raw)
+        finally:
+            conn.close()
+
+
+class JsonlHistoryStore(HistoryStore):
+    """History stored as one JSON object per line, appended under a file lock."""
+
+    def __init__(self, path: Path = HISTORY_JSONL_FILE, legacy_file: Path = HISTORY_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._migrate_legacy(legacy_file)
+
+    def _write_lines(self, f, entries):
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        f.flush()
+
+    def _migrate_legacy(self, legacy_file: Path):
+        """Seed an empty JSONL file with the legacy JSON history."""
+        if self.path.exists() and self.path.stat().st_size > 0:
+            return
+        with self._lock, open(self.path, "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Re-check under the lock in case another writer got here first
+                if os.fstat(f.fileno()).st_size == 0:
+                    self._write_lines(f, _load_legacy_history(Path(legacy_file)))
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, entry: Dict):
+        """Append a single history entry."""
+        with self._lock, open(self.path, "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._write_lines(f, [entry])
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def iter_entries(
+        self,
+        since: Optional[str] = None,
+        status: Optional[str] = None,
+        working_directory: Optional[str] = None,
+        grep: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """Lazily yield history entries in chronological order."""
+        if not self.path.exists():
+            return
+
+        def matching():
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Skip a partially written trailing line
+                    if _entry_matches(entry, since, status, working_directory, grep):
+                        yield entry
+
+        if limit is None:
+            yield from matching()
+        else:
+            yield from deque(matching(), maxlen=limit)
+
+    @property
+    def source(self) -> str:
+        return f"jsonl:{self.path.resolve()}"
+
+    def iter_after(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """Yield entries after a byte offset; the position is the offset after each line."""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            if position > os.fstat(f.fileno()).st_size:
+                position = 0  # The file was truncated or replaced; start over
+            f.seek(position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # A line still being written; pick it up next time
+                position += len(line)
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield position, entry
+
+
+_stores: Dict[str, HistoryStore] = {}
+
+
+def get_history_store(backend: str = HISTORY_BACKEND) -> HistoryStore:
+    """Return the shared history store for the configured backend."""
+    if backend not in _stores:
+        if backend == "sqlite":
+            _stores[backend] = SqliteHistoryStore()
+        elif backend == "jsonl":
+            _stores[backend] = JsonlHistoryStore()
+        else:
+            raise ValueError(f"Unknown history backend: {backend}")
+    return _stores[backend]
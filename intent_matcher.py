@@ -0,0 +1,194 @@
+import re
+import shlex
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+# Trailing qualifiers that do not change the meaning of a file-system query
+_HERE = r"(?:\s+(?:in|from)\s+(?:the\s+)?(?:current|this)\s+(?:working\s+)?(?:directory|folder|dir))?"
+_PORT = r"(?:the\s+)?port\s+(?P<port>\d{1,5})"
+_FILE = r"(?P<path>[\w./~-]+)"
+
+
+def _quote_path(path: str) -> str:
+    """Quote a path for /bin/sh, leaving a leading ~/ for the shell to expand."""
+    if path.startswith("~/"):
+        return "~/" + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+
+@dataclass
+class IntentMatch:
+    """A query resolved locally to a command template."""
+
+    intent: str
+    commands: List[str]
+    confidence: float
+
+
+class IntentMatcher:
+    """
+    Rule-based matcher that resolves common queries without calling the LLM.
+
+    Every rule is anchored to the whole query, so a match is either exact or
+    absent; anything the rules do not fully cover falls back to the LLM.
+    """
+
+    def __init__(self, get_platform_command: Callable[[str], Optional[str]], posix: bool):
+        self.get_platform_command = get_platform_command
+        self.posix = posix
+        self.rules = [
+            (re.compile(pattern, re.IGNORECASE), intent, build)
+            for pattern, intent, build in [
+                (
+                    rf"(?:find|check)\s+{_PORT}\s+and\s+(?:kill|stop|terminate)\s+it",
+                    "kill_port",
+                    self._kill_port,
+                ),
+                (
+                    rf"(?:kill|stop|terminate)\s+(?:the\s+)?(?:process(?:es)?\s+)?"
+                    rf"(?:(?:running|listening)\s+)?(?:on|using|at)\s+{_PORT}",
+                    "kill_port",
+                    self._kill_port,
+                ),
+                (rf"(?:kill|free)\s+{_PORT}", "kill_port", self._kill_port),
+                (
+                    rf"(?:find|show|check|what(?:'s|\s+is))\s+(?:me\s+)?(?:the\s+)?"
+                    rf"(?:process(?:es)?\s+)?(?:is\s+|are\s+)?(?:(?:running|listening)\s+)?"
+                    rf"(?:on|using)\s+{_PORT}",
+                    "find_process",
+                    self._find_process,
+                ),
+                (
+                    r"kill\s+(?:the\s+)?(?:process|pid)\s+(?P<pid>\d+)",
+                    "kill_process",
+                    self._kill_pid,
+                ),
+                (
+                    rf"(?:list|show)\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?files{_HERE}|ls",
+                    "list_dir",
+                    self._list_dir,
+                ),
+                (
+                    r"(?:create|make)\s+(?:a\s+)?(?:new\s+)?(?:directory|folder|dir)\s+"
+                    r"(?:called\s+|named\s+)?(?P<name>[\w.-]+)",
+                    "create_dir",
+                    self._create_dir,
+                ),
+                (
+                    rf"find\s+(?:all\s+)?(?:the\s+)?(?:\*?(?P<ext>\.\w+))\s+files{_HERE}",
+                    "find_files",
+                    self._find_files,
+                ),
+                (
+                    rf"find\s+(?:the\s+|all\s+)?files?\s+(?:named|called)\s+"
+                    rf"(?P<name>[\w.*-]+){_HERE}",
+                    "find_files",
+                    self._find_files,
+                ),
+                (
+                    rf"(?:show|display|print|read)\s+(?:me\s+)?(?:the\s+)?contents?\s+of\s+"
+                    rf"(?:the\s+)?(?:file\s+)?{_FILE}"
+                    r"|(?:read|show)\s+(?:me\s+)?(?:the\s+)?file\s+(?P<file_path>[\w./~-]+)"
+                    r"|cat\s+(?P<cat_path>[\w./~-]+)",
+                    "read_file",
+                    self._read_file,
+                ),
+                (
+                    rf"(?:append|add|write)\s+(?P<quote>[\"'])(?P<content>.*?)(?P=quote)\s+"
+                    rf"to\s+(?:the\s+)?(?:end\s+of\s+)?(?:the\s+)?(?:file\s+)?{_FILE}",
+                    "append_file",
+                    self._append_file,
+                ),
+                (
+                    r"(?:show|print|what(?:'s|\s+is))\s+(?:me\s+)?(?:the\s+)?(?:current\s+)?"
+                    r"(?:working\s+)?(?:directory|folder|dir)|where\s+am\s+i|pwd",
+                    "current_dir",
+                    self._current_dir,
+                ),
+                (
+                    r"(?:show|list)\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?running\s+processes",
+                    "list_processes",
+                    self._list_processes,
+                ),
+                (r"who\s+am\s+i|whoami", "whoami", lambda m: ["whoami"]),
+            ]
+        ]
+        self._splitter = re.compile(r"\s+(?:and\s+then|and|then)\s+", re.IGNORECASE)
+
+    def _kill_port(self, m) -> Optional[List[str]]:
+        if not self.posix:
+            return None
+        return [f"lsof -ti :{m['port']} | xargs kill -9"]
+
+    def _find_process(self, m) -> Optional[List[str]]:
+        base = self.get_platform_command("find_process")
+        return [f"{base} :{m['port']}"] if base else None
+
+    def _kill_pid(self, m) -> Optional[List[str]]:
+        base = self.get_platform_command("kill_process")
+        return [f"{base} {m['pid']}"] if base else None
+
+    def _list_dir(self, m) -> Optional[List[str]]:
+        base = self.get_platform_command("list_dir")
+        return [base] if base else None
+
+    def _create_dir(self, m) -> Optional[List[str]]:
+        if m["name"].startswith("-"):
+            return None  # Would be read as options; Windows mkdir has no "--"
+        base = self.get_platform_command("create_dir")
+        return [f"{base} {m['name']}"] if base else None
+
+    def _find_files(self, m) -> Optional[List[str]]:
+        if not self.posix:
+            return None
+        name = f"*{m['ext']}" if m.groupdict().get("ext") else m["name"]
+        return [f'find . -name "{name}"']
+
+    def _read_file(self, m) -> Optional[List[str]]:
+        if not self.posix:
+            return None
+        path = next(p for p in m.groups() if p)
+        return [f"cat {_quote_path(path)}"]
+
+    def _append_file(self, m) -> Optional[List[str]]:
+        if not self.posix:
+            return None
+        return [f"echo {shlex.quote(m['content'])} >> {_quote_path(m['path'])}"]
+
+    def _current_dir(self, m) -> Optional[List[str]]:
+        return ["pwd"] if self.posix else None
+
+    def _list_processes(self, m) -> Optional[List[str]]:
+        return ["ps aux"] if self.posix else ["tasklist"]
+
+    def _match_one(self, text: str) -> Optional[IntentMatch]:
+        for pattern, intent, build in self.rules:
+            m = pattern.fullmatch(text)
+            if m:
+                commands = build(m)
+                if commands:
+                    return IntentMatch(intent=intent, commands=commands, confidence=1.0)
+        return None
+
+    def match(self, query: str) -> Optional[IntentMatch]:
+        """Resolve a query to commands, or return None to defer to the LLM."""
+        text = " ".join(query.split()).rstrip(".!?")
+        if not text:
+            return None
+
+        whole = self._match_one(text)
+        if whole:
+            return whole
+
+        # "show the current directory and list all files" -> one rule per clause
+        parts = self._splitter.split(text)
+        if len(parts) < 2:
+            return None
+        matches = [self._match_one(part) for part in parts]
+        if not all(matches):
+            return None
+        return IntentMatch(
+            intent="+".join(m.intent for m in matches),
+            commands=[cmd for m in matches for cmd in m.commands],
+            confidence=min(m.confidence for m in matches),
+        )
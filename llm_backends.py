@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from config import (
+    LLM_BACKENDS,
+    LLM_BACKEND,
+    LLM_SMALL_BACKEND,
+    LLM_POOL_CONNECTIONS,
+    LLM_KEEPALIVE_SECONDS,
+    ROUTER_MAX_QUERY_WORDS,
+    ROUTER_MIN_CONFIDENCE,
+    TEMPERATURE,
+)
+from llm_client import ChatResult, OpenAIChatClient
+from tracing import span
+
+# Placeholder key for servers that do not check one; the OpenAI SDK requires a value
+_NO_KEY = "not-needed"
+
+_clients: Dict[str, OpenAIChatClient] = {}
+_clients_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class BackendConfig:
+    """Connection settings for one LLM backend."""
+
+    name: str
+    model: str
+    base_url: Optional[str]
+    api_key_env: Optional[str]
+    timeout: float
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv(self.api_key_env) if self.api_key_env else _NO_KEY
+
+
+def backend_config(name: str) -> BackendConfig:
+    """Look up a backend in config.LLM_BACKENDS."""
+    if name not in LLM_BACKENDS:
+        raise ValueError(
+            f"Unknown LLM backend '{name}', expected one of: {', '.join(LLM_BACKENDS)}"
+        )
+    return BackendConfig(name=name, **LLM_BACKENDS[name])
+
+
+def active_backends() -> List[str]:
+    """The configured main backend, plus the small routing backend if any."""
+    names = [LLM_BACKEND]
+    if LLM_SMALL_BACKEND and LLM_SMALL_BACKEND != LLM_BACKEND:
+        names.insert(0, LLM_SMALL_BACKEND)
+    return names
+
+
+def missing_credentials(names: Optional[List[str]] = None) -> List[str]:
+    """Environment variables that must be set before the given backends can be used."""
+    missing = []
+    for name in names or active_backends():
+        backend = backend_config(name)
+        if backend.api_key_env and not backend.api_key:
+            missing.append(backend.api_key_env)
+    return missing
+
+
+def get_client(name: str) -> OpenAIChatClient:
+    """
+    Shared client for a backend.
+
+    One client is created per backend per process, over an HTTP pool with
+    keep-alive connections. The OpenAI client is thread-safe, so batch
+    workers and daemon requests reuse warm connections.
+    """
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            import httpx
+
+            backend = backend_config(name)
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(backend.timeout, connect=min(5.0, backend.timeout)),
+                limits=httpx.Limits(
+                    max_connections=LLM_POOL_CONNECTIONS,
+                    max_keepalive_connections=LLM_POOL_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+                ),
+            )
+            client = OpenAIChatClient(
+                model=backend.model,
+                temperature=TEMPERATURE,
+                api_key=backend.api_key,
+                base_url=backend.base_url,
+                timeout=backend.timeout,
+                http_client=http_client,
+            )
+            _clients[name] = client
+        return client
+
+
+def crew_llm(name: str = LLM_BACKEND):
+    """
+    crewai LLM object for a backend, or None when crewai predates LLM objects.
+
+    Agents created without one fall back to crewai's default OpenAI model.
+    """
+    try:
+        from crewai import LLM
+    except ImportError:
+        return None
+    backend = backend_config(name)
+    return LLM(
+        model=f"openai/{backend.model}",
+        base_url=backend.base_url,
+        api_key=backend.api_key,
+        timeout=backend.timeout,
+        temperature=TEMPERATURE,
+    )
+
+
+def _query_text(messages: List[Dict]) -> str:
+    """The user's request: the last line of the last user message, without its label."""
+    for message in reversed(messages):
+        if message["role"] == "user":
+            line = message["content"].strip().splitlines()[-1]
+            return line.split(":", 1)[1].strip() if line.startswith("Command:") else line
+    return ""
+
+
+def plan_confidence(text: str) -> Optional[float]:
+    """The model's self-reported confidence in a JSON plan, or None if unusable."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not data.get("commands"):
+        return None
+    try:
+        return float(data.get("confidence"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RoutingClient:
+    """
+    Chat client that tries a small, fast model first for short queries.
+
+    A query goes to the small backend when it has at most max_query_words
+    words. The request is escalated to the large backend when the small
+    one fails or times out, returns no usable plan, or reports a confidence
+    below min_confidence. Streams cannot be taken back once commands start
+    running, so streaming routes on query length alone.
+    """
+
+    def __init__(
+        self,
+        small: OpenAIChatClient,
+        large: OpenAIChatClient,
+        max_query_words: int = ROUTER_MAX_QUERY_WORDS,
+        min_confidence: float = ROUTER_MIN_CONFIDENCE,
+    ):
+        self.small = small
+        self.large = large
+        self.max_query_words = max_query_words
+        self.min_confidence = min_confidence
+        self.model = large.model  # Model that answered the last request
+        self.last_stream = ChatResult(text="")
+
+    def _is_short(self, messages: List[Dict]) -> bool:
+        return len(_query_text(messages).split()) <= self.max_query_words
+
+    def complete(self, messages: List[Dict], json_mode: bool = False) -> ChatResult:
+        if not self._is_short(messages):
+            self.model = self.large.model
+            return self.large.complete(messages, json_mode)
+
+        with span("llm.route", backend="small", model=self.small.model) as route_span:
+            try:
+                result = self.small.complete(messages, json_mode)
+            except Exception as e:
+                result, confidence, reason = None, None, f"error: {type(e).__name__}"
+            else:
+                confidence = plan_confidence(result.text)
+                reason = "no usable plan" if confidence is None else "low confidence"
+            if route_span:
+                route_span.attributes["confidence"] = confidence if confidence is not None else -1.0
+        if confidence is not None and confidence >= self.min_confidence:
+            self.model = self.small.model
+            return result
+
+        with span("llm.route", backend="large", model=self.large.model, reason=reason):
+            escalated = self.large.complete(messages, json_mode)
+        self.model = self.large.model
+        if result is not None:
+            # Report the tokens of both calls
+            escalated.prompt_tokens += result.prompt_tokens
+            escalated.completion_tokens += result.completion_tokens
+            escalated.cached_tokens += result.cached_tokens
+        return escalated
+
+    def stream(self, messages: List[Dict]) -> Iterator[str]:
+        client = self.small if self._is_short(messages) else self.large
+        self.model = client.model
+        try:
+            yield from client.stream(messages)
+        finally:
+            self.last_stream = client.last_stream
+
+
+def default_llm():
+    """The chat client for the configured backends: a router when a small backend is set."""
+    large = get_client(LLM_BACKEND)
+    if LLM_SMALL_BACKEND and LLM_SMALL_BACKEND != LLM_BACKEND:
+        return RoutingClient(get_client(LLM_SMALL_BACKEND), large)
+    return large
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import DEFAULT_MODEL, OPENAI_API_KEY, TEMPERATURE
+
+
+def _cached_tokens(usage: Any) -> int:
+    """Prompt tokens read from the prompt cache, for servers that report them."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+@dataclass
+class ChatResult:
+    """Text returned by a single chat completion plus its token usage."""
+
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # Prompt tokens served from the provider's prompt cache
+
+
+class OpenAIChatClient:
+    """
+    Minimal chat-completions client used for single-call interpretation.
+
+    Works with any server that speaks the OpenAI chat-completions protocol
+    when given its base_url. Pass a shared http_client to reuse keep-alive
+    connections across clients.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        temperature: float = TEMPERATURE,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        http_client: Any = None,
+    ):
+        from openai import OpenAI
+
+        self.model = model
+        self.temperature = temperature
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        if http_client is not None:
+            kwargs["http_client"] = http_client
+        self.client = OpenAI(api_key=api_key or OPENAI_API_KEY, base_url=base_url, **kwargs)
+        self.last_stream = ChatResult(text="")
+
+    def complete(self, messages: List[Dict], json_mode: bool = False) -> ChatResult:
+        """Run one chat completion and return its text and token usage."""
+        kwargs = {}
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            **kwargs,
+        )
+        usage = response.usage
+        return ChatResult(
+            text=response.choices[0].message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_tokens=_cached_tokens(usage),
+        )
+
+    def stream(self, messages: List[Dict]) -> Iterator[str]:
+        """
+        Stream a chat completion, yielding text chunks as they arrive.
+
+        The full text and token usage are available in ``last_stream`` once
+        the iterator is exhausted.
+        """
+        self.last_stream = ChatResult(text="")
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            for chunk in response:
+                if chunk.usage:
+                    self.last_stream.prompt_tokens = chunk.usage.prompt_tokens
+                    self.last_stream.completion_tokens = chunk.usage.completion_tokens
+                    self.last_stream.cached_tokens = _cached_tokens(chunk.usage)
+                for choice in chunk.choices:
+                    text = choice.delta.content
+                    if text:
+                        self.last_stream.text += text
+                        yield text
+        finally:
+            response.close()
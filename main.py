@@ -1,21 +1,57 @@
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
 import typer
 from rich.console import Console
 from rich.prompt import Prompt
 from rich.panel import Panel
-from ai_agent import CommandAI
-from config import OPENAI_API_KEY
+from config import (
+    STREAM_PLAN,
+    EARLY_EXECUTION,
+    DAEMON_SOCKET,
+    BATCH_CONCURRENCY,
+    FLEET_CONCURRENCY,
+    FLEET_HOST_TIMEOUT,
+    FLEET_PLATFORM,
+    HISTORY_SUGGEST_LIMIT,
+)
+from history_store import get_history_store
+from plan_cache import PlanCache
+from tracing import Tracer, span
+
+if TYPE_CHECKING:
+    from ai_agent import CommandAI
+    from history_index import Suggestion
 
 app = typer.Typer()
 console = Console()
 
 
 def check_api_key():
-    """Check if OpenAI API key is set."""
-    if not OPENAI_API_KEY:
+    """Check that the configured LLM backends have the API keys they need."""
+    from llm_backends import missing_credentials
+
+    try:
+        missing = missing_credentials()
+    except ValueError as e:
+        missing, problem = [], str(e)
+    else:
+        problem = None
+    if missing:
+        problem = (
+            f"{', '.join(missing)} not found in environment variables\n"
+            "Please set the API key in the .env file, or choose another backend with "
+            "SWAT_LLM_BACKEND (e.g. 'local' for an OpenAI-compatible local server)"
+        )
+    if problem:
         console.print(
             Panel(
-                "[red]Error: OPENAI_API_KEY not found in environment variables[/red]\n"
-                "Please set your OpenAI API key in the .env file",
+                f"[red]Error: {problem}[/red]",
                 title="SWAT CMD AI Error",
                 border_style="red",
             )
@@ -25,7 +61,32 @@ def check_api_key():
 
 @app.command()
 def execute(
-    command: str = typer.Argument(None, help="The natural language command to execute")
+    command: str = typer.Argument(None, help="The natural language command to execute"),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Skip the plan cache and always ask the LLM"
+    ),
+    mode: Optional[str] = typer.Option(
+        None,
+        "--mode",
+        help="Pipeline mode: 'fast' (one LLM call) or 'paranoid' (interpreter + validator agents)",
+    ),
+    stream: bool = typer.Option(
+        STREAM_PLAN, "--stream/--no-stream", help="Stream and validate the plan line by line"
+    ),
+    early_exec: bool = typer.Option(
+        EARLY_EXECUTION,
+        "--early-exec",
+        help="With --stream, run each safe command while the rest of the plan is generated",
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print a per-stage latency and token breakdown"
+    ),
+    trace: Optional[str] = typer.Option(
+        None, "--trace", help="Write a trace of every stage to this JSON file"
+    ),
+    trace_format: str = typer.Option(
+        "chrome", "--trace-format", help="Trace file format: 'chrome' or 'otlp'"
+    ),
 ):
     """Execute a natural language command."""
     check_api_key()
@@ -33,6 +94,74 @@ def execute(
     if not command:
         command = Prompt.ask("Enter your command")
 
+    # Imported here so commands that never need an LLM skip the heavy imports
+    from ai_agent import CommandAI
+
+    ai = CommandAI()
+    if sys.stdin.isatty():
+        ai.choose_suggestion = choose_suggestion
+
+    tracer = Tracer()
+    with tracer.activate() if profile or trace else nullcontext():
+        exit_code = run_query(
+            ai,
+            command,
+            use_cache=not no_cache,
+            mode=mode,
+            stream=stream,
+            early_execution=early_exec,
+        )
+    if profile:
+        print_profile(tracer)
+    if trace:
+        tracer.export(trace, trace_format)
+        console.print(f"[dim]Trace written to {trace}[/dim]")
+    if exit_code:
+        raise typer.Exit(exit_code)
+
+
+def _format_suggestions(suggestions: List["Suggestion"]) -> str:
+    lines = []
+    for number, suggestion in enumerate(suggestions, 1):
+        lines.append(
+            f"[bold]{number}.[/bold] {suggestion.query} "
+            f"[dim](ran {suggestion.runs}x, last {suggestion.last_used[:16]}, "
+            f"in {suggestion.working_directory})[/dim]"
+        )
+        lines.extend(f"     {command}" for command in suggestion.commands)
+    return "\n".join(lines)
+
+
+def choose_suggestion(suggestions: List["Suggestion"]) -> Optional["Suggestion"]:
+    """Offer plans from history and return the one picked, or None to ask the LLM."""
+    console.print(
+        Panel(
+            _format_suggestions(suggestions),
+            title="You ran this before",
+            border_style="cyan",
+        )
+    )
+    choices = [str(number) for number in range(1, len(suggestions) + 1)] + ["n"]
+    answer = Prompt.ask(
+        "Run one of these? Pick a number, or n to ask the LLM", choices=choices, default="n"
+    )
+    return None if answer == "n" else suggestions[int(answer) - 1]
+
+
+def run_query(ai: "CommandAI", command: str, **options) -> int:
+    """
+    Process one natural language command and render its results.
+
+    Shared by the execute command and the daemon, which keeps a warm CommandAI.
+
+    Returns:
+        Process exit code: 0 on success, 1 if the command could not be processed
+    """
+    with span("query", query=command):
+        return _run_query(ai, command, **options)
+
+
+def _run_query(ai: "CommandAI", command: str, **options) -> int:
     console.print(
         Panel(
             f"[bold blue]Processing command:[/bold blue] {command}",
@@ -42,26 +171,10 @@ def execute(
     )
 
     try:
-        ai = CommandAI()
-        result = ai.process_command(command)
-
-        for result in result["results"]:
-            if result["success"]:
-                console.print(
-                    Panel(
-                        f"\nCommand: {result['command']}\n\n[green]Command executed successfully![/green]\n{result['output']}",
-                        title="SWAT CMD AI",
-                        border_style="green",
-                    )
-                )
-            else:
-                console.print(
-                    Panel(
-                        f"\nCommand: {result['command']}\n\n[red]Command execution failed![/red]\n{result['output']}",
-                        title="SWAT CMD AI",
-                        border_style="red",
-                    )
-                )
+        result = ai.process_command(command, **options)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return 0
 
     except Exception as e:
         console.print(
@@ -71,19 +184,215 @@ def execute(
                 border_style="red",
             )
         )
-        raise typer.Exit(1)
+        return 1
+
+
+def print_profile(tracer: Tracer):
+    """Print the time, tokens and cache hits of each stage of a traced query."""
+    from rich.table import Table
+
+    stages = tracer.profile()
+    total_ms = stages.pop("query", {}).get("ms", 0.0)
+    table = Table(title="SWAT CMD AI Profile", border_style="blue")
+    table.add_column("Stage")
+    table.add_column("Calls", justify="right")
+    table.add_column("Time (ms)", justify="right")
+    table.add_column("% of query", justify="right")
+    table.add_column("Tokens in/out (cached)", justify="right")
+    table.add_column("Cache hits", justify="right")
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["ms"]):
+        tokens = ""
+        if stage.get("prompt_tokens") or stage.get("completion_tokens"):
+            tokens = f"{stage.get('prompt_tokens', 0)}/{stage.get('completion_tokens', 0)}"
+            if stage.get("cached_tokens"):
+                tokens += f" ({stage['cached_tokens']})"
+        table.add_row(
+            name,
+            str(stage["count"]),
+            f"{stage['ms']:.1f}",
+            f"{stage['ms'] / total_ms:.0%}" if total_ms else "",
+            tokens,
+            str(stage.get("cache_hits", "")),
+        )
+    table.add_row("total", "", f"{total_ms:.1f}", "", "", "", style="bold")
+    console.print(table)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Shorten long command output for terminal display."""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}\n... [{len(text) - max_chars} more characters truncated]"
+
+
+def _command_name(command: str) -> str:
+    """Program a command line starts with; a pipeline is named after its first command."""
+    from command_policy import parse_command
+
+    try:
+        return os.path.basename(parse_command(command).commands[0].argv[0].text)
+    except (ValueError, IndexError):
+        words = command.split()
+        return words[0] if words else command
+
+
+def usage_stats(entries) -> List[Dict]:
+    """
+    Aggregate the resource usage in history entries per command name.
+
+    Entries recorded before usage was tracked, and remote entries for CPU
+    and memory, are left out of the figures they lack.
+
+    Returns:
+        One row per command name, most CPU time first
+    """
+    rows: Dict[str, Dict] = {}
+    for entry in entries:
+        usage = entry.get("usage")
+        if not usage:
+            continue
+        row = rows.setdefault(
+            _command_name(entry.get("command", "")),
+            {"runs": 0, "failed": 0, "wall_ms": 0.0, "max_wall_ms": 0.0,
+             "cpu_runs": 0, "cpu_ms": 0.0, "max_rss_kb": 0},
+        )
+        row["runs"] += 1
+        row["failed"] += entry.get("status") != "success"
+        row["wall_ms"] += usage.get("wall_ms") or 0.0
+        row["max_wall_ms"] = max(row["max_wall_ms"], usage.get("wall_ms") or 0.0)
+        if usage.get("cpu_ms") is not None:
+            row["cpu_runs"] += 1
+            row["cpu_ms"] += usage["cpu_ms"]
+        row["max_rss_kb"] = max(row["max_rss_kb"], usage.get("max_rss_kb") or 0)
+
+    result = []
+    for name, row in rows.items():
+        result.append(
+            {
+                "command": name,
+                "runs": row["runs"],
+                "failed": row["failed"],
+                "wall_ms_total": round(row["wall_ms"], 1),
+                "wall_ms_mean": round(row["wall_ms"] / row["runs"], 1),
+                "wall_ms_max": round(row["max_wall_ms"], 1),
+                "cpu_ms_total": round(row["cpu_ms"], 1),
+                "cpu_ms_mean": (
+                    round(row["cpu_ms"] / row["cpu_runs"], 1) if row["cpu_runs"] else None
+                ),
+                "max_rss_kb": row["max_rss_kb"] or None,
+            }
+        )
+    result.sort(key=lambda r: (r["cpu_ms_total"], r["wall_ms_total"]), reverse=True)
+    return result
+
+
+def print_usage_stats(rows: List[Dict], as_json: bool = False):
+    """Print per-command usage, or one JSON line per command name."""
+    if as_json:
+        for row in rows:
+            sys.stdout.write(json.dumps(row) + "\n")
+        return
+    if not rows:
+        console.print("[yellow]No resource usage recorded yet[/yellow]")
+        return
+
+    from rich.table import Table
+
+    table = Table(title="SWAT CMD AI Command Costs", border_style="blue")
+    table.add_column("Command")
+    for column in ("Runs", "Failed", "Wall total (s)", "Wall mean (ms)", "Wall max (ms)",
+                   "CPU total (s)", "CPU mean (ms)", "Peak RSS (MB)"):
+        table.add_column(column, justify="right")
+    for row in rows:
+        table.add_row(
+            row["command"],
+            str(row["runs"]),
+            str(row["failed"]),
+            f"{row['wall_ms_total'] / 1000:.2f}",
+            f"{row['wall_ms_mean']:.1f}",
+            f"{row['wall_ms_max']:.1f}",
+            f"{row['cpu_ms_total'] / 1000:.2f}",
+            f"{row['cpu_ms_mean']:.1f}" if row["cpu_ms_mean"] is not None else "",
+            f"{row['max_rss_kb'] / 1024:.1f}" if row["max_rss_kb"] else "",
+        )
+    console.print(table)
 
 
 @app.command()
-def history():
+def history(
+    limit: Optional[int] = typer.Option(
+        None, "--limit", "-n", help="Show only the most recent N entries"
+    ),
+    since: Optional[str] = typer.Option(
+        None, "--since", help="Only entries at or after this ISO timestamp"
+    ),
+    status: Optional[str] = typer.Option(
+        None, "--status", help="Only entries with this status (success or error)"
+    ),
+    cwd: Optional[str] = typer.Option(
+        None, "--cwd", help="Only entries executed in this working directory"
+    ),
+    grep: Optional[str] = typer.Option(
+        None, "--grep", help="Only entries whose command or output contain this text"
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print entries as JSON lines"),
+    max_output: int = typer.Option(
+        500, "--max-output", help="Truncate output to this many characters (0 = no limit)"
+    ),
+    stats: bool = typer.Option(
+        False, "--stats", help="Show time, CPU and memory used per command name instead"
+    ),
+):
     """Show command execution history."""
-    check_api_key()
-
     try:
-        ai = CommandAI()
-        history = ai.get_command_history()
+        entries = get_history_store().iter_entries(
+            since=since,
+            status=status,
+            working_directory=cwd,
+            grep=grep,
+            limit=limit,
+        )
+
+        if stats:
+            print_usage_stats(usage_stats(entries), as_json)
+            return
 
-        if not history:
+        if as_json:
+            for entry in entries:
+                sys.stdout.write(json.dumps(entry) + "\n")
+            return
+
+        shown = 0
+        for entry in entries:
+            if not shown:
+                console.print(
+                    Panel(
+                        "\n[bold blue]Command History:[/bold blue]\n",
+                        title="SWAT CMD AI History",
+                        border_style="blue",
+                    )
+                )
+            shown += 1
+            if entry.get("status") == "success":
+                body = f"[bold]Output:[/bold]\n{_truncate(entry.get('output', ''), max_output)}"
+            else:
+                body = f"[bold]Error:[/bold]\n{_truncate(entry.get('error', ''), max_output)}"
+            if entry.get("output_blob"):
+                body += (
+                    f"\n[dim]{entry.get('output_bytes', 0)} bytes in total; "
+                    f"full output: swat output {entry['output_blob']}[/dim]"
+                )
+            if entry.get("query"):
+                body = f"[bold]Query:[/bold] {entry['query']}\n{body}"
+            console.print(
+                f"[bold]Command:[/bold] {entry['command']}\n"
+                f"[bold]Status:[/bold] {entry['status']}\n"
+                f"[bold]Timestamp:[/bold] {entry['timestamp']}\n"
+                f"[bold]Working Directory:[/bold] {entry.get('working_directory', 'N/A')}\n"
+                f"{body}\n---"
+            )
+
+        if not shown:
             console.print(
                 Panel(
                     "[yellow]No command history found[/yellow]",
@@ -91,38 +400,421 @@ def history():
                     border_style="yellow",
                 )
             )
-            return
 
+    except Exception as e:
         console.print(
             Panel(
-                "\n[bold blue]Command History:[/bold blue]\n",
-                title="SWAT CMD AI History",
-                border_style="blue",
+                f"\n[red]Error:[/red] {str(e)}",
+                title="SWAT CMD AI Error",
+                border_style="red",
             )
         )
-        for entry in history:
-            console.print(f"[bold]Command:[/bold] {entry['command']}")
-            console.print(f"[bold]Status:[/bold] {entry['status']}")
-            console.print(f"[bold]Timestamp:[/bold] {entry['timestamp']}")
-            console.print(
-                f"[bold]Working Directory:[/bold] {entry.get('working_directory', 'N/A')}"
-            )
-            if entry["status"] == "success":
-                console.print(f"[bold]Output:[/bold]\n{entry['output']}")
-            else:
-                console.print(f"[bold]Error:[/bold]\n{entry['error']}")
-            console.print("---")
+        raise typer.Exit(1)
 
-    except Exception as e:
+
+@app.command()
+def output(
+    output_id: str = typer.Argument(..., help="Output id shown under a truncated result"),
+    no_pager: bool = typer.Option(False, "--no-pager", help="Write to stdout even on a terminal"),
+):
+    """Show the full output of a command whose result was truncated."""
+    from output_store import get_blob_store
+
+    try:
+        chunks = get_blob_store().open(output_id)
+        first = next(chunks, b"")
+    except (ValueError, FileNotFoundError) as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+    pager = os.getenv("PAGER", "less -R")
+    if sys.stdout.isatty() and not no_pager and pager:
+        import shlex
+        import subprocess
+
+        try:
+            proc = subprocess.Popen(shlex.split(pager), stdin=subprocess.PIPE)
+        except OSError:
+            proc = None  # No such pager; fall back to stdout
+        if proc is not None:
+            # Feed the pager chunk by chunk so large outputs are never held in memory
+            try:
+                proc.stdin.write(first)
+                for chunk in chunks:
+                    proc.stdin.write(chunk)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass  # The user quit the pager early
+            proc.wait()
+            return
+
+    out = sys.stdout.buffer
+    out.write(first)
+    for chunk in chunks:
+        out.write(chunk)
+    out.flush()
+
+
+@app.command()
+def cache(
+    clear: bool = typer.Option(False, "--clear", help="Remove all cached plans"),
+):
+    """Show plan cache statistics."""
+    plan_cache = PlanCache()
+    if clear:
+        plan_cache.clear()
+        console.print("[green]Plan cache cleared[/green]")
+        return
+
+    stats = plan_cache.stats()
+    lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+    hit_rate = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+    console.print(
+        Panel(
+            f"[bold]Cached plans:[/bold] {stats['entries']}\n"
+            f"[bold]Exact hits:[/bold] {stats['hits']}\n"
+            f"[bold]Near-duplicate hits:[/bold] {stats['near_hits']}\n"
+            f"[bold]Misses:[/bold] {stats['misses']}\n"
+            f"[bold]Hit rate:[/bold] {hit_rate:.1%}",
+            title="SWAT CMD AI Plan Cache",
+            border_style="blue",
+        )
+    )
+
+
+@app.command()
+def suggest(
+    query: str = typer.Argument(..., help="Natural language query to look up"),
+    limit: int = typer.Option(HISTORY_SUGGEST_LIMIT, "--limit", "-n", help="Plans to show"),
+    as_json: bool = typer.Option(False, "--json", help="Print suggestions as JSON lines"),
+):
+    """Show plans from history that ran for similar queries, without the LLM."""
+    from history_index import HistoryIndex
+
+    index = HistoryIndex()
+    started = time.perf_counter()
+    suggestions = index.suggest(query, limit, working_directory=os.getcwd())
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if as_json:
+        for suggestion in suggestions:
+            sys.stdout.write(json.dumps(asdict(suggestion)) + "\n")
+        return
+    if not suggestions:
+        console.print(
+            f"[yellow]No similar query in history[/yellow] [dim]({elapsed_ms:.1f} ms)[/dim]"
+        )
+        raise typer.Exit(1)
+    console.print(
+        Panel(
+            _format_suggestions(suggestions),
+            title="You ran this before",
+            subtitle=f"{elapsed_ms:.1f} ms",
+            border_style="cyan",
+        )
+    )
+
+
+@app.command()
+def batch(
+    source: str = typer.Argument(
+        "-", help="File of queries (one per line or JSONL), or - for stdin"
+    ),
+    concurrency: int = typer.Option(
+        BATCH_CONCURRENCY, "--concurrency", "-j", help="Maximum concurrent LLM calls and directories"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Skip the plan cache and always ask the LLM"
+    ),
+    mode: Optional[str] = typer.Option(
+        None, "--mode", help="Pipeline mode: 'fast' or 'paranoid'"
+    ),
+):
+    """Interpret and execute a stream of queries, writing one JSON result per line."""
+    check_api_key()
+    import ai_agent
+    import command_executor
+    import repair
+    from batch import BatchRunner, read_batch
+
+    # Stdout carries JSONL results, so progress and errors go to stderr
+    stderr_console = Console(stderr=True)
+    ai_agent.console = command_executor.console = repair.console = stderr_console
+
+    runner = BatchRunner(
+        sys.stdout, concurrency=concurrency, use_cache=not no_cache, mode=mode
+    )
+    stream = sys.stdin if source == "-" else open(source, "r")
+    try:
+        stats = runner.run(read_batch(stream, os.getcwd()))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    stderr_console.print(
+        Panel(
+            f"[bold]Queries:[/bold] {stats['queries']} ({stats['unique_plans']} unique plans)\n"
+            f"[bold]Elapsed:[/bold] {stats['elapsed_s']}s\n"
+            f"[bold]Throughput:[/bold] {stats['throughput_qps']} queries/s\n"
+            f"[bold]Latency:[/bold] p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms",
+            title="SWAT CMD AI Batch",
+            border_style="blue",
+        )
+    )
+
+
+def _hosts(host: List[str], hosts_file: Optional[str]) -> List[str]:
+    """Hosts from --host options followed by those in --hosts-file."""
+    from remote import read_hosts
+
+    hosts = list(host)
+    if hosts_file:
+        with open(hosts_file) as f:
+            hosts += read_hosts(f)
+    return hosts
+
+
+def _print_fleet_results(commands: List[str], results: List[Dict], as_json: bool):
+    """Print per-host results of a fleet run, or one JSON line per host."""
+    from output_store import clip
+    from rich.text import Text
+
+    if as_json:
+        for host_result in results:
+            sys.stdout.write(json.dumps({"commands": commands, **host_result}) + "\n")
+        return
+    for host_result in results:
+        body = Text()
+        for step in host_result["results"]:
+            text, _ = clip(str(step["output"] or ""))
+            body.append(f"$ {step['command']}\n", style="bold")
+            body.append(f"{text.rstrip()}\n", style=None if step["success"] else "red")
+            if step.get("output_blob"):
+                body.append(f"Full output: swat output {step['output_blob']}\n", style="dim")
+        if host_result["error"]:
+            body.append(host_result["error"], style="red")
         console.print(
             Panel(
-                f"\n[red]Error:[/red] {str(e)}",
-                title="SWAT CMD AI Error",
-                border_style="red",
+                body,
+                title=f"{host_result['host']} ({host_result['elapsed_ms']:.0f} ms)",
+                border_style="green" if host_result["success"] else "red",
             )
         )
+    failed = [r["host"] for r in results if not r["success"]]
+    console.print(
+        f"[bold]{len(results) - len(failed)}/{len(results)} hosts succeeded[/bold]"
+        + (f" [red](failed: {', '.join(failed)})[/red]" if failed else "")
+    )
+
+
+@app.command()
+def fleet(
+    command: str = typer.Argument(..., help="The natural language command to run on every host"),
+    host: List[str] = typer.Option(
+        [], "--host", "-H", help="SSH destination, or local[:dir] for a local stand-in (repeatable)"
+    ),
+    hosts_file: Optional[str] = typer.Option(
+        None, "--hosts-file", help="File with one host per line"
+    ),
+    cwd: Optional[str] = typer.Option(
+        None, "--cwd", help="Directory to run commands in on each host (default: login directory)"
+    ),
+    timeout: float = typer.Option(
+        FLEET_HOST_TIMEOUT, "--timeout", help="Seconds allowed for each host's whole plan"
+    ),
+    concurrency: int = typer.Option(
+        FLEET_CONCURRENCY, "--concurrency", "-j", help="Maximum hosts running at once"
+    ),
+    target_platform: str = typer.Option(
+        FLEET_PLATFORM, "--platform", help="Operating system of the hosts, for planning"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Skip the plan cache and always ask the LLM"
+    ),
+    mode: Optional[str] = typer.Option(
+        None, "--mode", help="Pipeline mode: 'fast' or 'paranoid'"
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print one JSON line per host"),
+):
+    """Interpret a command once and run the plan on many hosts over SSH."""
+    from remote import FleetExecutor
+
+    hosts = _hosts(host, hosts_file)
+    if not hosts:
+        console.print("[red]No hosts given; use --host or --hosts-file[/red]")
+        raise typer.Exit(2)
+
+    check_api_key()
+    from ai_agent import CommandAI
+
+    # Plan for the remote hosts, not for this machine
+    ai = CommandAI(target_platform=target_platform)
+    ai.env_context = None  # Even on the same OS, the snapshot describes this machine
+    ai.set_working_directory(cwd or "~")
+    try:
+        commands, _ = ai.plan_commands(command, use_cache=not no_cache, mode=mode)
+        if not commands:
+            raise ValueError("No valid commands were generated")
+        results = FleetExecutor(
+            hosts, cwd=cwd, concurrency=concurrency, host_timeout=timeout
+        ).run(commands)
+    except Exception as e:
+        console.print(
+            Panel(f"\n[red]Error:[/red] {str(e)}", title="SWAT CMD AI Fleet", border_style="red")
+        )
         raise typer.Exit(1)
 
+    _print_fleet_results(commands, results, as_json)
+    if not all(r["success"] for r in results):
+        raise typer.Exit(1)
+
+
+@app.command()
+def plan(
+    command: str = typer.Argument(..., help="The natural language command to plan"),
+    plan_path: str = typer.Option("plan.json", "--output", "-o", help="Plan file to write"),
+    target_platform: Optional[str] = typer.Option(
+        None, "--platform", help="Operating system to plan for (default: this machine)"
+    ),
+    cwd: Optional[str] = typer.Option(
+        None, "--cwd", help="Working directory to plan for (default: the current directory)"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Skip the plan cache and always ask the LLM"
+    ),
+    mode: Optional[str] = typer.Option(
+        None, "--mode", help="Pipeline mode: 'fast' or 'paranoid'"
+    ),
+):
+    """Interpret a command and write the validated plan to a file, without running it."""
+    check_api_key()
+    from ai_agent import CommandAI
+    from plan_file import compile_plan, write_plan
+
+    ai = CommandAI(target_platform=target_platform)
+    ai.set_working_directory(cwd or os.getcwd())
+    try:
+        commands, plan_source = ai.plan_commands(command, use_cache=not no_cache, mode=mode)
+        plan_data = compile_plan(
+            command,
+            commands,
+            ai.platform,
+            ai.current_dir,
+            model=ai.model if plan_source in ("llm", "cache") else None,
+            plan_source=plan_source,
+        )
+        write_plan(plan_data, plan_path)
+    except Exception as e:
+        console.print(
+            Panel(f"\n[red]Error:[/red] {str(e)}", title="SWAT CMD AI Plan", border_style="red")
+        )
+        raise typer.Exit(1)
+
+    steps = "\n".join(f"  {number}. {c}" for number, c in enumerate(commands, 1))
+    console.print(
+        Panel(
+            f"[bold]Query:[/bold] {command}\n"
+            f"[bold]Commands:[/bold]\n{steps}\n"
+            f"[bold]Platform:[/bold] {plan_data['platform']}\n"
+            f"[bold]Planned in:[/bold] {plan_data['cwd']}\n"
+            f"[bold]Checksum:[/bold] {plan_data['checksum']}\n\n"
+            f"Run it with: swat run {plan_path}",
+            title=f"SWAT CMD AI Plan: {plan_path}",
+            border_style="blue",
+        )
+    )
+
+
+@app.command()
+def run(
+    plan_path: str = typer.Argument(..., help="Plan file written by the plan command"),
+    cwd: Optional[str] = typer.Option(
+        None,
+        "--cwd",
+        help="Directory to run in (default: here, or the login directory on hosts)",
+    ),
+    host: List[str] = typer.Option(
+        [], "--host", "-H", help="Run on this SSH destination instead of locally (repeatable)"
+    ),
+    hosts_file: Optional[str] = typer.Option(
+        None, "--hosts-file", help="File with one host per line"
+    ),
+    timeout: float = typer.Option(
+        FLEET_HOST_TIMEOUT, "--timeout", help="Seconds allowed for each host's whole plan"
+    ),
+    concurrency: int = typer.Option(
+        FLEET_CONCURRENCY, "--concurrency", "-j", help="Maximum hosts running at once"
+    ),
+    force: bool = typer.Option(
+        False, "--force", help="Run a plan that was made for another platform"
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print results as JSON lines"),
+):
+    """Run a plan file: no LLM call, only the local command validation."""
+    from plan_file import PlanFileError, read_plan
+
+    try:
+        plan_data = read_plan(plan_path)
+    except PlanFileError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    commands = plan_data["commands"]
+
+    hosts = _hosts(host, hosts_file)
+    if hosts:
+        from remote import FleetExecutor
+
+        results = FleetExecutor(
+            hosts, cwd=cwd, concurrency=concurrency, host_timeout=timeout
+        ).run(commands)
+        _print_fleet_results(commands, results, as_json)
+        if not all(r["success"] for r in results):
+            raise typer.Exit(1)
+        return
+
+    import platform
+
+    this_platform = platform.system().lower()
+    if plan_data.get("platform") != this_platform and not force:
+        console.print(
+            f"[red]{plan_path} was planned for {plan_data.get('platform')}, "
+            f"but this machine runs {this_platform}; use --force to run it anyway[/red]"
+        )
+        raise typer.Exit(1)
+
+    from command_executor import MultiCommandExecutor
+
+    executor = MultiCommandExecutor()
+    executor.original_cwd = os.path.abspath(os.path.expanduser(cwd)) if cwd else os.getcwd()
+    if plan_data.get("cwd") != executor.original_cwd and not as_json:
+        console.print(
+            f"[dim]Planned in {plan_data.get('cwd')}; running in {executor.original_cwd}[/dim]"
+        )
+    executor.begin_run(plan_data.get("query"))
+    results = executor.execute_plan(commands)
+    if as_json:
+        for result in results:
+            sys.stdout.write(json.dumps(result) + "\n")
+    else:
+        for result in results:
+            executor.render_result(result)
+    if len(results) < len(commands) or not all(r["success"] for r in results):
+        raise typer.Exit(1)
+
+
+@app.command()
+def daemon(
+    socket_path: str = typer.Option(
+        str(DAEMON_SOCKET), "--socket", help="Unix domain socket to listen on"
+    ),
+):
+    """Run a long-lived daemon that keeps a warm CommandAI for the swat client."""
+    check_api_key()
+    from daemon import serve
+
+    console.print(f"[green]SWAT daemon listening on {socket_path}[/green]")
+    serve(socket_path)
+
 
 if __name__ == "__main__":
     app()
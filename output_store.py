@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from config import (
+    OUTPUT_BLOB_COMPRESSLEVEL,
+    OUTPUT_BLOB_DIR,
+    OUTPUT_BLOB_MAX_BYTES,
+    OUTPUT_DISPLAY_LINES,
+    OUTPUT_INLINE_BYTES,
+)
+
+READ_CHUNK_BYTES = 64 * 1024
+_BLOB_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+class BlobWriter:
+    """
+    Receives a command's stdout as it arrives and keeps it in full.
+
+    Output stays in memory until it outgrows inline_bytes or inline_lines.
+    After that it is compressed straight to a temporary file, so memory
+    stays bounded however much the command prints.
+    """
+
+    def __init__(self, store: "BlobStore", inline_bytes: int, inline_lines: int):
+        self.store = store
+        self.inline_bytes = inline_bytes
+        self.inline_lines = inline_lines
+        self.total = 0
+        self._buffer = bytearray()
+        self._lines = 0
+        self._hash = hashlib.sha256()
+        self._path: Optional[str] = None
+        self._file: Optional[BinaryIO] = None
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        self._hash.update(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+        self._buffer += chunk
+        self._lines += chunk.count(b"\n")
+        if len(self._buffer) > self.inline_bytes or self._lines > self.inline_lines:
+            self.store.path.mkdir(parents=True, exist_ok=True)
+            fd, self._path = tempfile.mkstemp(dir=self.store.path, suffix=".tmp")
+            self._file = gzip.GzipFile(
+                fileobj=os.fdopen(fd, "wb"), mode="wb", compresslevel=self.store.compresslevel
+            )
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+
+    def on_output(self, stream: str, chunk: bytes):
+        """process_runner callback that keeps stdout."""
+        if stream == "stdout":
+            self.write(chunk)
+
+    def commit(self) -> Optional[str]:
+        """Store the blob if the output was too large to keep inline, and return its id."""
+        if self._file is None:
+            return None
+        self._close()
+        blob_id = self._hash.hexdigest()[:16]
+        os.replace(self._path, self.store.blob_path(blob_id))
+        self.store.prune()
+        return blob_id
+
+    def discard(self):
+        """Drop the output, for commands whose output is not kept."""
+        if self._file is not None:
+            self._close()
+            os.unlink(self._path)
+
+    def _close(self):
+        fileobj = self._file.fileobj
+        self._file.close()
+        fileobj.close()
+
+
+class BlobStore:
+    """Content-addressed gzip blobs of large command outputs, oldest pruned first."""
+
+    def __init__(
+        self,
+        path: Path = OUTPUT_BLOB_DIR,
+        max_bytes: int = OUTPUT_BLOB_MAX_BYTES,
+        compresslevel: int = OUTPUT_BLOB_COMPRESSLEVEL,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self._prune_lock = threading.Lock()
+
+    def blob_path(self, blob_id: str) -> Path:
+        if not _BLOB_ID.match(blob_id):
+            raise ValueError(f"Invalid output id: {blob_id}")
+        return self.path / f"{blob_id}.gz"
+
+    def writer(
+        self,
+        inline_bytes: int = OUTPUT_INLINE_BYTES,
+        inline_lines: int = OUTPUT_DISPLAY_LINES,
+    ) -> BlobWriter:
+        return BlobWriter(self, inline_bytes, inline_lines)
+
+    def open(self, blob_id: str) -> Iterator[bytes]:
+        """Stream a blob's decompressed bytes in chunks."""
+        path = self.blob_path(blob_id)
+        if not path.exists():
+            raise FileNotFoundError(f"No stored output with id {blob_id}")
+        with gzip.open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+                yield chunk
+
+    def prune(self):
+        """Remove the oldest blobs until the store fits in max_bytes."""
+        with self._prune_lock:
+            blobs = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(".gz"):
+                    stat = entry.stat()
+                    blobs.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in blobs)
+            for _, size, path in sorted(blobs):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+def clip(text: str, max_lines: int = OUTPUT_DISPLAY_LINES) -> Tuple[str, int]:
+    """
+    Shorten output to its first and last lines for display.
+
+    Three quarters of max_lines come from the head and the rest from the
+    tail. Very long lines are cut as well, so the text to render is bounded.
+
+    Returns:
+        The clipped text and the number of lines left out
+    """
+    max_chars = max_lines * 200
+    lines = text.splitlines()
+    if len(lines) <= max_lines and len(text) <= max_chars:
+        return text, 0
+    head = max_lines * 3 // 4
+    tail = max_lines - head
+    hidden = max(0, len(lines) - max_lines)
+    kept = lines[:head] + [f"... [{hidden} lines hidden] ..."] + lines[-tail:] if hidden else lines
+    clipped = [line if len(line) <= 1000 else line[:1000] + " ..." for line in kept]
+    result = "\n".join(clipped)
+    if len(result) > max_chars:
+        result = result[:max_chars] + "\n... [output cut] ..."
+    return result, hidden
+
+
+_stores = {}
+
+
+def get_blob_store(path: Path = OUTPUT_BLOB_DIR) -> BlobStore:
+    """Return the shared blob store for a directory."""
+    key = str(path)
+    if key not in _stores:
+        _stores[key] = BlobStore(path)
+    return _stores[key]
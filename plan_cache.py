@@ -0,0 +1,200 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from config import (
+    PLAN_CACHE_FILE,
+    PLAN_CACHE_MAX_ENTRIES,
+    PLAN_CACHE_SIMILARITY,
+    PLAN_CACHE_TTL,
+)
+
+STOPWORDS = {
+    "a", "an", "the", "it", "its", "this", "that", "me", "my", "please", "and",
+    "then", "of", "on", "in", "at", "for", "to", "from", "with", "all", "any",
+    "called", "named", "can", "you", "i", "want", "would", "like", "current",
+}
+
+# Words of questions and requests that say nothing about what a plan does;
+# they are the only words in which two near-duplicate queries may differ
+FILLER_WORDS = {
+    "is", "are", "be", "was", "whatever", "thing", "things", "stuff", "what", "what's",
+    "whats", "which", "there", "here", "some", "every", "how", "do", "does", "just",
+    "now", "again", "into", "by", "using", "use", "that's", "need", "get", "give",
+}
+
+# Words that say which way an operation goes: "copy a to b" is not "copy b to a"
+DIRECTION_WORDS = {"to", "from", "into", "onto", "as"}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and collapse whitespace and trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip(".!?")
+
+
+def _words(query: str) -> List[str]:
+    words = re.findall(r"[\w./:~*\"'-]+", normalize_query(query))
+    return [w.strip("\"'") for w in words]
+
+
+def query_tokens(query: str) -> Set[str]:
+    """Split a normalized query into content tokens."""
+    return set(_words(query)) - STOPWORDS - {""}
+
+
+def query_words(query: str) -> List[str]:
+    """Content words of a query in order, keeping the words in DIRECTION_WORDS."""
+    return [
+        w for w in _words(query)
+        if w in DIRECTION_WORDS or (w and w not in STOPWORDS and w not in FILLER_WORDS)
+    ]
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    """Jaccard similarity of two token sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PlanCache:
+    """Persistent cache from natural-language queries to validated command plans."""
+
+    def __init__(
+        self,
+        path: Path = PLAN_CACHE_FILE,
+        ttl: float = PLAN_CACHE_TTL,
+        max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+        similarity: float = PLAN_CACHE_SIMILARITY,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS plans (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                query TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                commands TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_plans_scope ON plans(scope);
+            CREATE INDEX IF NOT EXISTS idx_plans_last_used ON plans(last_used);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+
+    @staticmethod
+    def _scope(platform: str, cwd: str, model: str) -> str:
+        return hashlib.sha256(f"{platform}\0{cwd}\0{model}".encode()).hexdigest()
+
+    def _key(self, query: str, platform: str, cwd: str, model: str) -> str:
+        scope = self._scope(platform, cwd, model)
+        return hashlib.sha256(f"{scope}\0{normalize_query(query)}".encode()).hexdigest()
+
+    def _bump(self, name: str):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _touch(self, key: str, now: float):
+        self._conn.execute(
+            "UPDATE plans SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+        )
+
+    def get(self, query: str, platform: str, cwd: str, model: str) -> Optional[List[str]]:
+        """Return a cached plan for the query or a near-duplicate of it."""
+        now = time.time()
+        min_created = now - self.ttl
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT commands FROM plans WHERE key = ? AND created_at >= ?",
+                (self._key(query, platform, cwd, model), min_created),
+            ).fetchone()
+            if row:
+                self._touch(self._key(query, platform, cwd, model), now)
+                self._bump("hits")
+                return json.loads(row[0])
+
+            # A near-duplicate has the same content words in the same order, so
+            # it names the same operands in the same roles; only filler differs
+            tokens, words = query_tokens(query), query_words(query)
+            best_key, best_commands, best_score = None, None, 0.0
+            for key, cached_query, raw_tokens, commands in self._conn.execute(
+                "SELECT key, query, tokens, commands FROM plans "
+                "WHERE scope = ? AND created_at >= ?",
+                (self._scope(platform, cwd, model), min_created),
+            ):
+                if query_words(cached_query) != words:
+                    continue
+                score = _similarity(tokens, set(json.loads(raw_tokens)))
+                if score > best_score:
+                    best_key, best_commands, best_score = key, commands, score
+
+            if best_key and best_score >= self.similarity:
+                self._touch(best_key, now)
+                self._bump("near_hits")
+                return json.loads(best_commands)
+
+            self._bump("misses")
+            return None
+
+    def put(self, query: str, platform: str, cwd: str, model: str, commands: List[str]):
+        """Store a validated plan, evicting expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans "
+                "(key, scope, query, tokens, commands, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    self._key(query, platform, cwd, model),
+                    self._scope(platform, cwd, model),
+                    normalize_query(query),
+                    json.dumps(sorted(query_tokens(query))),
+                    json.dumps(commands),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.execute("DELETE FROM plans WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM plans WHERE key NOT IN "
+                "(SELECT key FROM plans ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, near-hit and miss counts plus the number of cached plans."""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT name, value FROM stats"))
+            entries = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        return {
+            "hits": counts.get("hits", 0),
+            "near_hits": counts.get("near_hits", 0),
+            "misses": counts.get("misses", 0),
+            "entries": entries,
+        }
+
+    def clear(self):
+        """Remove all cached plans and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM plans")
+            self._conn.execute("DELETE FROM stats")
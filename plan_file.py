@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from command_policy import validate
+
+PLAN_FORMAT = "swat-plan"
+PLAN_VERSION = 1
+
+
+class PlanFileError(ValueError):
+    """Raised when a plan file cannot be written, read or trusted."""
+
+
+def plan_checksum(plan: Dict) -> str:
+    """SHA-256 of the plan's canonical JSON, leaving out the checksum itself."""
+    body = {key: value for key, value in plan.items() if key != "checksum"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return "sha256:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _validate_commands(commands: List[str]):
+    for command in commands:
+        is_valid, message = validate(command)
+        if not is_valid:
+            raise PlanFileError(f"Invalid command '{command}': {message}")
+
+
+def compile_plan(
+    query: str,
+    commands: List[str],
+    platform: str,
+    cwd: str,
+    model: Optional[str] = None,
+    plan_source: Optional[str] = None,
+) -> Dict:
+    """
+    Build a plan file's contents from an interpreted plan.
+
+    Every command is validated first, so a plan file only ever holds
+    commands that passed the policy when it was written.
+
+    Args:
+        query: Natural language query the plan answers
+        commands: Commands in execution order
+        platform: Operating system the plan was made for
+        cwd: Working directory the plan was made for; relative paths in the
+            commands assume they run in an equivalent directory
+        model: Model that interpreted the query, if any
+        plan_source: Where the plan came from: "local", "cache", "history" or "llm"
+
+    Raises:
+        PlanFileError: If there are no commands or one fails validation
+    """
+    if not commands:
+        raise PlanFileError("No valid commands were generated")
+    _validate_commands(commands)
+    plan = {
+        "format": PLAN_FORMAT,
+        "version": PLAN_VERSION,
+        "query": query,
+        "commands": list(commands),
+        "platform": platform,
+        "cwd": cwd,
+        "model": model,
+        "plan_source": plan_source,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    plan["checksum"] = plan_checksum(plan)
+    return plan
+
+
+def write_plan(plan: Dict, path: str):
+    """Write a plan file atomically, so a reader never sees half of it."""
+    target = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(plan, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_plan(path: str) -> Dict:
+    """
+    Load a plan file and check that it can be trusted.
+
+    The checksum must match, so a plan edited by hand or damaged in transit
+    is refused, and every command is validated again against the current
+    policy.
+
+    Raises:
+        PlanFileError: If the file is unreadable, from an unknown format or
+            version, modified since it was written, or holds an invalid command
+    """
+    try:
+        with open(path, "r") as f:
+            plan = json.load(f)
+    except OSError as e:
+        raise PlanFileError(f"Cannot read plan file {path}: {e.strerror}")
+    except json.JSONDecodeError as e:
+        raise PlanFileError(f"{path} is not a plan file: {e}")
+
+    if not isinstance(plan, dict) or plan.get("format") != PLAN_FORMAT:
+        raise PlanFileError(f"{path} is not a plan file")
+    version = plan.get("version")
+    if not isinstance(version, int) or version > PLAN_VERSION:
+        raise PlanFileError(
+            f"{path} has plan format version {version}; this swat reads up to {PLAN_VERSION}"
+        )
+    if plan.get("checksum") != plan_checksum(plan):
+        raise PlanFileError(f"{path} was modified after it was written (checksum mismatch)")
+
+    commands = plan.get("commands")
+    if (
+        not isinstance(commands, list)
+        or not commands
+        or not all(isinstance(c, str) and c.strip() for c in commands)
+    ):
+        raise PlanFileError(f"{path} has no commands")
+    _validate_commands(commands)
+    return plan
@@ -0,0 +1,269 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+try:
+    import resource
+except ImportError:  # Windows has no rusage or rlimits
+    resource = None
+
+READ_CHUNK_BYTES = 64 * 1024
+TERMINATE_GRACE_SECONDS = 2.0
+
+
+class HeadTailBuffer:
+    """Keep the first and last bytes of a stream and drop the middle."""
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes > 0:
+            self.tail += data
+            # Trim lazily so appends stay amortized O(1)
+            if len(self.tail) > 2 * self.tail_bytes:
+                del self.tail[: len(self.tail) - self.tail_bytes]
+
+    @property
+    def dropped(self) -> int:
+        """Number of bytes discarded from the middle of the stream."""
+        return self.total - len(self.head) - min(len(self.tail), self.tail_bytes)
+
+    def getvalue(self) -> str:
+        tail = bytes(self.tail[-self.tail_bytes:]) if self.tail_bytes else b""
+        if self.dropped <= 0:
+            return (bytes(self.head) + tail).decode("utf-8", errors="replace")
+        return (
+            bytes(self.head).decode("utf-8", errors="replace")
+            + f"\n... [{self.dropped} bytes omitted] ...\n"
+            + tail.decode("utf-8", errors="replace")
+        )
+
+
+@dataclass
+class ProcessResult:
+    """Outcome of a process run with bounded output capture."""
+
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    output_limit_exceeded: bool = False
+    wall_ms: float = 0.0
+    cpu_ms: Optional[float] = None  # user + system time of the process and its reaped children
+    max_rss_kb: Optional[int] = None  # None when no larger than swat's own peak RSS
+
+    def usage(self) -> Dict:
+        """Resource usage as recorded in history."""
+        return {
+            "wall_ms": round(self.wall_ms, 1),
+            "cpu_ms": round(self.cpu_ms, 1) if self.cpu_ms is not None else None,
+            "max_rss_kb": self.max_rss_kb,
+            "exit_code": self.returncode,
+        }
+
+
+class _RusagePopen(subprocess.Popen):
+    """Popen that reaps its child with wait4 and keeps the child's rusage."""
+
+    rusage = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Reaped elsewhere; Popen reports that as status 0 as well
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+        return pid, status
+
+
+# On POSIX, Popen.wait() reaps the child through _try_wait; elsewhere there is no rusage
+_HAS_RUSAGE = hasattr(os, "wait4") and hasattr(subprocess.Popen, "_try_wait")
+Popen = _RusagePopen if _HAS_RUSAGE else subprocess.Popen
+
+
+def limit_command(
+    command: Union[str, Sequence[str]], cpu_seconds: int = 0, memory_mb: int = 0
+) -> Union[str, List[str]]:
+    """
+    Wrap a command so /bin/sh sets CPU and address-space limits before running it.
+
+    Limits are inherited by everything the command starts. The shell sets
+    them with ulimit and then execs the command, so nothing runs between
+    fork and exec in this process, which is not safe with threads.
+
+    Returns:
+        The command unchanged if there are no limits or no POSIX shell,
+        otherwise an argv list that runs it under the limits
+    """
+    if os.name != "posix" or not (cpu_seconds or memory_mb):
+        return command
+    ulimits = []
+    if cpu_seconds:
+        ulimits.append(f"ulimit -t {int(cpu_seconds)}")  # SIGXCPU, then SIGKILL
+    if memory_mb:
+        ulimits.append(f"ulimit -v {int(memory_mb) * 1024}")  # in kilobytes
+    prefix = " && ".join(ulimits) + " || exit 126\n"
+    if isinstance(command, str):
+        return ["/bin/sh", "-c", prefix + command]
+    return ["/bin/sh", "-c", prefix + 'exec "$@"', "sh", *command]
+
+
+def _inherited_rss_kb() -> int:
+    """
+    Upper bound on the peak RSS a child inherits from this process.
+
+    Linux carries the peak RSS of the process a command was forked from
+    across exec, so a child's ru_maxrss is never below this.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss
+
+
+def _usage(proc: subprocess.Popen, started: float) -> Dict:
+    usage = {"wall_ms": (time.monotonic() - started) * 1000}
+    rusage = getattr(proc, "rusage", None)
+    if rusage is not None:
+        usage["cpu_ms"] = (rusage.ru_utime + rusage.ru_stime) * 1000
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        max_rss = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+        # At or below the inherited floor the command's own peak is unknown
+        if max_rss > _inherited_rss_kb():
+            usage["max_rss_kb"] = max_rss
+    return usage
+
+
+def terminate_process_group(proc: subprocess.Popen, grace: float = TERMINATE_GRACE_SECONDS):
+    """Stop a process and everything it spawned: SIGTERM, then SIGKILL after a grace period."""
+    if os.name != "posix":
+        proc.kill()
+        proc.wait()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        proc.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+def run_process(
+    command: Union[str, Sequence[str]],
+    cwd: str,
+    timeout: Optional[float],
+    max_output_bytes: int,
+    head_bytes: int,
+    tail_bytes: int,
+    on_output: Optional[Callable[[str, bytes], None]] = None,
+    cpu_limit: int = 0,
+    memory_limit_mb: int = 0,
+) -> ProcessResult:
+    """
+    Run a command, reading stdout and stderr incrementally.
+
+    Args:
+        command: Shell command line to run through /bin/sh, or an argv list
+            to exec directly
+        cwd: Working directory for the command
+        timeout: Seconds before the process group is terminated (None = no limit)
+        max_output_bytes: Combined stdout/stderr bytes before the process group
+            is terminated (0 = no limit)
+        head_bytes: Bytes kept from the start of each stream
+        tail_bytes: Bytes kept from the end of each stream
+        on_output: Called with ("stdout" or "stderr", chunk) as data arrives
+        cpu_limit: CPU seconds allowed to the command and each process it
+            starts (0 = no limit)
+        memory_limit_mb: Address space allowed to each process (0 = no limit)
+
+    Returns:
+        ProcessResult with the retained head and tail of each stream, plus
+        wall time and, where wait4 is available, CPU time and peak RSS.
+        Peak RSS is left out when it does not exceed this process's own,
+        since it may then be inherited rather than the command's
+    """
+    started = time.monotonic()
+    command = limit_command(command, cpu_limit, memory_limit_mb)
+    proc = Popen(
+        command if isinstance(command, str) else list(command),
+        shell=isinstance(command, str),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=os.name == "posix",  # Own process group for clean termination
+    )
+    buffers = {
+        "stdout": HeadTailBuffer(head_bytes, tail_bytes),
+        "stderr": HeadTailBuffer(head_bytes, tail_bytes),
+    }
+    lock = threading.Lock()
+    limit_exceeded = threading.Event()
+
+    def read(name: str, pipe):
+        for chunk in iter(lambda: pipe.read1(READ_CHUNK_BYTES), b""):
+            with lock:
+                buffers[name].write(chunk)
+                total = buffers["stdout"].total + buffers["stderr"].total
+            if on_output:
+                on_output(name, chunk)
+            if max_output_bytes and total > max_output_bytes and not limit_exceeded.is_set():
+                limit_exceeded.set()
+                threading.Thread(target=terminate_process_group, args=(proc,), daemon=True).start()
+        pipe.close()
+
+    readers = [
+        threading.Thread(target=read, args=("stdout", proc.stdout), daemon=True),
+        threading.Thread(target=read, args=("stderr", proc.stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    timed_out = False
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        terminate_process_group(proc)
+
+    # Output is complete only once every holder of the pipes has exited,
+    # including background children, so readers share the same deadline
+    for reader in readers:
+        reader.join(max(0.0, deadline - time.monotonic()) if deadline else None)
+    if any(reader.is_alive() for reader in readers):
+        timed_out = True
+        terminate_process_group(proc)
+        for reader in readers:
+            reader.join()
+
+    return ProcessResult(
+        returncode=proc.returncode,
+        stdout=buffers["stdout"].getvalue(),
+        stderr=buffers["stderr"].getvalue(),
+        timed_out=timed_out,
+        output_limit_exceeded=limit_exceeded.is_set(),
+        **_usage(proc, started),
+    )
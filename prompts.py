@@ -0,0 +1,59 @@
+from typing import Optional
+
+# Every prompt is a static prefix, identical across requests so that prompt
+# caches can reuse it, followed by the variable suffix from request_prompt().
+
+_COMMAND_RULES = """Rules:
+- Commands run in sequence in the given working directory. Do not use absolute paths unless requested.
+- Use the most efficient and safe command combination for the given operating system.
+- Process management: find and kill a process on port X with lsof -ti :X | xargs kill -9, find a process with lsof -i :X, kill a process with kill -9 PID.
+- File operations: find files with find . -name "filename", check contents with cat filename, append with echo "content" >> filename."""
+
+_RISK_RULE = """- Rate a command "high" risk if it can destroy data, affect the whole system or cannot be undone."""
+
+SINGLE_CALL_SYSTEM_PROMPT = f"""You convert natural language requests into terminal commands and rate the safety of each command.
+
+Return only a JSON object of the form:
+{{"commands": [{{"command": "<terminal command>", "risk": "low|medium|high", "reason": "<short reason>"}}], "confidence": <0.0 to 1.0>}}
+
+"confidence" is how sure you are that the commands do exactly what was asked.
+
+{_COMMAND_RULES}
+{_RISK_RULE}"""
+
+STREAMING_SYSTEM_PROMPT = f"""You convert natural language requests into terminal commands and rate the safety of each command.
+
+Return one JSON object per line, one line per command, in execution order, with no other text:
+{{"command": "<terminal command>", "risk": "low|medium|high", "reason": "<short reason>"}}
+
+{_COMMAND_RULES}
+{_RISK_RULE}"""
+
+INTERPRETER_BACKSTORY = """You are an expert at turning natural language into precise terminal commands for the user's operating system, breaking complex tasks into sequential commands."""
+
+VALIDATOR_BACKSTORY = """You are a security expert who checks terminal commands for safety and correctness before they run, so they cannot harm the system."""
+
+INTERPRETATION_TASK = f"""Convert the request at the end into terminal commands.
+Return only the commands, one per line, with no explanations or additional text.
+{_COMMAND_RULES}"""
+
+VALIDATION_TASK = """Validate the interpreted commands for the system described at the end.
+Return the commands one per line, with no explanations or additional text: unchanged if they are safe, otherwise safer alternatives.
+Check for dangerous operations, syntax, platform compatibility, working directory and command order.
+Before killing a process or changing a file, make sure the plan checks that it exists."""
+
+
+def request_prompt(
+    platform: str, cwd: str, environment: str = "", query: Optional[str] = None
+) -> str:
+    """
+    The variable suffix of a prompt, most stable lines first.
+
+    The query, when given, is always the last line, labelled "Command:".
+    """
+    lines = [f"Operating system: {platform}", f"Current Working Directory: {cwd}"]
+    if environment:
+        lines.append(environment)
+    if query is not None:
+        lines.append(f"Command: {query}")
+    return "\n".join(lines)
@@ -0,0 +1,302 @@
+import contextvars
+import os
+import shlex
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from command_policy import validate
+from config import (
+    COMMAND_TIMEOUT,
+    FLEET_CONCURRENCY,
+    FLEET_HOST_TIMEOUT,
+    MAX_OUTPUT_BYTES,
+    OUTPUT_HEAD_BYTES,
+    OUTPUT_INLINE_BYTES,
+    OUTPUT_TAIL_BYTES,
+    SSH_CONNECT_TIMEOUT,
+    SSH_CONTROL_PERSIST,
+    SSH_OPTIONS,
+)
+from history_store import HistoryStore, get_history_store
+from output_store import BlobWriter, get_blob_store
+from process_runner import ProcessResult, run_process
+from tracing import span
+
+LOCAL_PREFIX = "local"
+SSH_CONNECTION_FAILED = 255  # ssh's exit status when it could not connect
+
+OnOutput = Callable[[str, bytes], None]  # Receives (stream name, chunk) as output arrives
+
+
+class Transport(ABC):
+    """Runs shell command lines on one host."""
+
+    # Whether a result's CPU time and peak RSS are those of the command itself
+    measures_usage = True
+
+    def __init__(self, host: str, cwd: Optional[str] = None):
+        self.host = host
+        self.cwd = cwd
+
+    @abstractmethod
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float],
+        on_output: Optional[OnOutput] = None,
+    ) -> ProcessResult:
+        """
+        Run a command line and return its result, stopping it after timeout seconds.
+
+        on_output, if given, receives each chunk of output as it arrives.
+        """
+
+    def is_connection_error(self, result: ProcessResult) -> bool:
+        """Whether a failed result means the host itself could not be reached."""
+        return False
+
+    def _limits(self, timeout: Optional[float], on_output: Optional[OnOutput]) -> Dict:
+        return dict(
+            on_output=on_output,
+            timeout=timeout,
+            max_output_bytes=MAX_OUTPUT_BYTES,
+            head_bytes=OUTPUT_HEAD_BYTES,
+            tail_bytes=OUTPUT_TAIL_BYTES,
+        )
+
+
+class LocalTransport(Transport):
+    """
+    Stand-in for a remote host that runs commands on this machine.
+
+    Hosts named "local" or "local:<directory>" use it, so fleet runs can be
+    tried and tested without sshd. Each command runs through /bin/sh in the
+    given directory, the same way sshd hands it to the remote shell.
+    """
+
+    def run(
+        self, command: str, timeout: Optional[float], on_output: Optional[OnOutput] = None
+    ) -> ProcessResult:
+        return run_process(
+            command, cwd=self.cwd or os.getcwd(), **self._limits(timeout, on_output)
+        )
+
+
+def _remote_path(path: str) -> str:
+    """Quote a path for the remote shell, leaving a leading ~ for it to expand."""
+    if path == "~":
+        return path
+    if path.startswith("~/"):
+        return "~/" + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+
+class SSHTransport(Transport):
+    """
+    Runs commands over OpenSSH with connection multiplexing.
+
+    The first command to a host starts a ControlMaster connection. Later
+    commands, including those from later swat runs within
+    SSH_CONTROL_PERSIST seconds, open a channel on it instead of paying for
+    a new TCP and key exchange handshake.
+    """
+
+    measures_usage = False  # rusage is the local ssh client's, not the remote command's
+
+    def __init__(self, host: str, cwd: Optional[str] = None, options: str = SSH_OPTIONS):
+        super().__init__(host, cwd)
+        user = os.getuid() if hasattr(os, "getuid") else os.getenv("USERNAME", "user")
+        control_dir = os.path.join(tempfile.gettempdir(), f"swat-ssh-{user}")
+        os.makedirs(control_dir, mode=0o700, exist_ok=True)
+        self.base_argv = [
+            "ssh",
+            "-o", "BatchMode=yes",
+            "-o", f"ConnectTimeout={SSH_CONNECT_TIMEOUT}",
+            "-o", "ControlMaster=auto",
+            # %C is a hash of the connection, short enough for a socket path
+            "-o", f"ControlPath={os.path.join(control_dir, '%C')}",
+            "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+            *shlex.split(options),
+        ]
+
+    def argv(self, command: str) -> List[str]:
+        if self.cwd:
+            # On its own line, so a failed cd stops every part of a list such as "a; b"
+            command = f"cd {_remote_path(self.cwd)} || exit 1\n{command}"
+        return [*self.base_argv, "--", self.host, command]
+
+    def run(
+        self, command: str, timeout: Optional[float], on_output: Optional[OnOutput] = None
+    ) -> ProcessResult:
+        return run_process(
+            self.argv(command), cwd=os.getcwd(), **self._limits(timeout, on_output)
+        )
+
+    def is_connection_error(self, result: ProcessResult) -> bool:
+        return result.returncode == SSH_CONNECTION_FAILED
+
+
+def transport_for(host: str, cwd: Optional[str] = None) -> Transport:
+    """SSH transport for a host, or the local stand-in for "local[:directory]"."""
+    if host == LOCAL_PREFIX or host.startswith(LOCAL_PREFIX + ":"):
+        directory = host[len(LOCAL_PREFIX) + 1:] or None
+        return LocalTransport(host, directory or cwd)
+    return SSHTransport(host, cwd)
+
+
+def read_hosts(lines: Sequence[str]) -> List[str]:
+    """Host names from a hosts file, skipping blank lines and comments."""
+    hosts = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            hosts.append(line)
+    return hosts
+
+
+class FleetExecutor:
+    """
+    Run one validated plan on many hosts concurrently.
+
+    Each host runs the plan's commands in order and stops at its first
+    failure, as a local plan does. At most ``concurrency`` hosts run at
+    once, and each host's plan must finish within ``host_timeout`` seconds.
+
+    Args:
+        hosts: SSH destinations (anything ssh accepts, including aliases
+            from ~/.ssh/config) or "local[:directory]"
+        cwd: Directory to run commands in on every host (default: the
+            login directory)
+        concurrency: Maximum hosts running at the same time
+        host_timeout: Seconds allowed for each host's whole plan
+        history_store: Where each step is recorded, with its host. Large
+            output is kept as a preview plus a blob id, as for local runs
+    """
+
+    def __init__(
+        self,
+        hosts: Sequence[str],
+        cwd: Optional[str] = None,
+        concurrency: int = FLEET_CONCURRENCY,
+        host_timeout: float = FLEET_HOST_TIMEOUT,
+        history_store: Optional[HistoryStore] = None,
+    ):
+        self.hosts = list(dict.fromkeys(hosts))  # Drop duplicates, keep order
+        self.cwd = cwd
+        self.concurrency = max(1, concurrency)
+        self.host_timeout = host_timeout
+        self.history_store = history_store or get_history_store()
+        self.blob_store = get_blob_store()  # Full copies of large outputs
+
+    def run(self, commands: List[str]) -> List[Dict]:
+        """
+        Validate the plan once, then run it on every host.
+
+        Raises:
+            ValueError: If any command fails validation; nothing is run then
+
+        Returns:
+            One result per host, in host order, with its step results
+        """
+        for command in commands:
+            is_valid, message = validate(command)
+            if not is_valid:
+                raise ValueError(f"Invalid command '{command}': {message}")
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.hosts) or 1)) as pool:
+            futures = [
+                # Copy the context so each host's spans land in the active trace
+                pool.submit(contextvars.copy_context().run, self._run_host, host, commands)
+                for host in self.hosts
+            ]
+            return [future.result() for future in futures]
+
+    def _run_host(self, host: str, commands: List[str]) -> Dict:
+        transport = transport_for(host, self.cwd)
+        started = time.monotonic()
+        deadline = started + self.host_timeout
+        steps: List[Dict] = []
+        error = None
+
+        with span("fleet.host", host=host):
+            for command in commands:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    error = f"Host timed out after {self.host_timeout:g}s"
+                    break
+                timeout = min(remaining, COMMAND_TIMEOUT) if COMMAND_TIMEOUT else remaining
+                blob = self.blob_store.writer() if self.blob_store is not None else None
+                try:
+                    result = transport.run(
+                        command, timeout, blob.on_output if blob is not None else None
+                    )
+                except OSError as e:
+                    if blob is not None:
+                        blob.discard()
+                    error = f"Could not start command: {e}"
+                    break
+
+                step = self._step(host, command, result, transport, blob)
+                steps.append(step)
+                if not step["success"]:
+                    if transport.is_connection_error(result):
+                        error = f"Host unreachable: {result.stderr.strip()}"
+                    elif result.timed_out and time.monotonic() >= deadline:
+                        error = f"Host timed out after {self.host_timeout:g}s"
+                    break
+
+        completed = len(steps) == len(commands) and all(step["success"] for step in steps)
+        return {
+            "host": host,
+            "success": error is None and completed,
+            "results": steps,
+            "error": error,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+
+    def _step(
+        self,
+        host: str,
+        command: str,
+        result: ProcessResult,
+        transport: Transport,
+        blob: Optional[BlobWriter],
+    ) -> Dict:
+        if result.timed_out:
+            output = "Command timed out"
+        elif result.output_limit_exceeded:
+            output = f"Command output exceeded {MAX_OUTPUT_BYTES} bytes"
+        elif result.returncode != 0:
+            output = f"Command failed with error: {result.stderr}"
+        else:
+            output = result.stdout
+        success = not (result.timed_out or result.output_limit_exceeded or result.returncode)
+
+        timestamp = datetime.now().isoformat()
+        entry = {
+            "command": command,
+            "timestamp": timestamp,
+            "status": "success" if success else "error",
+            "working_directory": transport.cwd,
+            "host": host,
+            "usage": result.usage(),
+        }
+        if not transport.measures_usage:
+            entry["usage"].update(cpu_ms=None, max_rss_kb=None)
+        entry["output" if success else "error"] = output
+        step = {"command": command, "success": success, "output": output, "timestamp": timestamp}
+        blob_id = blob.commit() if blob is not None and success else None
+        if blob is not None and not success:
+            blob.discard()
+        if blob_id:
+            # History keeps a preview; the full output is in the blob
+            entry["output"] = output[:OUTPUT_INLINE_BYTES]
+            entry["output_blob"] = step["output_blob"] = blob_id
+            entry["output_bytes"] = blob.total
+        with span("history.save"):
+            self.history_store.append(entry)
+        return step
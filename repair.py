@@ -0,0 +1,338 @@
+import hashlib
+import json
+import re
+import shlex
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rich.console import Console
+
+from command_policy import parse_command
+from config import (
+    REPAIR_BACKEND,
+    REPAIR_FILE,
+    REPAIR_MAX_ATTEMPTS,
+    REPAIR_MAX_ERROR_CHARS,
+    REPAIR_MAX_FIXES,
+)
+from tracing import span
+
+console = Console()
+
+REPAIR_SYSTEM_PROMPT = """A step of a terminal command plan failed. Correct it.
+
+Return only a JSON object of the form:
+{"fix": ["<command>", ...], "rest": ["<command>", ...]}
+
+"fix" replaces the failed command. "rest" is the remaining plan, changed only where the fix requires it.
+Return {"fix": [], "rest": []} if the failure cannot be corrected with safe commands, for example when it needs elevated permissions.
+Never work around a permission error, a protected path or a missing confirmation."""
+
+# Lines that usually carry the reason a command failed
+_ERROR_LINE = re.compile(
+    r"error|not found|no such|denied|invalid|cannot|can't|failed|unknown|illegal|usage|missing",
+    re.IGNORECASE,
+)
+_QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"|‘[^’]*’|`[^`']*'")
+_PATH = re.compile(r"(?:~|\.{1,2})?/[\w./~-]*")
+_NUMBER = re.compile(r"\d+")
+_FAILED_PREFIX = "Command failed with error:"
+
+
+def _operand_regex(operand: str) -> "re.Pattern":
+    return re.compile(rf"(?<![\w.-]){re.escape(operand)}(?![\w.-])")
+
+
+def command_pattern(command: str) -> Tuple[str, List[str]]:
+    """
+    Generalize a command so that fixes carry over to other operands.
+
+    A single simple command whose words need no quoting becomes its name and
+    flags with numbered placeholders for the operands, so ``mkdir a/b`` and
+    ``mkdir c/d`` share the pattern ``mkdir {0}``. Anything else only matches
+    itself.
+
+    Returns:
+        The pattern and the operands that fill its placeholders
+    """
+    try:
+        parsed = parse_command(command)
+    except ValueError:
+        return command, []
+    if parsed.needs_shell or len(parsed.commands) != 1:
+        return command, []
+    simple = parsed.commands[0]
+    words = [word.text for word in simple.argv]
+    if simple.assignments or simple.redirects or any(shlex.quote(w) != w for w in words):
+        return command, []
+    if any("{" in w or "}" in w for w in words):
+        return command, []
+
+    operands: List[str] = []
+    pattern = [words[0]]
+    for word in words[1:]:
+        if word.startswith("-"):
+            pattern.append(word)
+        else:
+            if word not in operands:
+                operands.append(word)
+            pattern.append("{%d}" % operands.index(word))
+    return " ".join(pattern), operands
+
+
+def _generalize(text: str, operands: List[str]) -> str:
+    """Replace operands in text with their placeholders, escaping other braces."""
+    text = text.replace("{", "{{").replace("}", "}}")
+    # Longest first, so an operand that contains another is replaced whole
+    for index, operand in sorted(enumerate(operands), key=lambda item: -len(item[1])):
+        text = _operand_regex(operand).sub("{%d}" % index, text)
+    return text
+
+
+def error_signature(error: str, operands: List[str]) -> str:
+    """
+    Reduce an error message to what identifies the kind of failure.
+
+    The most telling line is kept, and the command's operands, quoted
+    strings, paths and numbers are replaced, so the same failure on other
+    files or ports has the same signature.
+    """
+    if error.startswith(_FAILED_PREFIX):
+        error = error[len(_FAILED_PREFIX):]
+    lines = [line.strip() for line in error.strip().splitlines() if line.strip()]
+    line = next((line for line in lines if _ERROR_LINE.search(line)), lines[-1] if lines else "")
+    line = _generalize(line, operands).replace("{{", "").replace("}}", "")
+    line = _QUOTED.sub("<str>", line)
+    line = _PATH.sub("<path>", line)
+    line = _NUMBER.sub("<n>", line)
+    return " ".join(line.lower().split())[:200]
+
+
+class FixTable:
+    """Persistent table of corrections keyed by command pattern and error signature."""
+
+    def __init__(self, path: Path = REPAIR_FILE, max_entries: int = REPAIR_MAX_FIXES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fixes (
+                key TEXT PRIMARY KEY,
+                platform TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                fix TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    @staticmethod
+    def _key(platform: str, pattern: str, signature: str) -> str:
+        return hashlib.sha256(f"{platform}\0{pattern}\0{signature}".encode()).hexdigest()
+
+    def _locate(self, platform: str, command: str, error: str) -> Tuple[str, List[str], str]:
+        pattern, operands = command_pattern(command)
+        key = self._key(platform, pattern, error_signature(error, operands))
+        return key, operands, pattern
+
+    def get(self, platform: str, command: str, error: str) -> Optional[List[str]]:
+        """Return the stored correction for this failure, filled in for this command."""
+        key, operands, _ = self._locate(platform, command, error)
+        with self._lock:
+            row = self._conn.execute("SELECT fix FROM fixes WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            self._conn.execute(
+                "UPDATE fixes SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key),
+            )
+        try:
+            return [template.format(*operands) for template in json.loads(row[0])]
+        except (IndexError, KeyError, ValueError):
+            return None
+
+    def put(self, platform: str, command: str, error: str, fix: List[str]):
+        """Store a correction that worked, evicting the least recently used entries."""
+        key, operands, pattern = self._locate(platform, command, error)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fixes "
+                "(key, platform, pattern, signature, fix, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    key,
+                    platform,
+                    pattern,
+                    error_signature(error, operands),
+                    json.dumps([_generalize(command, operands) for command in fix]),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM fixes WHERE key NOT IN "
+                "(SELECT key FROM fixes ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def discard(self, platform: str, command: str, error: str):
+        """Forget a correction that no longer works."""
+        key, _, _ = self._locate(platform, command, error)
+        with self._lock:
+            self._conn.execute("DELETE FROM fixes WHERE key = ?", (key,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fixes").fetchone()[0]
+
+
+def parse_repair(text: str) -> Tuple[List[str], List[str]]:
+    """Parse a repair response into the fix and the rest of the plan."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [], []
+    if not isinstance(data, dict):
+        return [], []
+
+    def commands(key: str) -> List[str]:
+        value = data.get(key)
+        if not isinstance(value, list):
+            return []
+        return [str(c).strip() for c in value if isinstance(c, str) and c.strip()]
+
+    return commands("fix"), commands("rest")
+
+
+class RepairLoop:
+    """
+    Corrects failed plan steps with a bounded number of attempts per query.
+
+    A failure is first looked up in the fix table, and only sent to the
+    LLM, in one small JSON call, when no correction is known. Corrections
+    are run through normal validation by the executor. Call begin() before
+    each query and learn() with its results afterwards, so corrections that
+    worked are stored and known ones that failed are dropped.
+
+    Args:
+        platform: Operating system name used in prompts and fix table keys
+        cwd: Returns the current working directory for prompts
+        fix_table: Learned corrections, or None to always ask the LLM
+        max_attempts: Repairs allowed per query
+    """
+
+    def __init__(
+        self,
+        platform: str,
+        cwd: Callable[[], str],
+        fix_table: Optional[FixTable] = None,
+        max_attempts: int = REPAIR_MAX_ATTEMPTS,
+    ):
+        self.platform = platform
+        self.cwd = cwd
+        self.fix_table = fix_table
+        self.max_attempts = max_attempts
+        self.llm = None  # Created on first use
+        self.last_usage: Dict[str, int] = {}
+        self.begin()
+
+    def begin(self):
+        """Reset the attempt budget for a new query."""
+        self.attempts = 0
+        # (failed command, error, fix, came from the fix table)
+        self._pending: List[Tuple[str, str, List[str], bool]] = []
+
+    def __call__(self, failed: Dict, remaining: List[str]) -> Optional[List[str]]:
+        """
+        Correct a failed step.
+
+        Args:
+            failed: Result of the failed step
+            remaining: Commands of the plan that have not run yet
+
+        Returns:
+            Commands to run instead of the failed step and the rest of the
+            plan, or None to stop as before
+        """
+        command, error = failed["command"], failed["output"]
+        if self.attempts >= self.max_attempts or not error.startswith(_FAILED_PREFIX):
+            return None  # Timeouts, output limits and rejected commands are not repaired
+        self.attempts += 1
+
+        if self.fix_table is not None:
+            with span("repair.lookup") as lookup_span:
+                fix = self.fix_table.get(self.platform, command, error)
+                if lookup_span:
+                    lookup_span.attributes["cache_hit"] = fix is not None
+            if fix:
+                console.print(f"[dim]Applying learned fix for: {command}[/dim]")
+                self._pending.append((command, error, fix, True))
+                return fix + remaining
+
+        fix, rest = self._ask(command, error, remaining)
+        if not fix:
+            return None
+        console.print(f"[yellow]Retrying with: {' && '.join(fix)}[/yellow]")
+        self._pending.append((command, error, fix, False))
+        return fix + rest
+
+    def _ask(self, command: str, error: str, remaining: List[str]) -> Tuple[List[str], List[str]]:
+        if self.llm is None:
+            from llm_backends import get_client
+
+            self.llm = get_client(REPAIR_BACKEND)
+
+        remaining_text = "\n".join(remaining) if remaining else "(none)"
+        with span("llm.repair", model=self.llm.model) as llm_span:
+            try:
+                result = self.llm.complete(
+                    [
+                        {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+                        {
+                            "role": "user",
+                            "content": f"Operating system: {self.platform}\n"
+                            f"Current Working Directory: {self.cwd()}\n"
+                            f"Failed command: {command}\n"
+                            f"Error: {error[-REPAIR_MAX_ERROR_CHARS:]}\n"
+                            f"Remaining plan:\n{remaining_text}",
+                        },
+                    ],
+                    json_mode=True,
+                )
+            except Exception as e:
+                console.print(f"[red]Could not repair '{command}': {str(e)}[/red]")
+                return [], []
+            self.last_usage = {
+                "prompt_tokens": result.prompt_tokens,
+                "completion_tokens": result.completion_tokens,
+                "cached_tokens": result.cached_tokens,
+            }
+            if llm_span:
+                llm_span.attributes.update(self.last_usage)
+        return parse_repair(result.text)
+
+    def learn(self, results: List[Dict]):
+        """Store corrections whose commands all succeeded and drop known ones that failed."""
+        if self.fix_table is None:
+            self._pending = []
+            return
+        succeeded = {r["command"] for r in results if r["success"]}
+        for command, error, fix, known in self._pending:
+            if all(c in succeeded for c in fix):
+                if not known:
+                    self.fix_table.put(self.platform, command, error, fix)
+            elif known:
+                self.fix_table.discard(self.platform, command, error)
+        self._pending = []
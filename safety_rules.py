@@ -0,0 +1,64 @@
+import re
+from typing import Optional, Tuple
+
+RISK_LEVELS = ("low", "medium", "high")
+
+# Patterns matched anywhere in a command string, including after pipes and chains
+_TARGET_END = r"(?=\s|$|;|&|\|)"
+DANGEROUS_PATTERNS = [
+    (
+        r"\brm\s+(?:-\S+\s+)*(?:/|/\*|~/?|~/\*|\$HOME/?|\.\./?|\*|\.)(?:\s|$|;|&|\|)",
+        "Recursive delete of a root, home or parent directory",
+    ),
+    (r"\brm\s+(?:-\S+\s+)*--no-preserve-root\b", "rm with --no-preserve-root"),
+    (r"\bmkfs(?:\.\w+)?\b", "Formatting a filesystem"),
+    (r"\bdd\b.*\bof=/dev/", "Writing directly to a block device"),
+    (r">\s*/dev/(?:sd|hd|nvme|disk|mmcblk)", "Redirecting output onto a block device"),
+    (r":\s*\(\s*\)\s*\{.*:\s*\|\s*:", "Fork bomb"),
+    (
+        rf"\bch(?:mod|own)\s+(?:-\S+\s+)*-R\s+(?:\S+\s+)?/{_TARGET_END}",
+        "Recursive permission change on /",
+    ),
+    (rf"\bchmod\s+(?:-\S+\s+)*0?777\s+/{_TARGET_END}", "World-writable root directory"),
+    (r"\b(?:curl|wget)\b[^|]*\|\s*(?:sudo\s+)?(?:ba|z|k|da)?sh\b", "Piping a download into a shell"),
+    (rf"\bkill\s+(?:-\S+\s+)*(?:-1|1){_TARGET_END}", "Killing init or every process"),
+    (r">\s*/etc/", "Overwriting system configuration in /etc"),
+    (r"\bfind\s+/\s.*-(?:delete|exec\s+rm)\b", "Deleting files across the whole filesystem"),
+]
+_COMPILED = [(re.compile(pattern), reason) for pattern, reason in DANGEROUS_PATTERNS]
+
+# Programs refused as a command word, wherever they appear in a command line.
+# Matched on the parsed command name, so "grep sudo auth.log" is not affected.
+DANGEROUS_COMMANDS = {
+    "sudo": "Privilege escalation with sudo",
+    "shutdown": "Shutting down or rebooting the host",
+    "reboot": "Shutting down or rebooting the host",
+    "halt": "Shutting down or rebooting the host",
+    "poweroff": "Shutting down or rebooting the host",
+}
+
+
+def check_command(command: str) -> Tuple[bool, str]:
+    """Check a command against the local dangerous-pattern rules."""
+    for pattern, reason in _COMPILED:
+        if pattern.search(command):
+            return False, f"Blocked by safety rule: {reason}"
+    return True, "Command passed safety rules"
+
+
+def check_command_name(name: str) -> Tuple[bool, str]:
+    """Check the program a simple command runs, e.g. "sudo" or "/sbin/reboot"."""
+    reason = DANGEROUS_COMMANDS.get(name.rsplit("/", 1)[-1].lower())
+    if reason:
+        return False, f"Blocked by safety rule: {reason}"
+    return True, "Command passed safety rules"
+
+
+def check_annotation(risk: Optional[str], reason: Optional[str] = None) -> Tuple[bool, str]:
+    """Reject commands the model itself marked as high risk."""
+    risk = (risk or "low").lower()
+    if risk not in RISK_LEVELS:
+        return False, f"Unknown risk level '{risk}'"
+    if risk == "high":
+        return False, f"Model flagged command as high risk: {reason or 'no reason given'}"
+    return True, f"Model rated command {risk} risk"
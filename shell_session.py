@@ -0,0 +1,215 @@
+import os
+import re
+import secrets
+import selectors
+import shlex
+import subprocess
+import time
+from typing import Callable, Optional
+
+from process_runner import (
+    READ_CHUNK_BYTES,
+    HeadTailBuffer,
+    ProcessResult,
+    limit_command,
+    terminate_process_group,
+)
+
+
+class _FramedStream:
+    """
+    Split one of the shell's output streams at the end-of-command sentinel.
+
+    Bytes before the sentinel belong to the running command. A few trailing
+    bytes are held back until it is clear they are not the start of the
+    sentinel.
+    """
+
+    def __init__(self, name: str, sentinel: bytes, buffer: HeadTailBuffer, on_output):
+        self.name = name
+        self.sentinel = sentinel
+        self.buffer = buffer
+        self.on_output = on_output
+        self.pending = bytearray()
+        self.trailer: Optional[bytes] = None  # Bytes after the sentinel, once seen
+
+    @property
+    def done(self) -> bool:
+        return self.trailer is not None and b"\n" in self.trailer
+
+    def feed(self, chunk: bytes):
+        if self.trailer is not None:
+            self.trailer += chunk
+            return
+        self.pending += chunk
+        index = self.pending.find(self.sentinel)
+        if index >= 0:
+            self._emit(bytes(self.pending[:index]))
+            self.trailer = bytes(self.pending[index + len(self.sentinel):])
+            self.pending.clear()
+            return
+        keep = len(self.sentinel) - 1
+        if len(self.pending) > keep:
+            self._emit(bytes(self.pending[: len(self.pending) - keep]))
+            del self.pending[: len(self.pending) - keep]
+
+    def flush(self):
+        """Emit held-back bytes when the shell exits without a sentinel."""
+        if self.pending:
+            self._emit(bytes(self.pending))
+            self.pending.clear()
+
+    def _emit(self, data: bytes):
+        if data:
+            self.buffer.write(data)
+            if self.on_output:
+                self.on_output(self.name, data)
+
+
+class ShellSession:
+    """
+    One long-lived /bin/sh that runs a plan's commands in turn.
+
+    Commands are written to the shell's stdin and evaluated in the shell
+    itself, so shell state carries over to later commands. The command
+    policy refuses ``export`` and variable assignments, so in practice that
+    is the working directory set by ``cd``. After each command the shell
+    prints a per-session sentinel, its exit status and its working directory
+    on stdout and the sentinel on stderr. That marks where the command's
+    output ends.
+
+    A timeout, output limit or syntax error ends the session. The next
+    command starts a fresh shell in the last known working directory.
+
+    Resource limits are set on the shell and so apply to every process it
+    starts. Only wall time is measured per command: CPU time and peak RSS
+    need the command's own process, which the shell reaps.
+    """
+
+    def __init__(self, cwd: str, cpu_limit: int = 0, memory_limit_mb: int = 0):
+        self.cwd = cwd
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.proc: Optional[subprocess.Popen] = None
+        self._sentinel = f"__SWAT_{secrets.token_hex(8)}__"
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            limit_command(["/bin/sh"], self.cpu_limit, self.memory_limit_mb),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True,  # Own process group for clean termination
+        )
+
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float],
+        max_output_bytes: int,
+        head_bytes: int,
+        tail_bytes: int,
+        on_output: Optional[Callable[[str, bytes], None]] = None,
+    ) -> ProcessResult:
+        """
+        Run a command in the session, with the same limits as run_process.
+
+        Returns:
+            ProcessResult with the retained head and tail of each stream
+        """
+        started = time.monotonic()
+        if not self.alive:
+            self._start()
+        sentinel = self._sentinel.encode()
+        buffers = {
+            "stdout": HeadTailBuffer(head_bytes, tail_bytes),
+            "stderr": HeadTailBuffer(head_bytes, tail_bytes),
+        }
+        streams = {
+            self.proc.stdout: _FramedStream("stdout", sentinel, buffers["stdout"], on_output),
+            self.proc.stderr: _FramedStream("stderr", sentinel, buffers["stderr"], on_output),
+        }
+        script = (
+            f"eval {shlex.quote(command)} </dev/null\n"
+            f'printf \'{self._sentinel}%d %s\\n\' "$?" "$PWD"\n'
+            f"printf '{self._sentinel}\\n' >&2\n"
+        )
+        try:
+            self.proc.stdin.write(script.encode())
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            pass  # The shell has exited; reported below as a failure
+
+        deadline = time.monotonic() + timeout if timeout else None
+        timed_out = limit_exceeded = False
+        with selectors.DefaultSelector() as selector:
+            for pipe in streams:
+                selector.register(pipe, selectors.EVENT_READ)
+            while not all(stream.done for stream in streams.values()):
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
+                    break
+                events = selector.select(remaining)
+                eof = False
+                for key, _ in events:
+                    chunk = os.read(key.fd, READ_CHUNK_BYTES)
+                    if not chunk:
+                        eof = True
+                        selector.unregister(key.fileobj)
+                        continue
+                    streams[key.fileobj].feed(chunk)
+                if eof and not selector.get_map():
+                    break  # The shell exited mid-command
+                total = buffers["stdout"].total + buffers["stderr"].total
+                if max_output_bytes and total > max_output_bytes:
+                    limit_exceeded = True
+                    break
+
+        stdout_frame = streams[self.proc.stdout]
+        if stdout_frame.done and not (timed_out or limit_exceeded):
+            status, _, cwd = stdout_frame.trailer.decode(errors="replace").partition("\n")[0].partition(" ")
+            returncode = int(status) if re.fullmatch(r"\d+", status) else 1
+            if cwd:
+                self.cwd = cwd
+        else:
+            for stream in streams.values():
+                stream.flush()
+            self.close()
+            returncode = self.proc.returncode
+
+        return ProcessResult(
+            returncode=returncode,
+            stdout=buffers["stdout"].getvalue(),
+            stderr=buffers["stderr"].getvalue(),
+            timed_out=timed_out,
+            output_limit_exceeded=limit_exceeded,
+            wall_ms=(time.monotonic() - started) * 1000,
+        )
+
+    def close(self):
+        """Stop the shell and anything still running in it."""
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            terminate_process_group(self.proc, grace=0.5)
+        for pipe in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
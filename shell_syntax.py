@@ -0,0 +1,346 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Characters that end an unquoted word
+_WORD_BREAK = set(" \t\n;&|()<>")
+_REDIRECT = re.compile(r"(\d*)(>>|>&|>\||<&|<<<|<<|<>|>|<)")
+_ASSIGNMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=")
+_PARAMETER = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*|.)", re.DOTALL)
+_BRACE_EXPANSION = re.compile(r"\{[^}\s]*(?:,|\.\.)[^}\s]*\}")
+_SPECIAL_PARAMS = set("@*#?$!-0123456789")
+
+
+class ShellSyntaxError(ValueError):
+    """Raised when a command line cannot be parsed as supported shell syntax."""
+
+
+@dataclass
+class Word:
+    """A shell word with quotes removed and expansions left as written."""
+
+    text: str
+    has_expansion: bool = False  # $VAR, ${...}, $(...), `...`, $((...)), ~
+    has_glob: bool = False  # Unquoted *, ?, [ or brace expansion
+    quoted: bool = False
+
+
+@dataclass
+class Redirect:
+    """An I/O redirection such as ``2>&1`` or ``>> file``."""
+
+    op: str
+    fd: Optional[int]
+    target: Word
+
+
+@dataclass
+class SimpleCommand:
+    """One command name with its arguments, assignments and redirections."""
+
+    assignments: List[Word] = field(default_factory=list)
+    argv: List[Word] = field(default_factory=list)
+    redirects: List[Redirect] = field(default_factory=list)
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.argv[0].text if self.argv else None
+
+    def is_empty(self) -> bool:
+        return not (self.assignments or self.argv or self.redirects)
+
+
+@dataclass
+class ParsedCommand:
+    """
+    Every simple command in a command line, in source order.
+
+    Commands nested in ``$(...)`` or backticks are included alongside the
+    commands of the top-level pipelines and lists.
+    """
+
+    commands: List[SimpleCommand]
+    operators: List[str]
+    substitutions: int = 0
+    subshells: int = 0
+
+    @property
+    def needs_shell(self) -> bool:
+        """Whether running this line requires /bin/sh rather than a plain exec."""
+        if self.operators or self.substitutions or self.subshells or len(self.commands) != 1:
+            return True
+        command = self.commands[0]
+        return bool(
+            command.assignments
+            or command.redirects
+            or any(word.has_expansion or word.has_glob for word in command.argv)
+        )
+
+
+class _Parser:
+    def __init__(self, src: str):
+        self.src = src
+        self.pos = 0
+        self.commands: List[SimpleCommand] = []
+        self.operators: List[str] = []
+        self.substitutions = 0
+        self.subshells = 0
+
+    def error(self, message: str) -> ShellSyntaxError:
+        return ShellSyntaxError(f"{message} at position {self.pos}")
+
+    def peek(self, text: str) -> bool:
+        return self.src.startswith(text, self.pos)
+
+    def parse_list(self, terminator: Optional[str] = None):
+        """Parse commands and control operators until the end or a terminator."""
+        current = SimpleCommand()
+        pending_operator: Optional[str] = None
+
+        def finish(operator: str):
+            nonlocal current, pending_operator
+            if current.is_empty() and operator != ";":
+                raise self.error(f"Missing command before '{operator}'")
+            self.commands.append(current)
+            self.operators.append(operator)
+            pending_operator = operator
+            current = SimpleCommand()
+
+        n = len(self.src)
+        while self.pos < n:
+            c = self.src[self.pos]
+            if c in " \t":
+                self.pos += 1
+            elif c == "#" and (self.pos == 0 or self.src[self.pos - 1] in " \t\n;&|("):
+                end = self.src.find("\n", self.pos)
+                self.pos = n if end == -1 else end
+            elif c == "\n" or c == ";":
+                if self.peek(";;"):
+                    raise self.error("Unsupported ';;'")
+                if c == ";" and current.is_empty():
+                    raise self.error("Missing command before ';'")
+                self.pos += 1
+                if not current.is_empty():
+                    finish(";")
+            elif self.peek("&&") or self.peek("||") or self.peek("|&"):
+                op = self.src[self.pos:self.pos + 2]
+                self.pos += 2
+                finish(op)
+            elif c == "|":
+                self.pos += 1
+                finish("|")
+            elif self.peek("&>"):
+                self._redirect(current, fd=None, op="&>", length=2)
+            elif c == "&":
+                self.pos += 1
+                finish("&")
+            elif c == "(":
+                if not current.is_empty():
+                    raise self.error("Unexpected '('")
+                self.pos += 1
+                self.subshells += 1
+                self.parse_list(terminator=")")
+            elif c == ")":
+                if terminator != ")":
+                    raise self.error("Unexpected ')'")
+                if current.is_empty() and pending_operator in ("|", "||", "&&", "|&"):
+                    raise self.error(f"Missing command after '{pending_operator}'")
+                if not current.is_empty():
+                    self.commands.append(current)
+                self.pos += 1
+                return
+            else:
+                m = _REDIRECT.match(self.src, self.pos)
+                if m and (m.group(1) == "" or m.end(1) > self.pos):
+                    if m.group(2) == "<<":
+                        raise self.error("Here-documents are not supported")
+                    fd = int(m.group(1)) if m.group(1) else None
+                    self._redirect(current, fd=fd, op=m.group(2), length=m.end() - self.pos)
+                    continue
+                word = self._word()
+                if not current.argv and not word.quoted and _ASSIGNMENT.match(word.text):
+                    current.assignments.append(word)
+                else:
+                    current.argv.append(word)
+
+        if terminator:
+            raise self.error(f"Missing '{terminator}'")
+        if current.is_empty() and pending_operator in ("|", "||", "&&", "|&"):
+            raise self.error(f"Missing command after '{pending_operator}'")
+        if not current.is_empty():
+            self.commands.append(current)
+
+    def _redirect(self, current: SimpleCommand, fd: Optional[int], op: str, length: int):
+        self.pos += length
+        while self.pos < len(self.src) and self.src[self.pos] in " \t":
+            self.pos += 1
+        if self.pos >= len(self.src) or self.src[self.pos] in _WORD_BREAK:
+            raise self.error(f"Missing target for '{op}'")
+        current.redirects.append(Redirect(op=op, fd=fd, target=self._word()))
+
+    def _word(self) -> Word:
+        word = Word(text="")
+        buf: List[str] = []
+        start = self.pos
+        n = len(self.src)
+        while self.pos < n:
+            c = self.src[self.pos]
+            if c in _WORD_BREAK:
+                break
+            if c == "\\":
+                self.pos += 1
+                if self.pos < n and self.src[self.pos] != "\n":
+                    buf.append(self.src[self.pos])
+                    word.quoted = True
+                self.pos += 1
+            elif c == "'":
+                end = self.src.find("'", self.pos + 1)
+                if end == -1:
+                    raise self.error("Unterminated single quote")
+                buf.append(self.src[self.pos + 1:end])
+                word.quoted = True
+                self.pos = end + 1
+            elif c == '"':
+                self._double_quoted(word, buf)
+            elif c == "$":
+                self._dollar(word, buf)
+            elif c == "`":
+                self._backtick(word, buf)
+            elif c in "*?[":
+                word.has_glob = True
+                buf.append(c)
+                self.pos += 1
+            elif c == "{" and _BRACE_EXPANSION.match(self.src, self.pos):
+                word.has_glob = True  # Brace expansion in bash-like shells
+                buf.append(c)
+                self.pos += 1
+            elif c == "~" and self.pos == start:
+                word.has_expansion = True
+                buf.append(c)
+                self.pos += 1
+            else:
+                buf.append(c)
+                self.pos += 1
+        word.text = "".join(buf)
+        return word
+
+    def _double_quoted(self, word: Word, buf: List[str]):
+        word.quoted = True
+        self.pos += 1
+        n = len(self.src)
+        while self.pos < n:
+            c = self.src[self.pos]
+            if c == '"':
+                self.pos += 1
+                return
+            if c == "\\" and self.pos + 1 < n and self.src[self.pos + 1] in '$`"\\\n':
+                if self.src[self.pos + 1] != "\n":
+                    buf.append(self.src[self.pos + 1])
+                self.pos += 2
+            elif c == "$":
+                self._dollar(word, buf)
+            elif c == "`":
+                self._backtick(word, buf)
+            else:
+                buf.append(c)
+                self.pos += 1
+        raise self.error("Unterminated double quote")
+
+    def _dollar(self, word: Word, buf: List[str]):
+        start = self.pos
+        if self.peek("$(("):
+            self.pos += 3
+            self._expansion_body(")", "arithmetic expansion")
+            if not self.peek(")"):
+                raise self.error("Unterminated arithmetic expansion")
+            self.pos += 1
+        elif self.peek("$("):
+            self.pos += 2
+            self.substitutions += 1
+            self.parse_list(terminator=")")
+        elif self.peek("${"):
+            self.pos += 2
+            self._expansion_body("}", "parameter expansion")
+        else:
+            m = _PARAMETER.match(self.src, self.pos)
+            name = m.group(0)[1:] if m else ""
+            if not name or not (name[0].isalpha() or name[0] == "_" or name in _SPECIAL_PARAMS):
+                buf.append("$")  # A lone '$' is literal
+                self.pos += 1
+                return
+            self.pos = m.end()
+        word.has_expansion = True
+        buf.append(self.src[start:self.pos])
+
+    def _expansion_body(self, closer: str, what: str):
+        """
+        Skip to the closer of ${...} or $((...)), past nested parentheses.
+
+        Command substitutions inside, such as ``${x:-$(cmd)}``, are parsed like
+        any other, so their commands are checked too.
+        """
+        inner, inner_buf = Word(text=""), []
+        depth = 0
+        n = len(self.src)
+        while self.pos < n:
+            c = self.src[self.pos]
+            if c == "\\":
+                self.pos += 2
+            elif c == "'":
+                end = self.src.find("'", self.pos + 1)
+                if end == -1:
+                    raise self.error("Unterminated single quote")
+                self.pos = end + 1
+            elif c == '"':
+                self._double_quoted(inner, inner_buf)
+            elif c == "$":
+                self._dollar(inner, inner_buf)
+            elif c == "`":
+                self._backtick(inner, inner_buf)
+            elif c == "(" and closer == ")":
+                depth += 1
+                self.pos += 1
+            elif c == closer:
+                self.pos += 1
+                if depth == 0:
+                    return
+                depth -= 1
+            else:
+                self.pos += 1
+        raise self.error(f"Unterminated {what}")
+
+    def _backtick(self, word: Word, buf: List[str]):
+        start = self.pos
+        end = self.pos + 1
+        while end < len(self.src) and self.src[end] != "`":
+            end += 2 if self.src[end] == "\\" else 1
+        if end >= len(self.src):
+            raise self.error("Unterminated backquote")
+        inner = _Parser(self.src[start + 1:end].replace("\\`", "`"))
+        inner.parse_list()
+        self.commands.extend(inner.commands)
+        self.operators.extend(inner.operators)
+        self.substitutions += 1 + inner.substitutions
+        self.subshells += inner.subshells
+        self.pos = end + 1
+        word.has_expansion = True
+        buf.append(self.src[start:self.pos])
+
+
+def parse(command: str) -> ParsedCommand:
+    """
+    Parse a command line written in the POSIX sh subset the agents produce.
+
+    Supports pipelines, ``;``/``&&``/``||``/``&`` lists, subshells, quoting,
+    parameter expansion, command substitution and redirections. Compound
+    commands (``if``, ``for``...) parse as ordinary command names and are left
+    to the policy to reject; here-documents raise ShellSyntaxError.
+    """
+    parser = _Parser(command)
+    parser.parse_list()
+    return ParsedCommand(
+        commands=parser.commands,
+        operators=parser.operators,
+        substitutions=parser.substitutions,
+        subshells=parser.subshells,
+    )
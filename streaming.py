@@ -0,0 +1,121 @@
+import json
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from command_executor import MultiCommandExecutor
+from safety_rules import check_annotation
+
+
+class LineAssembler:
+    """Collect streamed text chunks into complete lines."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add a chunk and return any lines it completed."""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        return lines
+
+    def flush(self) -> List[str]:
+        """Return the trailing partial line, if any, once the stream ends."""
+        rest, self._buffer = self._buffer, ""
+        return [rest] if rest.strip() else []
+
+
+def parse_plan_line(line: str) -> Optional[Dict]:
+    """Parse one streamed plan line into a command dict with a risk annotation."""
+    line = line.strip()
+    if not line or line.startswith("```"):
+        return None
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError:
+        item = None
+    if isinstance(item, dict) and str(item.get("command", "")).strip():
+        return {
+            "command": str(item["command"]).strip(),
+            "risk": item.get("risk", "medium"),
+            "reason": item.get("reason", ""),
+        }
+    command = line.strip("\"'")
+    return {"command": command, "risk": "medium", "reason": "unannotated"} if command else None
+
+
+class StreamingPlanRunner:
+    """
+    Validate plan lines as they stream in and optionally run them right away.
+
+    With early execution, each command that passes local validation is handed
+    to a worker thread immediately, so the first command starts while the
+    model is still generating the rest of the plan. Commands still run one at
+    a time, in order, and the plan stops at the first failure.
+    """
+
+    def __init__(self, executor: MultiCommandExecutor, early_execution: bool = False):
+        self.executor = executor
+        self.early_execution = early_execution
+        self.commands: List[str] = []
+        self.results: List[Dict] = []
+        self.rejection: Optional[Dict] = None
+        self._failed = threading.Event()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        if early_execution:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command is None or self._failed.is_set():
+                return
+            result = self.executor.execute_step(command)
+            self.results.append(result)
+            if not result["success"]:
+                self._failed.set()
+
+    def submit_line(self, line: str) -> bool:
+        """
+        Accept one complete line of model output.
+
+        Returns:
+            False once the plan must stop: a line was rejected or, with early
+            execution, a command already failed
+        """
+        item = parse_plan_line(line)
+        if item is None:
+            return not self._failed.is_set()
+
+        command = item["command"]
+        is_safe, message = check_annotation(item["risk"], item["reason"])
+        if is_safe:
+            is_safe, message = self.executor.validate_command(command)
+        if not is_safe:
+            self.rejection = {"command": command, "message": message}
+            return False
+
+        self.commands.append(command)
+        if self.early_execution:
+            self._queue.put(command)
+        return not self._failed.is_set()
+
+    def finish(self) -> List[Dict]:
+        """Wait for queued commands and return the execution results."""
+        if self.early_execution:
+            self._queue.put(None)
+            self._worker.join()
+            if self.rejection and not self._failed.is_set():
+                self.results.append(
+                    {
+                        "command": self.rejection["command"],
+                        "success": False,
+                        "output": f"Invalid command: {self.rejection['message']}",
+                        "timestamp": datetime.now().isoformat(),
+                    }
+                )
+        self.executor.command_results = self.results
+        return self.results
@@ -0,0 +1,58 @@
+"""
+Thin client for the swat daemon.
+
+Uses only the standard library so it starts in milliseconds. Exits with
+status 75 when no daemon is reachable, which tells the swat script to fall
+back to running main.py in-process.
+"""
+import json
+import os
+import shutil
+import socket
+import sys
+
+EXIT_DAEMON_UNAVAILABLE = 75
+
+# Same default as config.DAEMON_SOCKET, without paying for the config import
+SOCKET_PATH = os.getenv(
+    "SWAT_SOCKET",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "swat.sock"),
+)
+
+
+def main() -> int:
+    query = " ".join(sys.argv[1:]).strip()
+    if not query:
+        print('Usage: swat_client.py "your natural language command"', file=sys.stderr)
+        return 2
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        return EXIT_DAEMON_UNAVAILABLE
+
+    with sock, sock.makefile("rwb") as stream:
+        request = {
+            "query": query,
+            "cwd": os.getcwd(),
+            "width": shutil.get_terminal_size().columns,
+            "color": sys.stdout.isatty() and "NO_COLOR" not in os.environ,
+        }
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+
+        for line in stream:
+            frame = json.loads(line)
+            if frame["type"] == "output":
+                sys.stdout.write(frame["data"])
+                sys.stdout.flush()
+            elif frame["type"] == "result":
+                return frame["exit_code"]
+
+    # The daemon closed the connection without a result
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# Attributes summed per stage in profiles
+TOKEN_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+_current_tracer: ContextVar[Optional["Tracer"]] = ContextVar("swat_tracer", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("swat_span", default=None)
+
+
+@dataclass
+class Span:
+    """One timed stage of processing a query."""
+
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    thread_id: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Tracer:
+    """
+    Collects spans for one query.
+
+    Spans are opened with the module-level span() helper while the tracer is
+    active. Threads started with asyncio.to_thread inherit the active tracer,
+    so steps that run in parallel are recorded too.
+    """
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def profile(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-stage totals of the spans finished so far.
+
+        Returns:
+            Stage name -> {"count", "ms"} plus summed token counts and cache
+            hits when spans recorded them
+        """
+        stages: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(span.name, {"count": 0, "ms": 0.0})
+            stage["count"] += 1
+            stage["ms"] = round(stage["ms"] + span.duration_ms, 3)
+            for key in TOKEN_ATTRIBUTES:
+                if span.attributes.get(key):
+                    stage[key] = stage.get(key, 0) + span.attributes[key]
+            if span.attributes.get("cache_hit"):
+                stage["cache_hits"] = stage.get("cache_hits", 0) + 1
+        return stages
+
+    def to_chrome_trace(self) -> Dict:
+        """Spans as Chrome trace events, viewable in chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": span.start_ns / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": span.attributes,
+                }
+                for span in sorted(self.spans, key=lambda s: s.start_ns)
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id},
+        }
+
+    def to_otlp(self) -> Dict:
+        """Spans in the OpenTelemetry OTLP/JSON trace format."""
+
+        def attribute(key: str, value: Any) -> Dict:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        spans = []
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [attribute(k, v) for k, v in span.attributes.items()],
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [attribute("service.name", "swat")]},
+                    "scopeSpans": [{"scope": {"name": "swat"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def export(self, path: str, fmt: str = "chrome"):
+        """Write the trace to a file as "chrome" or "otlp" JSON."""
+        if fmt not in ("chrome", "otlp"):
+            raise ValueError(f"Unknown trace format '{fmt}', expected 'chrome' or 'otlp'")
+        data = self.to_chrome_trace() if fmt == "chrome" else self.to_otlp()
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+def current_tracer() -> Optional[Tracer]:
+    """The tracer active in this context, if any."""
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time a stage under the active tracer.
+
+    Yields the span so callers can add attributes such as token counts, or
+    None when no tracer is active.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        thread_id=threading.get_ident(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        tracer._finish(current)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes):
+    """Record a stage whose start and end were measured elsewhere, e.g. in a callback."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return
+    parent = _current_span.get()
+    tracer._finish(
+        Span(
+            name=name,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=start_ns,
+            end_ns=end_ns,
+            thread_id=threading.get_ident(),
+            attributes=attributes,
+        )
+    )